@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from class_calendar import class_dates, get_class_days, school_today
+from config import Settings
+from models import Attendance, Grade, Student
+
+
+MAX_WINDOW_DAYS = 90
+MAX_PAGE_SIZE = 500
+RECENT_ABSENCES = 5
+
+
+def get_absence_history(
+    session: Session,
+    settings: Settings,
+    days: int = 7,
+    grado: int | None = None,
+    page: int = 1,
+    per_page: int | None = None,
+) -> dict:
+    """
+    Calcula las ausencias de la ventana [hoy - days, hoy] sobre los días de clase,
+    con hoy en la zona horaria del colegio (la misma fecha del check-in).
+
+    Usa un número fijo de consultas sin importar el tamaño del listado:
+    configuración de días de clase, total de estudiantes, la página de
+    estudiantes (con su grado) y las asistencias de esa página en la ventana.
+    Sin per_page se devuelven todos los estudiantes.
+    """
+    today = school_today(settings)
+    start = today - timedelta(days=days)
+    expected = class_dates(get_class_days(session), start, today)
+
+    students_query = select(
+        Student.id,
+        Student.primer_apellido,
+        Student.segundo_apellido,
+        Student.primer_nombre,
+        Student.segundo_nombre,
+        Student.documento,
+        Grade.numero,
+    ).join(Grade, Student.grade_id == Grade.id)
+    count_query = select(func.count(Student.id)).join(Grade, Student.grade_id == Grade.id)
+    if grado is not None:
+        students_query = students_query.where(Grade.numero == grado)
+        count_query = count_query.where(Grade.numero == grado)
+
+    total = session.scalar(count_query) or 0
+    students_query = students_query.order_by(Student.id)
+    if per_page:
+        students_query = students_query.offset((page - 1) * per_page).limit(per_page)
+    students = session.execute(students_query).all()
+
+    attended: dict[int, set[date]] = {}
+    if students and expected:
+        attendance_query = select(Attendance.student_id, Attendance.fecha).where(
+            Attendance.fecha.in_(expected)
+        )
+        if per_page:
+            attendance_query = attendance_query.where(
+                Attendance.student_id.in_([s.id for s in students])
+            )
+        elif grado is not None:
+            attendance_query = attendance_query.join(
+                Student, Attendance.student_id == Student.id
+            ).join(Grade, Student.grade_id == Grade.id).where(Grade.numero == grado)
+        for student_id, fecha in session.execute(attendance_query):
+            attended.setdefault(student_id, set()).add(fecha)
+
+    recent_first = list(reversed(expected))
+    records = []
+    for student in students:
+        present = attended.get(student.id, set())
+        missed = [day for day in recent_first if day not in present]
+        records.append({
+            "id": student.id,
+            "primer_apellido": student.primer_apellido,
+            "segundo_apellido": student.segundo_apellido,
+            "primer_nombre": student.primer_nombre,
+            "segundo_nombre": student.segundo_nombre,
+            "grado": student.numero,
+            "documento": student.documento,
+            "ausencias": len(missed),
+            "ultimas_faltas": [day.strftime('%d/%m/%Y') for day in missed[:RECENT_ABSENCES]],
+        })
+
+    return {
+        "records": records,
+        "dias_clase": len(expected),
+        "dias": days,
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+    }
@@ -0,0 +1,137 @@
+"""
+Horarios de alertas de ausencia por grado.
+
+Cada horario agrupa grados (una jornada, un nivel) con su propia hora de
+alerta y el scheduler registra un job por horario. Los grados sin horario
+usan ``ALERT_TIME`` en el job por defecto.
+"""
+
+import re
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+
+from config import Settings
+from models import AlertSchedule, AlertScheduleGrade, Grade
+
+
+HOUR_PATTERN = re.compile(r"^([01]\d|2[0-3]):[0-5]\d$")
+
+
+class ScheduleError(ValueError):
+    """Datos de horario inválidos; el mensaje se devuelve al cliente."""
+
+
+def list_schedules(session: Session, settings: Settings) -> dict:
+    schedules = session.scalars(
+        select(AlertSchedule)
+        .options(selectinload(AlertSchedule.grades))
+        .order_by(AlertSchedule.hora, AlertSchedule.id)
+    ).all()
+    numeros = dict(session.execute(select(Grade.id, Grade.numero)).all())
+    assigned = {link.grade_id for schedule in schedules for link in schedule.grades}
+    return {
+        "horarios": [_serialize(schedule, numeros) for schedule in schedules],
+        "por_defecto": {
+            "hora": settings.alert_time,
+            "grados": sorted(n for grade_id, n in numeros.items() if grade_id not in assigned),
+        },
+    }
+
+
+def save_schedule(session: Session, data: dict, schedule_id: int | None = None) -> dict:
+    """Crea o actualiza un horario; lanza ScheduleError si los datos no son válidos."""
+    if not isinstance(data, dict):
+        raise ScheduleError("Se espera un objeto JSON")
+    if schedule_id is None:
+        schedule = AlertSchedule()
+        session.add(schedule)
+    else:
+        schedule = session.get(AlertSchedule, schedule_id)
+        if schedule is None:
+            raise LookupError("Horario no encontrado")
+
+    if schedule_id is None or "nombre" in data:
+        nombre = str(data.get("nombre") or "").strip()
+        if not nombre or len(nombre) > 50:
+            raise ScheduleError("nombre es requerido (máximo 50 caracteres)")
+        schedule.nombre = nombre
+    if schedule_id is None or "hora" in data:
+        hora = str(data.get("hora") or "").strip()
+        if not HOUR_PATTERN.match(hora):
+            raise ScheduleError("hora debe tener formato HH:MM")
+        schedule.hora = hora
+
+    numeros = dict(session.execute(select(Grade.numero, Grade.id)).all())
+    if schedule_id is None or "grados" in data:
+        grados = data.get("grados")
+        # bool es subclase de int y un dict ni siquiera se puede buscar en numeros
+        if (
+            not isinstance(grados, list)
+            or not grados
+            or not all(isinstance(g, int) and not isinstance(g, bool) for g in grados)
+        ):
+            raise ScheduleError("grados debe ser una lista de números de grado")
+        missing = [g for g in grados if g not in numeros]
+        if missing:
+            raise ScheduleError(f"Grados inexistentes: {missing}")
+        grade_ids = {numeros[g] for g in grados}
+        taken = session.execute(
+            select(Grade.numero)
+            .join(AlertScheduleGrade, AlertScheduleGrade.grade_id == Grade.id)
+            .where(AlertScheduleGrade.grade_id.in_(grade_ids))
+            .where(AlertScheduleGrade.schedule_id != (schedule.id or 0))
+        ).scalars().all()
+        if taken:
+            raise ScheduleError(f"Grados ya asignados a otro horario: {sorted(taken)}")
+        # Solo se agregan o quitan las diferencias para no chocar con el índice único
+        schedule.grades = [link for link in schedule.grades if link.grade_id in grade_ids]
+        current = {link.grade_id for link in schedule.grades}
+        for grade_id in sorted(grade_ids - current):
+            schedule.grades.append(AlertScheduleGrade(grade_id=grade_id))
+
+    session.flush()
+    return _serialize(schedule, {grade_id: n for n, grade_id in numeros.items()})
+
+
+def delete_schedule(session: Session, schedule_id: int) -> bool:
+    schedule = session.get(AlertSchedule, schedule_id)
+    if schedule is None:
+        return False
+    session.delete(schedule)
+    return True
+
+
+def schedule_times(session: Session) -> list[tuple[int, str]]:
+    """(id, hora) de cada horario, para registrar los jobs."""
+    return list(session.execute(select(AlertSchedule.id, AlertSchedule.hora)).all())
+
+
+def schedule_targets(
+    session: Session, settings: Settings, schedule_id: int | None
+) -> tuple[list[int], str] | None:
+    """
+    Grados y hora de alerta de un horario, o de los grados sin horario si
+    schedule_id es None. Retorna None si el horario ya no existe.
+    """
+    if schedule_id is None:
+        assigned = select(AlertScheduleGrade.grade_id)
+        grade_ids = session.scalars(select(Grade.id).where(Grade.id.not_in(assigned))).all()
+        return list(grade_ids), settings.alert_time
+
+    schedule = session.get(AlertSchedule, schedule_id)
+    if schedule is None:
+        return None
+    grade_ids = session.scalars(
+        select(AlertScheduleGrade.grade_id).where(AlertScheduleGrade.schedule_id == schedule_id)
+    ).all()
+    return list(grade_ids), schedule.hora
+
+
+def _serialize(schedule: AlertSchedule, numeros: dict[int, int]) -> dict:
+    return {
+        "id": schedule.id,
+        "nombre": schedule.nombre,
+        "hora": schedule.hora,
+        "grados": sorted(numeros[link.grade_id] for link in schedule.grades),
+    }
@@ -2,27 +2,64 @@ import csv
 import io
 import os
 from pathlib import Path
-from datetime import datetime
+from datetime import date, datetime
 
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request, Response, send_file
+from flask import Flask, jsonify, request, Response, send_file, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
 from config import Settings
-from db import db_healthcheck, get_session, init_db
-from scheduler import start_scheduler
-from attendance import register_checkin
-from importer import import_students
+from db import db_healthcheck, get_session, init_db, replica_configured
+from scheduler import reload_absence_jobs, start_scheduler
+from alert_schedules import ScheduleError, delete_schedule, list_schedules, save_schedule
+from notification_queue import start_notification_workers
+from telegram_updates import (
+    MAX_UPDATES_PAGE,
+    LinkRequestError,
+    get_processed_updates,
+    notify_link_approved,
+    resolve_link_request,
+)
+from attendance import MAX_BATCH_SCANS, register_checkin, register_checkin_batch
+from absences import MAX_PAGE_SIZE, MAX_WINDOW_DAYS, get_absence_history as absence_history
+from import_jobs import find_previous_import, get_job, store_upload, submit_import
 from models import Student, UploadLog, Attendance, Grade, ClassDays
-from qr import ensure_qr, render_qr_with_name
-from monthly_reports import generate_monthly_report, get_available_reports, REPORTS_DIR
+from roster_index import mark_roster_changed
+from grade_stats import get_day_stats, recompute_day
+from class_calendar import school_today
+from live_feed import broadcaster
+from qr import generate_qr_batch, migrate_legacy_qr
+from qr_store import qr_reference
+from qr_cards import card_cache, card_key
+from qr_sheets import (
+    CardRequest,
+    DEFAULT_CARDS_PER_PAGE,
+    MAX_CARDS_PER_PAGE,
+    iter_cards,
+    sheet_workers,
+    stream_pdf,
+    stream_zip,
+)
+from monthly_reports import (
+    generate_monthly_report,
+    generate_reports,
+    get_available_reports,
+    months_between,
+    REPORTS_DIR,
+)
 from sqlalchemy import select, desc
 
 
 load_dotenv(Path(__file__).resolve().parent / ".env")
 
 
+def _parse_year_month(value: str) -> tuple[int, int]:
+    """Convierte 'AAAA-MM' en (año, mes)."""
+    year, month = value.strip().split("-")
+    return int(year), int(month)
+
+
 def create_app() -> Flask:
     app = Flask(__name__)
     # Configurar CORS simple para desarrollo
@@ -31,14 +68,20 @@ def create_app() -> Flask:
 
     init_db()
     settings = Settings()
+    with get_session() as session:
+        migrate_legacy_qr(session, settings.qr_dir)
     if os.environ.get("WERKZEUG_RUN_MAIN") == "true" or os.environ.get("FLASK_RUN_FROM_CLI") != "true":
         start_scheduler()
+        start_notification_workers()
 
     @app.get("/health")
     def health() -> tuple[dict, int]:
         db_status = db_healthcheck()
         status_code = 200 if db_status == "ok" else 503
-        return {"status": "ok", "db": db_status}, status_code
+        result = {"status": "ok", "db": db_status}
+        if replica_configured():
+            result["replica"] = db_healthcheck(read_only=True)
+        return result, status_code
 
     @app.get("/students/template")
     def download_template() -> Response:
@@ -77,7 +120,7 @@ def create_app() -> Flask:
     @app.get("/students")
     def list_students() -> tuple[dict, int]:
         """Lista todos los estudiantes"""
-        with get_session() as session:
+        with get_session(read_only=True) as session:
             students = session.scalars(select(Student).order_by(Student.id)).all()
             data = [
                 {
@@ -108,8 +151,8 @@ def create_app() -> Flask:
                 return {"error": "Estudiante no encontrado"}, 404
             
             student.telegram_id = telegram_id if telegram_id else None
-            session.commit()
-            
+            mark_roster_changed(session)
+
         return {
             "id": student_id,
             "telegram_id": telegram_id,
@@ -129,25 +172,81 @@ def create_app() -> Flask:
                 return {"error": "Estudiante no encontrado"}, 404
 
             if not student.qr_path:
-                student.qr_path = ensure_qr(settings.qr_dir, student.documento)
-
-            qr_path = Path(student.qr_path)
-            if not qr_path.exists():
-                student.qr_path = ensure_qr(settings.qr_dir, student.documento)
-                qr_path = Path(student.qr_path)
+                student.qr_path = qr_reference(student.documento)
 
             parts = [student.primer_apellido, student.segundo_apellido or "", 
                      student.primer_nombre, student.segundo_nombre or ""]
             full_name = " ".join(p for p in parts if p).strip()
-            image_stream = render_qr_with_name(qr_path, full_name)
+            etag = card_key(student.documento, full_name, settings.qr_font_path)
+            # El navegador ya tiene esta tarjeta: no se lee ni renderiza nada
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            # El QR se lee del almacén empaquetado solo si la tarjeta no está en caché
+            png, etag = card_cache.get(student.documento, full_name, settings.qr_dir)
 
         filename = f"qr_{student_id}.png"
         return send_file(
-            image_stream,
+            io.BytesIO(png),
             mimetype="image/png",
             as_attachment=True,
             download_name=filename,
+            etag=etag,
+            max_age=0,
+        )
+
+    @app.get("/grades/<int:numero>/qr-sheet")
+    def download_grade_qr_sheet(numero: int):
+        """Tarjetas QR de todo el grado: PDF imprimible o ZIP (?formato=zip)"""
+        formato = request.args.get("formato", "pdf").lower()
+        if formato not in ("pdf", "zip"):
+            return {"error": "formato debe ser pdf o zip"}, 400
+        try:
+            per_page = int(request.args.get("por_pagina", DEFAULT_CARDS_PER_PAGE))
+        except ValueError:
+            return {"error": "por_pagina debe ser un número"}, 400
+        if not 1 <= per_page <= MAX_CARDS_PER_PAGE:
+            return {"error": f"por_pagina debe estar entre 1 y {MAX_CARDS_PER_PAGE}"}, 400
+
+        settings = Settings()
+        with get_session() as session:
+            grade = session.scalar(select(Grade).where(Grade.numero == numero))
+            if grade is None:
+                return {"error": "Grado no encontrado"}, 404
+            students = session.execute(
+                select(
+                    Student.documento,
+                    Student.primer_apellido,
+                    Student.segundo_apellido,
+                    Student.primer_nombre,
+                    Student.segundo_nombre,
+                )
+                .where(Student.grade_id == grade.id)
+                .order_by(Student.primer_apellido, Student.segundo_apellido, Student.primer_nombre)
+            ).all()
+
+        # Los QR que falten se generan juntos y se agregan al almacén de una vez
+        generate_qr_batch(settings.qr_dir, [student.documento for student in students], workers=1)
+        card_requests = []
+        for student in students:
+            parts = [student.primer_apellido, student.segundo_apellido or "",
+                     student.primer_nombre, student.segundo_nombre or ""]
+            full_name = " ".join(p for p in parts if p).strip()
+            card_requests.append(
+                CardRequest(student.documento, full_name, settings.qr_dir)
+            )
+
+        cards = iter_cards(card_requests, sheet_workers(settings.qr_workers))
+        if formato == "zip":
+            body, mimetype = stream_zip(cards), "application/zip"
+        else:
+            body, mimetype = stream_pdf(cards, per_page), "application/pdf"
+        response = Response(stream_with_context(body), mimetype=mimetype)
+        response.headers["Content-Disposition"] = (
+            f"attachment; filename=qr_grado_{numero}.{formato}"
         )
+        return response
 
     @app.post("/students/import")
     def import_students_from_csv() -> tuple[dict, int]:
@@ -162,31 +261,27 @@ def create_app() -> Flask:
         settings.uploads_dir.mkdir(parents=True, exist_ok=True)
 
         safe_name = secure_filename(file.filename) or "estudiantes.csv"
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        stored_name = f"{timestamp}_{safe_name}"
-        stored_path = settings.uploads_dir / stored_name
-        file.save(stored_path)
+        content_hash, stored_path = store_upload(file.stream, settings.uploads_dir)
 
-        with get_session() as session:
-            with open(stored_path, "rb") as stream:
-                result = import_students(stream, session, settings.qr_dir)
-            grades = result.get("grados", [])
-            grades_label = ",".join(str(g) for g in grades)
-            log = UploadLog(
-                filename=safe_name,
-                stored_path=str(stored_path),
-                grados=grades_label,
-                created_count=result.get("creados", 0),
-                updated_count=result.get("actualizados", 0),
-                skipped_count=result.get("omitidos", 0),
-                errors_count=len(result.get("errores", [])),
-            )
-            session.add(log)
-        return result, 200
+        # Un archivo idéntico a uno ya importado no se vuelve a procesar
+        previous = find_previous_import(content_hash)
+        if previous is not None:
+            return {**previous, "archivo": safe_name, "duplicado": True}, 200
+
+        job = submit_import(stored_path, safe_name, content_hash)
+        return {"job_id": job.id, "estado": job.status, "archivo": safe_name}, 202
+
+    @app.get("/students/import/<job_id>")
+    def get_import_job(job_id: str) -> tuple[dict, int]:
+        """Progreso de una importación en segundo plano"""
+        job = get_job(job_id)
+        if job is None:
+            return {"error": "Importación no encontrada"}, 404
+        return job.to_dict(), 200
 
     @app.get("/uploads/history")
     def upload_history() -> tuple[dict, int]:
-        with get_session() as session:
+        with get_session(read_only=True) as session:
             logs = session.scalars(
                 select(UploadLog).order_by(desc(UploadLog.id))
             ).all()
@@ -200,6 +295,7 @@ def create_app() -> Flask:
                     "actualizados": log.updated_count,
                     "omitidos": log.skipped_count,
                     "errores": log.errors_count,
+                    "estado": log.status,
                     "fecha": log.created_at.isoformat() if log.created_at else None,
                 }
                 for log in logs
@@ -225,166 +321,107 @@ def create_app() -> Flask:
             return result, 404
         return result, 200
 
+    @app.post("/attendance/check-in/batch")
+    def attendance_check_in_batch() -> tuple[dict, int]:
+        """Registra escaneos acumulados por un kiosco (ej: tras una caída del Wi-Fi)"""
+        payload = request.get_json(silent=True)
+        scans = payload.get("scans") if isinstance(payload, dict) else None
+        if not isinstance(scans, list) or not scans:
+            return {"error": "Lista de escaneos requerida"}, 400
+        if len(scans) > MAX_BATCH_SCANS:
+            return {"error": f"Máximo {MAX_BATCH_SCANS} escaneos por lote"}, 400
+
+        with get_session() as session:
+            result = register_checkin_batch(session, scans)
+        print(
+            f"[ATTENDANCE] Lote procesado: {result['registrados']} registrados, "
+            f"{result['ya_registrados']} ya registrados, "
+            f"{result['no_encontrados']} no encontrados"
+        )
+        return result, 200
+
     @app.get("/attendance/today")
     def get_attendance_today() -> tuple[dict, int]:
-        """Obtiene estadísticas de asistencia de hoy"""
-        from datetime import date
+        """Obtiene estadísticas de asistencia de hoy
+
+        Con ?by_grade=1 incluye "por_grado" con los contadores de cada grado.
+        """
         try:
             with get_session() as session:
-                today = date.today()
-                
-                # Contar presentes hoy
-                presente_count = session.query(Attendance).filter(
-                    Attendance.fecha == today
-                ).count()
-                
-                # Contar total de estudiantes
-                total_students = session.query(Student).count()
-                
-                # Ausentes = Total - Presentes
-                ausente_count = total_students - presente_count
-                
-                # Obtener grados con asistencia registrada hoy
-                grados_con_asistencia = session.query(Grade.numero).join(
-                    Student, Student.grade_id == Grade.id
-                ).join(
-                    Attendance, Attendance.student_id == Student.id
-                ).filter(
-                    Attendance.fecha == today
-                ).distinct().all()
-                
-                grados = sorted([g[0] for g in grados_con_asistencia])
-                
-                return {
-                    "presente": presente_count,
-                    "ausente": ausente_count,
-                    "total": total_students,
-                    "fecha": today.isoformat(),
-                    "grados": grados
-                }, 200
+                today = school_today(settings)
+                por_grado = get_day_stats(session, today)
+
+            presente_count = sum(g["presente"] for g in por_grado)
+            total_students = sum(g["total"] for g in por_grado)
+            result = {
+                "presente": presente_count,
+                "ausente": max(0, total_students - presente_count),
+                "total": total_students,
+                "fecha": today.isoformat(),
+                # Grados con asistencia registrada hoy
+                "grados": [g["grado"] for g in por_grado if g["presente"] > 0],
+            }
+            if request.args.get("by_grade") in ("1", "true"):
+                result["por_grado"] = por_grado
+            return result, 200
         except Exception as e:
             print(f"[ATTENDANCE] Error en get_attendance_today: {str(e)}")
             return {"error": str(e), "presente": 0, "ausente": 0, "total": 0, "grados": []}, 500
 
+    @app.get("/attendance/stream")
+    def attendance_stream() -> Response:
+        """Feed en vivo (Server-Sent Events) de entradas y contadores por grado"""
+        with get_session() as session:
+            today = school_today(settings)
+            por_grado = get_day_stats(session, today)
+        subscriber = broadcaster.subscribe()
+        initial = [("snapshot", {"fecha": today.isoformat(), "por_grado": por_grado})]
+        response = Response(
+            stream_with_context(broadcaster.stream(subscriber, initial)),
+            mimetype="text/event-stream",
+        )
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
     @app.get("/attendance/<int:grado>")
     def get_attendance_by_grade(grado: int) -> tuple[dict, int]:
         """Obtiene estadísticas de asistencia de hoy por grado"""
-        from datetime import date
         try:
             with get_session() as session:
-                today = date.today()
-                
-                # Obtener el grado
-                grade = session.query(Grade).filter(Grade.numero == grado).first()
-                if not grade:
-                    return {"error": f"Grado {grado} no encontrado"}, 404
-                
-                # Contar presentes del grado hoy
-                presente_count = session.query(Attendance).join(
-                    Student, Attendance.student_id == Student.id
-                ).filter(
-                    Attendance.fecha == today,
-                    Student.grade_id == grade.id
-                ).count()
-                
-                # Contar total de estudiantes del grado
-                total_students = session.query(Student).filter(
-                    Student.grade_id == grade.id
-                ).count()
-                
-                # Ausentes del grado
-                ausente_count = total_students - presente_count
-                
-                return {
-                    "presente": presente_count,
-                    "ausente": ausente_count,
-                    "total": total_students,
-                    "grado": grado,
-                    "fecha": today.isoformat()
-                }, 200
+                today = school_today(settings)
+                por_grado = get_day_stats(session, today)
+
+            stats = next((g for g in por_grado if g["grado"] == grado), None)
+            if stats is None:
+                return {"error": f"Grado {grado} no encontrado"}, 404
+            return {**stats, "fecha": today.isoformat()}, 200
         except Exception as e:
             print(f"[ATTENDANCE] Error en get_attendance_by_grade: {str(e)}")
             return {"error": str(e)}, 500
 
     @app.get("/attendance/absences")
     def get_absence_history() -> tuple[dict, int]:
-        """Obtiene histórico de ausencias de los últimos 7 días según días de clase configurados"""
-        from datetime import date, timedelta, datetime
+        """Obtiene histórico de ausencias según días de clase configurados
+
+        Query params opcionales: dias (ventana, por defecto 7), grado,
+        page y per_page (sin per_page se devuelven todos los estudiantes).
+        """
         try:
-            with get_session() as session:
-                today = date.today()
-                week_ago = today - timedelta(days=7)
-                
-                # Obtener configuración de días de clase
-                class_days_config = session.query(ClassDays).first()
-                if not class_days_config:
-                    # Si no existe, crear configuración por defecto
-                    class_days_config = ClassDays()
-                    session.add(class_days_config)
-                    session.commit()
-                
-                # Mapeo de día de semana (0=lunes, 6=domingo)
-                dias_semana = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
-                dias_config = {
-                    0: class_days_config.lunes,
-                    1: class_days_config.martes,
-                    2: class_days_config.miercoles,
-                    3: class_days_config.jueves,
-                    4: class_days_config.viernes,
-                    5: class_days_config.sabado,
-                    6: class_days_config.domingo,
-                }
-                
-                # Contar días de clase en los últimos 7 días
-                dias_clase = 0
-                for i in range(8):
-                    check_date = today - timedelta(days=i)
-                    if check_date >= week_ago:
-                        dia_semana = check_date.weekday()
-                        if dias_config[dia_semana]:
-                            dias_clase += 1
-                
-                # Obtener todos los estudiantes
-                students = session.query(Student).all()
-                
-                records = []
-                for student in students:
-                    # Contar asistencias reales en los últimos 7 días
-                    asistencias_reales = session.query(Attendance).filter(
-                        Attendance.student_id == student.id,
-                        Attendance.fecha >= week_ago,
-                        Attendance.fecha <= today
-                    ).count()
-                    
-                    # Ausencias = días de clase - asistencias reales
-                    ausencias_reales = dias_clase - asistencias_reales
-                    
-                    # Obtener las fechas de las últimas faltas (dentro de días de clase)
-                    ultimas_faltas = []
-                    for i in range(8):
-                        check_date = today - timedelta(days=i)
-                        if check_date >= week_ago:
-                            dia_semana = check_date.weekday()
-                            if dias_config[dia_semana]:  # Solo si es día de clase
-                                if not session.query(Attendance).filter(
-                                    Attendance.student_id == student.id,
-                                    Attendance.fecha == check_date
-                                ).first():
-                                    ultimas_faltas.append(check_date.strftime('%d/%m/%Y'))
-                    
-                    records.append({
-                        "id": student.id,
-                        "primer_apellido": student.primer_apellido,
-                        "segundo_apellido": student.segundo_apellido,
-                        "primer_nombre": student.primer_nombre,
-                        "segundo_nombre": student.segundo_nombre,
-                        "grado": student.grade.numero,
-                        "documento": student.documento,
-                        "ausencias": max(0, ausencias_reales),  # No mostrar negativos
-                        "ultimas_faltas": ultimas_faltas[:5]  # Mostrar últimas 5 faltas
-                    })
-                
-                return {"records": records, "dias_clase": dias_clase}, 200
+            days = request.args.get("dias", 7, type=int)
+            grado = request.args.get("grado", None, type=int)
+            page = request.args.get("page", 1, type=int)
+            per_page = request.args.get("per_page", None, type=int)
+            if days is None or not 0 <= days <= MAX_WINDOW_DAYS:
+                return {"error": f"dias debe estar entre 0 y {MAX_WINDOW_DAYS}"}, 400
+            if page is None or page < 1:
+                return {"error": "page debe ser mayor o igual a 1"}, 400
+            if per_page is not None and not 1 <= per_page <= MAX_PAGE_SIZE:
+                return {"error": f"per_page debe estar entre 1 y {MAX_PAGE_SIZE}"}, 400
+
+            with get_session(read_only=True) as session:
+                result = absence_history(session, settings, days, grado, page, per_page)
+            return result, 200
         except Exception as e:
             print(f"[ATTENDANCE] Error en get_absence_history: {str(e)}")
             return {"error": str(e)}, 500
@@ -468,13 +505,48 @@ def create_app() -> Flask:
 
     @app.post("/monthly-reports/generate")
     def post_generate_monthly_report() -> tuple[dict, int]:
-        """Genera manualmente un reporte mensual"""
+        """Genera manualmente reportes mensuales
+
+        Sin parámetros genera el mes actual. Con ?year=&month= genera un mes
+        histórico, con solo ?year= el año completo y con ?desde=AAAA-MM&hasta=AAAA-MM
+        un rango de meses.
+        """
         try:
-            filepath = generate_monthly_report()
-            if filepath:
-                return {"message": "Reporte generado exitosamente", "file": Path(filepath).name}, 200
-            else:
-                return {"error": "No hay datos de inasistentes para generar reporte"}, 400
+            today = date.today()
+            year = request.args.get("year", None, type=int)
+            month = request.args.get("month", None, type=int)
+            desde = request.args.get("desde")
+            hasta = request.args.get("hasta")
+            try:
+                if desde or hasta:
+                    start = _parse_year_month(desde or hasta)
+                    end = _parse_year_month(hasta or desde)
+                elif year and not month:
+                    start, end = (year, 1), (year, 12)
+                else:
+                    start = end = (year or today.year, month or today.month)
+            except ValueError:
+                return {"error": "Mes inválido, use AAAA-MM"}, 400
+            if not 1 <= start[1] <= 12 or not 1 <= end[1] <= 12:
+                return {"error": "Mes inválido"}, 400
+            if start > end:
+                return {"error": "El rango de meses está invertido"}, 400
+            end = min(end, (today.year, today.month))
+
+            if start == end:
+                filepath = generate_monthly_report(*start)
+                if filepath:
+                    return {"message": "Reporte generado exitosamente", "file": Path(filepath).name}, 200
+                else:
+                    return {"error": "No hay datos de inasistentes para generar reporte"}, 400
+
+            paths = generate_reports(months_between(start, end))
+            if not paths:
+                return {"error": "No hay datos de inasistentes para generar reportes"}, 400
+            return {
+                "message": f"{len(paths)} reportes generados exitosamente",
+                "files": [Path(p).name for p in paths],
+            }, 200
         except Exception as e:
             print(f"[MONTHLY_REPORTS] Error en generate_monthly_report: {str(e)}")
             return {"error": str(e)}, 500
@@ -502,7 +574,7 @@ def create_app() -> Flask:
         from datetime import date
         
         try:
-            with get_session() as session:
+            with get_session(read_only=True) as session:
                 today = date.today()
                 
                 # Obtener estadísticas
@@ -567,6 +639,45 @@ def create_app() -> Flask:
             print(f"[REPORTS] Error en download_attendance_pdf: {str(e)}")
             return {"error": str(e)}, 500
 
+    @app.get("/alert-schedules")
+    def get_alert_schedules() -> tuple[dict, int]:
+        """Horarios de alertas de ausencia por grado y los grados que usan ALERT_TIME"""
+        with get_session() as session:
+            return list_schedules(session, settings), 200
+
+    @app.post("/alert-schedules")
+    def create_alert_schedule() -> tuple[dict, int]:
+        """Crea un horario: {"nombre": "Jornada tarde", "hora": "13:10", "grados": [6, 7]}"""
+        try:
+            with get_session() as session:
+                schedule = save_schedule(session, request.get_json(silent=True) or {})
+        except ScheduleError as e:
+            return {"error": str(e)}, 400
+        reload_absence_jobs()
+        return schedule, 201
+
+    @app.patch("/alert-schedules/<int:schedule_id>")
+    def update_alert_schedule(schedule_id: int) -> tuple[dict, int]:
+        try:
+            with get_session() as session:
+                schedule = save_schedule(session, request.get_json(silent=True) or {}, schedule_id)
+        except ScheduleError as e:
+            return {"error": str(e)}, 400
+        except LookupError as e:
+            return {"error": str(e)}, 404
+        reload_absence_jobs()
+        return schedule, 200
+
+    @app.delete("/alert-schedules/<int:schedule_id>")
+    def remove_alert_schedule(schedule_id: int) -> tuple[dict, int]:
+        """Elimina el horario; sus grados vuelven a la hora por defecto"""
+        with get_session() as session:
+            deleted = delete_schedule(session, schedule_id)
+        if not deleted:
+            return {"error": "Horario no encontrado"}, 404
+        reload_absence_jobs()
+        return {"id": schedule_id, "mensaje": "Horario eliminado"}, 200
+
     @app.post("/test/send-alerts")
     def test_send_alerts() -> tuple[dict, int]:
         """Endpoint de prueba para enviar notificaciones ahora (sin esperar 7:10 AM)"""
@@ -581,35 +692,62 @@ def create_app() -> Flask:
 
     @app.get("/telegram/updates")
     def get_telegram_updates() -> tuple[dict, int]:
-        """Obtiene los últimos mensajes del bot para ver el chat_id de usuarios"""
-        import requests
+        """Mensajes recibidos por el bot y su resultado (acudientes vinculados con /start)"""
+        estado = request.args.get("estado", "").strip() or None
+        limite = request.args.get("limite", 100, type=int)
+        if limite is None or not 1 <= limite <= MAX_UPDATES_PAGE:
+            return {"error": f"limite debe estar entre 1 y {MAX_UPDATES_PAGE}"}, 400
+        with get_session() as session:
+            return get_processed_updates(session, status=estado, limit=limite), 200
+
+    @app.post("/telegram/updates/<int:update_id>/aprobar")
+    def approve_telegram_link(update_id: int) -> tuple[dict, int]:
+        """Aprueba una solicitud /start pendiente: el chat pasa a ser el del acudiente"""
         try:
-            response = requests.get(
-                f"https://api.telegram.org/bot{settings.telegram_token}/getUpdates",
-                timeout=10
-            )
-            response.raise_for_status()
-            return response.json(), 200
-        except Exception as e:
-            return {"error": str(e)}, 500
+            with get_session() as session:
+                result = resolve_link_request(session, update_id, approve=True)
+        except LookupError as e:
+            return {"error": str(e)}, 404
+        except LinkRequestError as e:
+            return {"error": str(e)}, 409
+        notify_link_approved(settings, result["chat_id"])
+        return result, 200
+
+    @app.post("/telegram/updates/<int:update_id>/rechazar")
+    def reject_telegram_link(update_id: int) -> tuple[dict, int]:
+        """Rechaza una solicitud /start pendiente"""
+        try:
+            with get_session() as session:
+                result = resolve_link_request(session, update_id, approve=False)
+        except LookupError as e:
+            return {"error": str(e)}, 404
+        except LinkRequestError as e:
+            return {"error": str(e)}, 409
+        return result, 200
 
     @app.delete("/test/clear-attendance")
     def clear_today_attendance() -> tuple[dict, int]:
         """Borra todos los registros de asistencia de hoy para testing"""
-        from datetime import date
-        from models import Attendance, NotificationLog
+        from models import Attendance, NotificationLog, NotificationOutbox
         try:
+            # Mismo "hoy" que usa el check-in (zona horaria del colegio)
+            today = school_today(settings)
             with get_session() as session:
                 # Borrar logs de notificación primero (por foreign key)
                 session.query(NotificationLog).filter(
-                    NotificationLog.fecha == date.today()
+                    NotificationLog.fecha == today
+                ).delete()
+                session.query(NotificationOutbox).filter(
+                    NotificationOutbox.fecha == today
                 ).delete()
                 
                 # Luego borrar asistencias
                 deleted = session.query(Attendance).filter(
-                    Attendance.fecha == date.today()
+                    Attendance.fecha == today
                 ).delete()
-                session.commit()
+                recompute_day(session, today)
+                mark_roster_changed(session)
+            broadcaster.publish("reset", {"motivo": "asistencia_borrada"})
             return {"eliminados": deleted}, 200
         except Exception as e:
             return {"error": str(e)}, 500
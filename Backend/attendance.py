@@ -1,13 +1,21 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import pytz
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+import grade_stats
 from config import Settings
-from models import Attendance, NotificationLog, Student
-from telegram import TelegramClient
+from db import least, upsert
+from models import Attendance
+from live_feed import broadcaster
 from messages import build_entry_message
+from notification_queue import enqueue_many, enqueue_notification, wake_workers
+from roster_index import load_records, roster_index
+
+
+MAX_BATCH_SCANS = 1000
 
 
 def register_checkin(session: Session, documento: str) -> dict:
@@ -17,63 +25,221 @@ def register_checkin(session: Session, documento: str) -> dict:
     today = now.date()
     hora_str = now.strftime("%H:%M")
 
-    student = session.scalar(select(Student).where(Student.documento == documento))
+    student = roster_index.get(session, documento)
     if student is None:
         return {"error": "Estudiante no encontrado"}
 
-    existing = session.scalar(
-        select(Attendance)
-        .where(Attendance.student_id == student.id)
-        .where(Attendance.fecha == today)
-    )
-    if existing is not None:
+    if roster_index.is_checked_in(session, today, student.id):
         return {"status": "ya_registrado"}
 
+    grade_stats.ensure_day(session, today)
     record = Attendance(
         student_id=student.id,
         fecha=today,
         hora_entrada=now.time(),
     )
-    session.add(record)
-    session.flush()
+    try:
+        with session.begin_nested():
+            session.add(record)
+    except IntegrityError:
+        # Otro proceso registró la entrada después de cargar el índice
+        roster_index.mark_checked_in(today, student.id)
+        return {"status": "ya_registrado"}
+    grade_stats.record_checkin(session, today, student.grade_id)
 
-    # Enviar notificación de entrada al acudiente
+    # La notificación al acudiente se encola en la misma transacción; los
+    # workers de notification_queue la envían sin bloquear el check-in.
     telegram_status = None
-    telegram_error = None
-    
-    print(f"[ATTENDANCE] Enviando notificación - telegram_id={student.telegram_id}")
-    
     if student.telegram_id:
-        try:
-            client = TelegramClient(settings)
-            message = build_entry_message(student, hora_str)
-            print(f"[TELEGRAM] Mensaje construido: {message[:50]}...")
-            print(f"[TELEGRAM] Enviando a chat_id={student.telegram_id}")
-            
-            status, error = client.send_text(student.telegram_id, message)
-            telegram_status = status
-            telegram_error = error
-            
-            print(f"[TELEGRAM] Resultado: status={status}, error={error}")
-            
-            # Registrar el envío de notificación
-            log = NotificationLog(
-                student_id=student.id,
-                fecha=today,
-                status=status,
-                error=error,
-            )
-            session.add(log)
-        except Exception as e:
-            print(f"[TELEGRAM] Excepción al enviar: {str(e)}")
-            telegram_status = "error"
-            telegram_error = str(e)
+        message = build_entry_message(student, hora_str)
+        enqueue_notification(
+            session, student, today, "entrada", hora_str, message,
+            delay_seconds=settings.entry_coalesce_seconds,
+        )
+        telegram_status = "encolado"
     else:
         print(f"[TELEGRAM] telegram_id vacío para estudiante {student.documento}")
-    
+
     session.commit()
+    roster_index.mark_checked_in(today, student.id)
+    if telegram_status:
+        wake_workers()
+    _publish_checkins(session, today, [(student, hora_str)])
     return {
         "status": "registrado",
         "telegram_status": telegram_status,
-        "telegram_error": telegram_error
+        "telegram_error": None,
+    }
+
+
+def _publish_checkins(session: Session, today, entries: list[tuple]) -> None:
+    """Envía a los dashboards conectados las entradas nuevas y los contadores de sus grados."""
+    if not entries or not broadcaster.has_subscribers():
+        return
+    try:
+        for student, hora in entries:
+            broadcaster.publish("checkin", {
+                "id": student.id,
+                "primer_apellido": student.primer_apellido,
+                "primer_nombre": student.primer_nombre,
+                "grado": student.grade.numero,
+                "hora": hora,
+            })
+        grade_ids = sorted({student.grade_id for student, _ in entries})
+        for stats in grade_stats.get_day_stats(session, today, grade_ids):
+            broadcaster.publish("grade_stats", {**stats, "fecha": today.isoformat()})
+    except Exception as e:
+        # El registro ya está confirmado; un fallo del feed no debe afectarlo
+        print(f"[LIVE_FEED] Error publicando check-in: {str(e)}")
+
+
+def _parse_scanned_at(value, tz, now: datetime) -> datetime:
+    """Convierte la marca de tiempo del kiosco a la hora local del colegio."""
+    if not value:
+        return now
+    scanned = datetime.fromisoformat(str(value).strip())
+    if scanned.tzinfo is None:
+        return tz.localize(scanned)
+    return scanned.astimezone(tz)
+
+
+def register_checkin_batch(session: Session, scans: list[dict]) -> dict:
+    """
+    Registra escaneos acumulados por un kiosco sin conexión.
+
+    Resuelve todos los documentos en una consulta, consulta las asistencias
+    existentes en otra e inserta las nuevas con un único upsert multi-fila
+    apoyado en uq_attendance_student_date. La hora de entrada es la del
+    escaneo original; si un estudiante aparece varias veces el mismo día se
+    conserva el escaneo más temprano.
+    """
+    settings = Settings()
+    tz = pytz.timezone(settings.timezone)
+    now = datetime.now(tz)
+    today = now.date()
+
+    results: list[dict] = []
+    parsed: list[tuple[int, str, datetime]] = []
+    for idx, scan in enumerate(scans):
+        if not isinstance(scan, dict):
+            results.append(
+                {"documento": "", "scanned_at": None, "status": "error", "error": "Escaneo invalido"}
+            )
+            continue
+        documento = str(scan.get("documento") or "").strip()
+        scanned_at = scan.get("scanned_at")
+        results.append({"documento": documento, "scanned_at": scanned_at})
+        if not documento:
+            results[idx].update(status="error", error="Documento requerido")
+            continue
+        try:
+            parsed.append((idx, documento, _parse_scanned_at(scanned_at, tz, now)))
+        except (TypeError, ValueError):
+            results[idx].update(status="error", error="scanned_at invalido")
+
+    students = load_records(session, sorted({doc for _, doc, _ in parsed}))
+
+    # Escaneo más temprano por (estudiante, fecha); el resto son duplicados
+    earliest: dict[tuple[int, object], tuple[int, datetime]] = {}
+    for idx, documento, scanned in parsed:
+        student = students.get(documento)
+        if student is None:
+            results[idx].update(status="no_encontrado", error="Estudiante no encontrado")
+            continue
+        key = (student.id, scanned.date())
+        current = earliest.get(key)
+        if current is None or scanned < current[1]:
+            earliest[key] = (idx, scanned)
+
+    existing: set[tuple[int, object]] = set()
+    if earliest:
+        existing = {
+            (row.student_id, row.fecha)
+            for row in session.execute(
+                select(Attendance.student_id, Attendance.fecha).where(
+                    tuple_(Attendance.student_id, Attendance.fecha).in_(list(earliest))
+                )
+            )
+        }
+
+    new_keys = [key for key in earliest if key not in existing]
+    if new_keys:
+        # Si otro proceso insertó entre la consulta y el upsert se conserva
+        # la entrada más temprana de las dos.
+        upsert(
+            session,
+            Attendance,
+            [
+                {
+                    "student_id": student_id,
+                    "fecha": fecha,
+                    "hora_entrada": earliest[(student_id, fecha)][1].time(),
+                }
+                for student_id, fecha in new_keys
+            ],
+            keys=["student_id", "fecha"],
+            updates=lambda row: {"hora_entrada": least(Attendance.hora_entrada, row.hora_entrada)},
+        )
+        # Recalcular es exacto aunque el upsert haya chocado con otro proceso
+        for fecha in sorted({fecha for _, fecha in new_keys}):
+            grade_stats.recompute_day(session, fecha)
+
+    by_id = {student.id: student for student in students.values()}
+    for idx, documento, scanned in parsed:
+        if "status" in results[idx]:
+            continue
+        student = students[documento]
+        key = (student.id, scanned.date())
+        if key in existing or earliest[key][0] != idx:
+            results[idx]["status"] = "ya_registrado"
+        else:
+            results[idx]["status"] = "registrado"
+
+    # Solo se avisa al acudiente de las entradas de hoy. INSERT IGNORE descarta
+    # las ya encoladas por otro proceso sin perder el resto del lote.
+    next_attempt_at = (
+        datetime.utcnow() + timedelta(seconds=settings.entry_coalesce_seconds)
+        if settings.entry_coalesce_seconds > 0 else None
+    )
+    rows = []
+    for student_id, fecha in new_keys:
+        student = by_id[student_id]
+        if fecha != today or not student.telegram_id:
+            continue
+        hora_str = earliest[(student_id, fecha)][1].strftime("%H:%M")
+        rows.append({
+            "student_id": student.id,
+            "fecha": fecha,
+            "tipo": "entrada",
+            "chat_id": student.telegram_id,
+            "hora": hora_str,
+            "message": build_entry_message(student, hora_str),
+            "next_attempt_at": next_attempt_at,
+        })
+    queued = enqueue_many(session, rows)
+    if queued < len(rows):
+        print(f"[ATTENDANCE] {len(rows) - queued} notificaciones del lote ya estaban encoladas")
+
+    session.commit()
+    for student_id, fecha in new_keys:
+        roster_index.mark_checked_in(fecha, student_id)
+    if queued:
+        wake_workers()
+    _publish_checkins(
+        session,
+        today,
+        [
+            (by_id[student_id], earliest[(student_id, fecha)][1].strftime("%H:%M"))
+            for student_id, fecha in new_keys
+            if fecha == today
+        ],
+    )
+
+    statuses = [result["status"] for result in results]
+    return {
+        "resultados": results,
+        "registrados": statuses.count("registrado"),
+        "ya_registrados": statuses.count("ya_registrado"),
+        "no_encontrados": statuses.count("no_encontrado"),
+        "errores": statuses.count("error"),
     }
@@ -0,0 +1,239 @@
+"""
+Servidor local que imita el Bot API de Telegram para pruebas de carga.
+
+Responde ``sendMessage`` con latencia configurable y puede inyectar errores
+500 y respuestas 429 con ``retry_after``. ``getUpdates`` hace long polling
+sobre los mensajes agregados con ``add_update`` (o ``POST /updates`` con
+``{"chat_id": ..., "text": "/start 123"}``) y respeta el offset. Se usa apuntando
+``TELEGRAM_API_URL`` a este servidor:
+
+    cd Backend
+    python -m benchmarks.fake_telegram --port 8081 --latency-ms 80 --error-rate 0.01
+    TELEGRAM_API_URL=http://127.0.0.1:8081 TELEGRAM_TOKEN=prueba python app.py
+
+``GET /stats`` retorna los contadores de mensajes recibidos.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+@dataclass
+class FakeTelegramConfig:
+    latency_ms: float = 50.0
+    jitter_ms: float = 20.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: int = 1
+
+
+@dataclass
+class ReceivedMessage:
+    received_at: float
+    chat_id: str
+    text: str
+
+
+@dataclass
+class FakeTelegramStats:
+    requests: int = 0
+    delivered: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    messages: list[ReceivedMessage] = field(default_factory=list)
+
+
+class FakeTelegramServer:
+    """Servidor en un hilo propio; sirve tanto desde la línea de comandos como embebido."""
+
+    def __init__(self, config: FakeTelegramConfig, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config
+        self.stats = FakeTelegramStats()
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self._httpd = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+        self._updates: list[dict] = []
+        self._last_update_id = 0
+        self._updates_ready = threading.Condition(self._lock)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeTelegramServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="fake-telegram", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats = FakeTelegramStats()
+
+    def add_update(self, chat_id: int | str, text: str, username: str = "acudiente") -> int:
+        """Encola un mensaje de un usuario hacia el bot; retorna su update_id."""
+        with self._updates_ready:
+            self._last_update_id += 1
+            update_id = self._last_update_id
+            self._updates.append({
+                "update_id": update_id,
+                "message": {
+                    "message_id": update_id,
+                    "from": {"id": int(chat_id), "username": username},
+                    "chat": {"id": int(chat_id), "type": "private"},
+                    "text": text,
+                },
+            })
+            self._updates_ready.notify_all()
+        return update_id
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def _get_updates(self, offset: int, timeout: float) -> tuple[int, dict]:
+        deadline = time.monotonic() + timeout
+        with self._updates_ready:
+            # Como Telegram, un offset confirma y descarta los updates anteriores
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates and (remaining := deadline - time.monotonic()) > 0:
+                self._updates_ready.wait(remaining)
+            return 200, {"ok": True, "result": list(self._updates[:100])}
+
+    def _send_message(self, payload: dict) -> tuple[int, dict]:
+        delay = max(0.0, self.config.latency_ms + self._random.uniform(
+            -self.config.jitter_ms, self.config.jitter_ms
+        ))
+        time.sleep(delay / 1000)
+
+        roll = self._random.random()
+        with self._lock:
+            self.stats.requests += 1
+            if roll < self.config.rate_limit_rate:
+                self.stats.rate_limited += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.config.retry_after}",
+                    "parameters": {"retry_after": self.config.retry_after},
+                }
+            if roll < self.config.rate_limit_rate + self.config.error_rate:
+                self.stats.errors += 1
+                return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+            self.stats.delivered += 1
+            self.stats.messages.append(
+                ReceivedMessage(time.monotonic(), str(payload.get("chat_id")), payload.get("text", ""))
+            )
+            message_id = self.stats.delivered
+        return 200, {
+            "ok": True,
+            "result": {
+                "message_id": message_id,
+                "chat": {"id": payload.get("chat_id")},
+                "text": payload.get("text", ""),
+            },
+        }
+
+
+def _handler_for(server: FakeTelegramServer) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._reply(400, {"ok": False, "description": "Bad Request: invalid JSON"})
+                return
+            if self.path.endswith("/sendMessage"):
+                self._reply(*server._send_message(payload))
+            elif self.path.endswith("/getUpdates"):
+                self._reply(*server._get_updates(
+                    int(payload.get("offset", 0)), float(payload.get("timeout", 0))
+                ))
+            elif self.path == "/updates":
+                update_id = server.add_update(payload.get("chat_id", 0), payload.get("text", ""))
+                self._reply(200, {"ok": True, "update_id": update_id})
+            else:
+                self._reply(404, {"ok": False, "description": "Not Found"})
+
+        def do_GET(self) -> None:
+            if self.path == "/stats":
+                stats = server.stats
+                self._reply(200, {
+                    "requests": stats.requests,
+                    "delivered": stats.delivered,
+                    "errors": stats.errors,
+                    "rate_limited": stats.rate_limited,
+                })
+            elif urlsplit(self.path).path.endswith("/getUpdates"):
+                query = parse_qs(urlsplit(self.path).query)
+                self._reply(*server._get_updates(
+                    int(query.get("offset", ["0"])[0]), float(query.get("timeout", ["0"])[0])
+                ))
+            else:
+                self._reply(404, {"ok": False, "description": "Not Found"})
+
+        def _reply(self, status: int, body: dict) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", str(server.config.retry_after))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Latencia media por mensaje")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Variación de la latencia (±)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fracción de respuestas 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after de los 429 (segundos)")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeTelegramConfig:
+    return FakeTelegramConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bot API de Telegram simulado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeTelegramServer(config_from_args(args), args.host, args.port)
+    print(f"[FAKE_TELEGRAM] Escuchando en {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
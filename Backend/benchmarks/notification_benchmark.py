@@ -0,0 +1,278 @@
+"""
+Benchmark de notificaciones contra el Bot API simulado.
+
+Crea estudiantes sintéticos en una base de datos aparte (``edu_check_bench``
+por defecto, o ``--db-url``; se vacía en cada corrida y nunca puede ser la
+base de la aplicación), levanta ``fake_telegram`` en el mismo
+proceso y mide dos caminos:
+
+- ausencias: ``send_absence_alerts`` con todos los estudiantes ausentes.
+- entradas: ``register_checkin`` de todos los estudiantes desde varios hilos.
+
+Para cada uno reporta mensajes por segundo y la latencia hasta que el mensaje
+llega al servidor (p50/p95/p99/máx). Se ejecuta desde ``Backend``:
+
+    python -m benchmarks.notification_benchmark --students 5000 --latency-ms 80
+"""
+
+import argparse
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+from sqlalchemy.engine import URL, make_url
+
+from benchmarks.fake_telegram import (
+    FakeTelegramServer,
+    add_config_arguments,
+    config_from_args,
+)
+
+
+DOCUMENTO_PATTERN = re.compile(r"cédula (\S+)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de notificaciones de Telegram")
+    parser.add_argument("--students", type=int, default=1000, help="Estudiantes sintéticos (1k-10k)")
+    parser.add_argument("--grades", type=int, default=11)
+    parser.add_argument(
+        "--siblings", type=float, default=0.1,
+        help="Fracción de estudiantes que comparten acudiente con el anterior",
+    )
+    parser.add_argument("--scenario", choices=["ausencias", "entradas", "ambos"], default="ambos")
+    parser.add_argument("--scanners", type=int, default=8, help="Hilos que simulan lectores QR")
+    parser.add_argument(
+        "--db-name", default="edu_check_bench",
+        help="Base de benchmark en el mismo servidor (o archivo junto al de SQLite) que la aplicación",
+    )
+    parser.add_argument("--db-url", default="", help="DB_URL, p. ej. sqlite:///bench.db (reemplaza --db-name)")
+    parser.add_argument("--global-rate", type=int, default=30, help="TELEGRAM_GLOBAL_RATE")
+    parser.add_argument("--chat-rate", type=int, default=1, help="TELEGRAM_CHAT_RATE")
+    parser.add_argument("--workers", type=int, default=8, help="NOTIFY_WORKERS")
+    parser.add_argument("--timeout", type=float, default=900, help="Segundos máximos por escenario")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    # Primero el .env (sin pisar variables ya definidas) para saber qué base
+    # usa la aplicación y no sembrar datos sintéticos sobre ella
+    load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+    from config import Settings
+    from db import _build_db_url
+
+    production_url = make_url(_build_db_url(Settings()))
+    bench_url = make_url(args.db_url) if args.db_url else _bench_url(production_url, args.db_name)
+    if _same_database(bench_url, production_url):
+        raise SystemExit(
+            f"[BENCH] {bench_url.render_as_string()} es la base de la aplicación; "
+            "usa --db-url o --db-name con una base de benchmark"
+        )
+
+    fake = FakeTelegramServer(config_from_args(args)).start()
+    # Estas variables tienen prioridad sobre el .env del backend
+    os.environ.update({
+        "DB_URL": bench_url.render_as_string(hide_password=False),
+        "DB_NAME": bench_url.database or args.db_name,
+        "TELEGRAM_TOKEN": "benchmark",
+        "TELEGRAM_API_URL": fake.url,
+        "TELEGRAM_GLOBAL_RATE": str(args.global_rate),
+        "TELEGRAM_CHAT_RATE": str(args.chat_rate),
+        "NOTIFY_WORKERS": str(args.workers),
+        "NOTIFY_POLL_SECONDS": "1",
+    })
+
+    from db import init_db
+    from notification_queue import start_notification_workers
+
+    init_db()
+    _seed(args.students, args.grades, args.siblings)
+    start_notification_workers()
+    print(
+        f"[BENCH] {args.students} estudiantes, Telegram simulado en {fake.url} "
+        f"(latencia {args.latency_ms}±{args.jitter_ms} ms, errores {args.error_rate:.1%}, "
+        f"429 {args.rate_limit_rate:.1%})"
+    )
+
+    try:
+        if args.scenario in ("ausencias", "ambos"):
+            _run_absences(fake, args.timeout)
+        if args.scenario in ("entradas", "ambos"):
+            _run_checkins(fake, args.scanners, args.timeout)
+    finally:
+        fake.stop()
+
+
+def _same_database(a: URL, b: URL) -> bool:
+    if a.get_backend_name() == b.get_backend_name() == "sqlite":
+        return Path(a.database or "").resolve() == Path(b.database or "").resolve()
+    return (a.host, a.port, a.database) == (b.host, b.port, b.database)
+
+
+def _bench_url(production_url: URL, db_name: str) -> URL:
+    """La misma conexión de la aplicación, apuntando a la base de benchmark."""
+    if production_url.get_backend_name() == "sqlite":
+        return production_url.set(
+            database=str(Path(production_url.database).with_name(f"{db_name}.db"))
+        )
+    return production_url.set(database=db_name)
+
+
+def _seed(count: int, grades: int, siblings: float) -> None:
+    """Vacía las tablas de la base de benchmark e inserta los estudiantes."""
+    from sqlalchemy import delete, insert, select
+
+    from db import get_session
+    from models import (
+        Attendance,
+        DailyGradeStats,
+        Grade,
+        NotificationLog,
+        NotificationOutbox,
+        Student,
+    )
+    from roster_index import mark_roster_changed
+
+    started = time.perf_counter()
+    with get_session() as session:
+        for model in (NotificationOutbox, NotificationLog, Attendance, DailyGradeStats, Student):
+            session.execute(delete(model))
+        existing = set(session.scalars(select(Grade.numero)).all())
+        missing = [{"numero": numero} for numero in range(1, grades + 1) if numero not in existing]
+        if missing:
+            session.execute(insert(Grade), missing)
+        grade_ids = dict(session.execute(select(Grade.numero, Grade.id)).all())
+
+        rows = []
+        rng = random.Random(42)
+        chat_id = 900_000_000
+        for index in range(count):
+            # Con probabilidad `siblings` se repite el acudiente del anterior
+            if index == 0 or rng.random() >= siblings:
+                chat_id += 1
+            rows.append({
+                "numero_estudiante": index + 1,
+                "primer_apellido": f"Apellido{index}",
+                "primer_nombre": f"Nombre{index}",
+                "tipo_documento": "TI",
+                "documento": f"B{index:07d}",
+                "telegram_id": str(chat_id),
+                "grade_id": grade_ids[index % grades + 1],
+            })
+        for start in range(0, len(rows), 1000):
+            session.execute(insert(Student), rows[start:start + 1000])
+        mark_roster_changed(session)
+    print(f"[BENCH] Datos sintéticos creados en {time.perf_counter() - started:.1f}s")
+
+
+def _run_absences(fake: FakeTelegramServer, timeout: float) -> None:
+    from config import Settings
+    from db import get_session
+    from notifications import send_absence_alerts
+
+    fake.reset()
+    started = time.monotonic()
+    with get_session() as session:
+        result = send_absence_alerts(session, Settings())
+    enqueued_in = time.monotonic() - started
+    finished = _wait_for_outbox(timeout)
+
+    latencies = [message.received_at - started for message in fake.stats.messages]
+    print(f"\n[BENCH] Ausencias: {result['encolados']} filas encoladas en {enqueued_in:.2f}s")
+    _report(fake, latencies, finished - started)
+
+
+def _run_checkins(fake: FakeTelegramServer, scanners: int, timeout: float) -> None:
+    from sqlalchemy import select
+
+    from attendance import register_checkin
+    from db import get_session
+    from models import Student
+
+    with get_session() as session:
+        documentos = session.scalars(select(Student.documento).order_by(Student.id)).all()
+
+    fake.reset()
+    scanned_at: dict[str, float] = {}
+    request_times: list[float] = []
+
+    def scan(documento: str) -> None:
+        scanned_at[documento] = time.monotonic()
+        with get_session() as session:
+            register_checkin(session, documento)
+        request_times.append(time.monotonic() - scanned_at[documento])
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, scanners)) as pool:
+        list(pool.map(scan, documentos))
+    scanned_in = time.monotonic() - started
+    finished = _wait_for_outbox(timeout)
+
+    latencies = []
+    for message in fake.stats.messages:
+        # Un resumen de hermanos cuenta desde el escaneo más antiguo que incluye
+        times = [scanned_at[doc] for doc in DOCUMENTO_PATTERN.findall(message.text) if doc in scanned_at]
+        if times:
+            latencies.append(message.received_at - min(times))
+
+    print(
+        f"\n[BENCH] Entradas: {len(documentos)} check-ins en {scanned_in:.2f}s "
+        f"({len(documentos) / scanned_in:.0f}/s), register_checkin "
+        f"p50 {_percentile(request_times, 50) * 1000:.1f} ms, "
+        f"p99 {_percentile(request_times, 99) * 1000:.1f} ms"
+    )
+    _report(fake, latencies, finished - started)
+
+
+def _wait_for_outbox(timeout: float) -> float:
+    """Espera a que la cola no tenga filas pendientes ni en envío."""
+    from sqlalchemy import func, select
+
+    from db import get_session
+    from models import NotificationOutbox
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with get_session() as session:
+            remaining = session.scalar(
+                select(func.count(NotificationOutbox.id))
+                .where(NotificationOutbox.status.in_(["pending", "sending"]))
+            )
+        if not remaining:
+            return time.monotonic()
+        time.sleep(0.5)
+    print(f"[BENCH] Tiempo agotado con {remaining} mensajes en cola")
+    return time.monotonic()
+
+
+def _report(fake: FakeTelegramServer, latencies: list[float], elapsed: float) -> None:
+    stats = fake.stats
+    delivered = stats.delivered
+    print(
+        f"[BENCH] Llamadas al API: {stats.requests} (entregadas {delivered}, "
+        f"errores {stats.errors}, 429 {stats.rate_limited}) en {elapsed:.2f}s"
+    )
+    print(f"[BENCH] Mensajes/s: {delivered / elapsed if elapsed > 0 else 0:.1f}")
+    if latencies:
+        print(
+            "[BENCH] Latencia hasta Telegram: "
+            + ", ".join(
+                f"p{p} {_percentile(latencies, p):.2f}s" for p in (50, 95, 99)
+            )
+            + f", máx {max(latencies):.2f}s"
+        )
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percentile / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+if __name__ == "__main__":
+    main()
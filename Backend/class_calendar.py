@@ -0,0 +1,38 @@
+from datetime import date, datetime, timedelta
+
+import pytz
+from sqlalchemy.orm import Session
+
+from config import Settings
+from models import ClassDays
+
+
+# Orden de date.weekday(): 0=lunes, 6=domingo
+DAY_FIELDS = ("lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo")
+
+
+def get_class_days(session: Session) -> ClassDays:
+    """Obtiene la configuración de días de clase, creando la de por defecto si falta."""
+    class_days = session.query(ClassDays).first()
+    if not class_days:
+        class_days = ClassDays(
+            **{field: ClassDays.__table__.c[field].default.arg for field in DAY_FIELDS}
+        )
+        # En una sesión de solo lectura se usan los valores por defecto sin guardarlos
+        if not session.info.get("read_only"):
+            session.add(class_days)
+            session.commit()
+    return class_days
+
+
+def class_dates(class_days: ClassDays, start: date, end: date) -> list[date]:
+    """Fechas de clase entre start y end (ambas inclusive), en orden ascendente."""
+    enabled = {i for i, field in enumerate(DAY_FIELDS) if getattr(class_days, field)}
+    total = (end - start).days + 1
+    days = (start + timedelta(days=i) for i in range(max(0, total)))
+    return [day for day in days if day.weekday() in enabled]
+
+
+def school_today(settings: Settings) -> date:
+    """Fecha actual en la zona horaria del colegio (la que usa el check-in)."""
+    return datetime.now(pytz.timezone(settings.timezone)).date()
@@ -13,11 +13,17 @@ def _get_env(name: str, default: str | None = None) -> str:
 @dataclass(frozen=True)
 class Settings:
     base_dir: Path = Path(__file__).resolve().parent
+    db_backend: str = ""
+    db_url: str = ""
     db_host: str = ""
     db_port: str = ""
     db_name: str = ""
     db_user: str = ""
     db_password: str = ""
+    db_replica_url: str = ""
+    db_pool_size: int = 0
+    db_max_overflow: int = 0
+    db_pool_recycle: int = 0
     qr_dir: Path = Path()
     uploads_dir: Path = Path()
     app_env: str = ""
@@ -27,13 +33,36 @@ class Settings:
     timezone: str = ""
     telegram_token: str = ""
     telegram_chat_id: str = ""
+    telegram_api_url: str = ""
+    telegram_global_rate: int = 0
+    telegram_chat_rate: int = 0
+    telegram_poll_timeout: int = 0
+    notify_workers: int = 0
+    notify_poll_seconds: int = 0
+    notify_max_attempts: int = 0
+    notify_retention_days: int = 0
+    entry_coalesce_seconds: int = 0
+    roster_cache_seconds: int = 0
+    sse_buffer_size: int = 0
+    report_workers: int = 0
+    qr_workers: int = 0
+    qr_font_path: str = ""
+    qr_card_dir: Path = Path()
+    qr_card_cache_mb: int = 0
+    qr_card_disk_mb: int = 0
 
     def __post_init__(self) -> None:
+        object.__setattr__(self, "db_backend", _get_env("DB_BACKEND", "mysql").lower())
+        object.__setattr__(self, "db_url", _get_env("DB_URL", ""))
         object.__setattr__(self, "db_host", _get_env("DB_HOST", "127.0.0.1"))
         object.__setattr__(self, "db_port", _get_env("DB_PORT", "3306"))
         object.__setattr__(self, "db_name", _get_env("DB_NAME", "edu_check"))
         object.__setattr__(self, "db_user", _get_env("DB_USER", "root"))
         object.__setattr__(self, "db_password", _get_env("DB_PASSWORD", ""))
+        object.__setattr__(self, "db_replica_url", _get_env("DB_REPLICA_URL", ""))
+        object.__setattr__(self, "db_pool_size", int(_get_env("DB_POOL_SIZE", "10")))
+        object.__setattr__(self, "db_max_overflow", int(_get_env("DB_MAX_OVERFLOW", "20")))
+        object.__setattr__(self, "db_pool_recycle", int(_get_env("DB_POOL_RECYCLE", "1800")))
         object.__setattr__(
             self,
             "qr_dir",
@@ -51,3 +80,40 @@ class Settings:
         object.__setattr__(self, "timezone", _get_env("TIMEZONE", "America/Bogota"))
         object.__setattr__(self, "telegram_token", _get_env("TELEGRAM_TOKEN", ""))
         object.__setattr__(self, "telegram_chat_id", _get_env("TELEGRAM_CHAT_ID", ""))
+        object.__setattr__(
+            self, "telegram_api_url", _get_env("TELEGRAM_API_URL", "https://api.telegram.org")
+        )
+        object.__setattr__(
+            self, "telegram_global_rate", int(_get_env("TELEGRAM_GLOBAL_RATE", "25"))
+        )
+        object.__setattr__(self, "telegram_chat_rate", int(_get_env("TELEGRAM_CHAT_RATE", "1")))
+        object.__setattr__(
+            self, "telegram_poll_timeout", int(_get_env("TELEGRAM_POLL_TIMEOUT", "25"))
+        )
+        object.__setattr__(self, "notify_workers", int(_get_env("NOTIFY_WORKERS", "8")))
+        object.__setattr__(
+            self, "notify_poll_seconds", int(_get_env("NOTIFY_POLL_SECONDS", "5"))
+        )
+        object.__setattr__(
+            self, "notify_max_attempts", int(_get_env("NOTIFY_MAX_ATTEMPTS", "5"))
+        )
+        object.__setattr__(
+            self, "notify_retention_days", int(_get_env("NOTIFY_RETENTION_DAYS", "30"))
+        )
+        object.__setattr__(
+            self, "entry_coalesce_seconds", int(_get_env("ENTRY_COALESCE_SECONDS", "0"))
+        )
+        object.__setattr__(
+            self, "roster_cache_seconds", int(_get_env("ROSTER_CACHE_SECONDS", "300"))
+        )
+        object.__setattr__(self, "sse_buffer_size", int(_get_env("SSE_BUFFER_SIZE", "100")))
+        object.__setattr__(self, "report_workers", int(_get_env("REPORT_WORKERS", "0")))
+        object.__setattr__(self, "qr_workers", int(_get_env("QR_WORKERS", "0")))
+        object.__setattr__(self, "qr_font_path", _get_env("QR_FONT_PATH", ""))
+        object.__setattr__(
+            self,
+            "qr_card_dir",
+            Path(_get_env("QR_CARD_DIR", str(self.base_dir / "qr_cards"))),
+        )
+        object.__setattr__(self, "qr_card_cache_mb", int(_get_env("QR_CARD_CACHE_MB", "32")))
+        object.__setattr__(self, "qr_card_disk_mb", int(_get_env("QR_CARD_DISK_MB", "256")))
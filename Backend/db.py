@@ -1,15 +1,36 @@
 from contextlib import contextmanager
-from typing import Iterator
+from pathlib import Path
+from typing import Callable, Iterator
 
-from sqlalchemy import create_engine, inspect, text
-from sqlalchemy.engine import Engine
+from sqlalchemy import create_engine, event, insert, text, true
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+from sqlalchemy.sql.expression import FunctionElement
 
 from config import Settings
 
 
+# WAL deja leer mientras otro escribe; synchronous=NORMAL es seguro con WAL
+# y evita un fsync por transacción.
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "foreign_keys=ON",
+    "busy_timeout=30000",
+    "cache_size=-65536",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",
+)
+
 _engine: Engine | None = None
+_read_engine: Engine | None = None
+_has_replica = False
 SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+# Sesiones de reportes: réplica si está configurada y nunca hacen commit
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, info={"read_only": True})
 
 
 class Base(DeclarativeBase):
@@ -17,6 +38,10 @@ class Base(DeclarativeBase):
 
 
 def _build_db_url(settings: Settings) -> str:
+    if settings.db_url:
+        return settings.db_url
+    if settings.db_backend == "sqlite":
+        return f"sqlite:///{settings.base_dir / 'edu_check.db'}"
     return (
         "mysql+mysqlconnector://"
         f"{settings.db_user}:{settings.db_password}"
@@ -24,69 +49,106 @@ def _build_db_url(settings: Settings) -> str:
     )
 
 
-def _build_server_url(settings: Settings) -> str:
-    return (
-        "mysql+mysqlconnector://"
-        f"{settings.db_user}:{settings.db_password}"
-        f"@{settings.db_host}:{settings.db_port}/"
-    )
-
-
-def _ensure_database(settings: Settings) -> None:
-    server_engine = create_engine(_build_server_url(settings), pool_pre_ping=True)
+def _ensure_database(url: str) -> None:
+    """Crea la base de la URL si no existe (MySQL); también sirve con DB_URL."""
+    database_url = make_url(url)
+    server_engine = create_engine(database_url.set(database=""), pool_pre_ping=True)
     with server_engine.connect() as connection:
         connection.execute(
             text(
-                f"CREATE DATABASE IF NOT EXISTS `{settings.db_name}` "
+                f"CREATE DATABASE IF NOT EXISTS `{database_url.database}` "
                 "CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci"
             )
         )
     server_engine.dispose()
 
 
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _create_engine(url: str, settings: Settings, read_only: bool = False) -> Engine:
+    if _is_sqlite(url):
+        return _create_sqlite_engine(url, settings, read_only)
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        # Reabrir conexiones antes de que MySQL o un proxy las cierre por inactividad
+        pool_recycle=settings.db_pool_recycle,
+    )
+
+
+def _create_sqlite_engine(url: str, settings: Settings, read_only: bool) -> Engine:
+    """
+    Motor SQLite en modo WAL para correr la aplicación completa en un proceso.
+
+    SQLAlchemy emite el BEGIN (el módulo sqlite3 no) para que los SAVEPOINT
+    funcionen. Las sesiones de escritura usan BEGIN IMMEDIATE: toman el
+    bloqueo de escritura al empezar y esperan busy_timeout en lugar de fallar
+    con "database is locked" al pasar de leer a escribir.
+    """
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": 30},
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _configure(dbapi_connection, connection_record) -> None:
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection) -> None:
+        connection.exec_driver_sql("BEGIN" if read_only else "BEGIN IMMEDIATE")
+
+    return engine
+
+
 def init_db() -> None:
-    global _engine
+    global _engine, _read_engine, _has_replica
     if _engine is not None:
         return
     settings = Settings()
-    _ensure_database(settings)
-    _engine = create_engine(_build_db_url(settings), pool_pre_ping=True)
+    url = _build_db_url(settings)
+    if _is_sqlite(url):
+        database = make_url(url).database
+        if database and database != ":memory:":
+            Path(database).parent.mkdir(parents=True, exist_ok=True)
+    else:
+        _ensure_database(url)
+    _engine = _create_engine(url, settings)
     SessionLocal.configure(bind=_engine)
-    from models import Base as ModelBase
+    _has_replica = bool(settings.db_replica_url)
+    if _has_replica:
+        _read_engine = _create_engine(settings.db_replica_url, settings, read_only=True)
+    elif _is_sqlite(url):
+        # Mismo archivo, pero las lecturas no toman el bloqueo de escritura
+        _read_engine = _create_engine(url, settings, read_only=True)
+    else:
+        _read_engine = _engine
+    ReadSessionLocal.configure(bind=_read_engine)
+    from migrations import migrate
 
-    ModelBase.metadata.create_all(_engine)
-    _ensure_schema(_engine)
+    migrate(_engine)
 
 
-def _ensure_schema(engine: Engine) -> None:
-    inspector = inspect(engine)
-    if not inspector.has_table("students"):
-        return
-
-    columns = {col["name"] for col in inspector.get_columns("students")}
-    if "telefono_acudiente" not in columns:
-        with engine.connect() as connection:
-            connection.execute(
-                text(
-                    "ALTER TABLE students "
-                    "ADD COLUMN telefono_acudiente VARCHAR(20) NULL"
-                )
-            )
-    if "telegram_id" not in columns:
-        with engine.connect() as connection:
-            connection.execute(
-                text(
-                    "ALTER TABLE students "
-                    "ADD COLUMN telegram_id VARCHAR(20) NULL"
-                )
-            )
+def replica_configured() -> bool:
+    return _has_replica
 
 
-def db_healthcheck() -> str:
-    if _engine is None:
+def db_healthcheck(read_only: bool = False) -> str:
+    engine = _read_engine if read_only else _engine
+    if engine is None:
         return "not_initialized"
     try:
-        with _engine.connect() as connection:
+        with engine.begin() as connection:
             connection.execute(text("SELECT 1"))
         return "ok"
     except Exception:
@@ -94,9 +156,22 @@ def db_healthcheck() -> str:
 
 
 @contextmanager
-def get_session() -> Iterator[Session]:
+def get_session(read_only: bool = False) -> Iterator[Session]:
+    """
+    Sesión que hace commit al salir y rollback si hay una excepción.
+
+    Con read_only=True la sesión usa la réplica de reportes (DB_REPLICA_URL,
+    o el primario si no hay réplica) y no hace commit: la transacción se
+    descarta al cerrar. La réplica puede ir unos segundos atrasada, así que
+    solo sirve para listados y reportes, no para leer lo recién escrito.
+    """
     if _engine is None:
         init_db()
+    if read_only:
+        with ReadSessionLocal() as session:
+            yield session
+        return
+
     session = SessionLocal()
     try:
         yield session
@@ -106,3 +181,76 @@ def get_session() -> Iterator[Session]:
         raise
     finally:
         session.close()
+
+
+class least(FunctionElement):
+    """LEAST(a, b) de MySQL; en SQLite el MIN escalar de dos argumentos."""
+
+    name = "least"
+    inherit_cache = True
+
+
+@compiles(least)
+def _compile_least(element, compiler, **kw) -> str:
+    return f"LEAST({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(least, "sqlite")
+def _compile_least_sqlite(element, compiler, **kw) -> str:
+    return f"MIN({compiler.process(element.clauses, **kw)})"
+
+
+def upsert(
+    session: Session,
+    model,
+    rows: list[dict],
+    keys: list[str],
+    updates: Callable[[object], dict],
+) -> None:
+    """
+    Inserta filas y actualiza las que chocan con una clave única.
+
+    MySQL usa ON DUPLICATE KEY UPDATE y SQLite ON CONFLICT (keys) DO UPDATE.
+    updates recibe las columnas de la fila propuesta (``inserted`` /
+    ``excluded``) y retorna los valores a asignar.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        stmt = sqlite_insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_=updates(stmt.excluded))
+    else:
+        stmt = mysql_insert(model).values(rows)
+        stmt = stmt.on_duplicate_key_update(updates(stmt.inserted))
+    session.execute(stmt)
+
+
+def upsert_from_select(
+    session: Session,
+    model,
+    columns: list[str],
+    query,
+    keys: list[str],
+    updates: Callable[[object], dict],
+) -> None:
+    """
+    Como upsert, pero las filas salen de un SELECT en la misma sentencia.
+
+    Al no leer primero y escribir después, un cambio concurrente entre la
+    lectura y la escritura no se pierde.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        # Sin WHERE, SQLite confunde el ON CONFLICT con la condición de un JOIN
+        stmt = sqlite_insert(model).from_select(columns, query.where(true()))
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_=updates(stmt.excluded))
+    else:
+        stmt = mysql_insert(model).from_select(columns, query)
+        stmt = stmt.on_duplicate_key_update(updates(stmt.inserted))
+    session.execute(stmt)
+
+
+def insert_ignore(model):
+    """INSERT que descarta las filas que chocan con una clave única (MySQL y SQLite)."""
+    return (
+        insert(model)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
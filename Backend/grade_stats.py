@@ -0,0 +1,111 @@
+"""
+Contadores diarios de asistencia por grado (tabla ``daily_grade_stats``).
+
+El check-in incrementa ``present`` en su misma transacción y las
+importaciones recalculan el día completo, así que el dashboard lee una fila
+por grado en lugar de contar asistencias en cada refresco.
+"""
+
+import threading
+from datetime import date
+
+from sqlalchemy import Date, func, literal, select, update
+from sqlalchemy.orm import Session
+
+from db import upsert_from_select
+from models import Attendance, DailyGradeStats, Grade, Student
+
+
+_ready_days: set[date] = set()
+_ready_lock = threading.Lock()
+
+
+def ensure_day(session: Session, fecha: date) -> None:
+    """Crea las filas del día si aún no existen (una vez por proceso y día)."""
+    with _ready_lock:
+        if fecha in _ready_days:
+            return
+    exists = session.scalar(
+        select(DailyGradeStats.id).where(DailyGradeStats.fecha == fecha).limit(1)
+    )
+    if exists is None:
+        recompute_day(session, fecha)
+    else:
+        _mark_ready(fecha)
+
+
+def recompute_day(session: Session, fecha: date) -> None:
+    """
+    Recalcula presentes y matriculados de todos los grados para la fecha.
+
+    Los conteos y la escritura van en un solo INSERT ... SELECT: un
+    record_checkin concurrente no puede quedar entre la lectura y la
+    escritura y perder su incremento.
+    """
+    present = (
+        select(func.count(Attendance.id))
+        .join(Student, Attendance.student_id == Student.id)
+        .where(Student.grade_id == Grade.id)
+        .where(Attendance.fecha == fecha)
+        .scalar_subquery()
+    )
+    enrolled = (
+        select(func.count(Student.id))
+        .where(Student.grade_id == Grade.id)
+        .scalar_subquery()
+    )
+    upsert_from_select(
+        session,
+        DailyGradeStats,
+        ["fecha", "grade_id", "present", "enrolled"],
+        select(literal(fecha, Date), Grade.id, present, enrolled),
+        keys=["fecha", "grade_id"],
+        updates=lambda row: {"present": row.present, "enrolled": row.enrolled},
+    )
+    _mark_ready(fecha)
+
+
+def record_checkin(session: Session, fecha: date, grade_id: int) -> None:
+    """Suma un presente al grado; llamar después de ensure_day en la misma transacción."""
+    result = session.execute(
+        update(DailyGradeStats)
+        .where(DailyGradeStats.fecha == fecha)
+        .where(DailyGradeStats.grade_id == grade_id)
+        .values(present=DailyGradeStats.present + 1)
+    )
+    if result.rowcount == 0:
+        # Grado creado después de preparar el día: recalcular incluye este check-in
+        session.flush()
+        recompute_day(session, fecha)
+
+
+def get_day_stats(
+    session: Session, fecha: date, grade_ids: list[int] | None = None
+) -> list[dict]:
+    """Filas del día ordenadas por grado, creándolas si es la primera lectura."""
+    ensure_day(session, fecha)
+    query = (
+        select(Grade.numero, DailyGradeStats.present, DailyGradeStats.enrolled)
+        .join(Grade, DailyGradeStats.grade_id == Grade.id)
+        .where(DailyGradeStats.fecha == fecha)
+        .order_by(Grade.numero)
+    )
+    if grade_ids is not None:
+        query = query.where(DailyGradeStats.grade_id.in_(grade_ids))
+    rows = session.execute(query).all()
+    return [
+        {
+            "grado": numero,
+            "presente": present,
+            "ausente": max(0, enrolled - present),
+            "total": enrolled,
+        }
+        for numero, present, enrolled in rows
+    ]
+
+
+def _mark_ready(fecha: date) -> None:
+    with _ready_lock:
+        # Solo interesan los días recientes; se descartan los anteriores
+        _ready_days.difference_update({day for day in _ready_days if day < fecha})
+        _ready_days.add(fecha)
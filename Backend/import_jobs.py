@@ -0,0 +1,279 @@
+"""
+Importaciones de estudiantes en segundo plano.
+
+``POST /students/import`` guarda el archivo y encola un trabajo; un worker lo
+procesa por bloques confirmando cada uno, y ``GET /students/import/<job_id>``
+consulta el progreso. El ``UploadLog`` se escribe cuando el trabajo termina,
+también si falla.
+
+El progreso vive en memoria del proceso que recibió el archivo; otro proceso
+del servidor solo ve el trabajo cuando terminó, a partir de su ``UploadLog``.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from sqlalchemy import desc, select
+
+from class_calendar import school_today
+from config import Settings
+from db import get_session
+from grade_stats import recompute_day
+from importer import import_students
+from live_feed import broadcaster
+from models import UploadLog
+from roster_index import mark_roster_changed
+
+
+# Tiempo que se conserva en memoria un trabajo terminado
+FINISHED_JOB_TTL = 3600
+STREAM_CHUNK = 64 * 1024
+
+_jobs: dict[str, "ImportJob"] = {}
+_jobs_lock = threading.Lock()
+# Un solo worker: dos importaciones simultáneas competirían por los mismos documentos
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="import")
+
+
+@dataclass
+class ImportJob:
+    id: str
+    filename: str
+    stored_path: str
+    content_hash: str | None = None
+    status: str = "en_cola"
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    errors: list[dict] = field(default_factory=list)
+    result: dict | None = None
+    error: str | None = None
+    upload_log_id: int | None = None
+    queued_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "archivo": self.filename,
+            "estado": self.status,
+            "filas_procesadas": self.rows,
+            "creados": self.created,
+            "actualizados": self.updated,
+            "sin_cambios": self.unchanged,
+            "omitidos": self.skipped,
+            "errores": self.errors,
+            "segundos": round(elapsed, 2),
+            "filas_por_segundo": round(self.rows / elapsed, 1) if elapsed > 0 else 0.0,
+            "resultado": self.result,
+            "error": self.error,
+            "upload_log_id": self.upload_log_id,
+        }
+
+
+def store_upload(stream, uploads_dir: Path) -> tuple[str, Path]:
+    """
+    Guarda la subida comprimida con gzip, nombrada por el SHA-256 de su contenido.
+
+    El hash se calcula mientras se copia el flujo; si ya existe un archivo con
+    ese contenido se descarta la copia nueva y se reutiliza el existente.
+    """
+    digest = hashlib.sha256()
+    tmp_path = uploads_dir / f".{uuid.uuid4().hex}.tmp"
+    try:
+        with gzip.open(tmp_path, "wb") as output:
+            while True:
+                chunk = stream.read(STREAM_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                output.write(chunk)
+        content_hash = digest.hexdigest()
+        stored_path = uploads_dir / f"{content_hash}.csv.gz"
+        if stored_path.exists():
+            tmp_path.unlink()
+        else:
+            os.replace(tmp_path, stored_path)
+        return content_hash, stored_path
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def find_previous_import(content_hash: str) -> dict | None:
+    """
+    Busca una importación con el mismo contenido.
+
+    Retorna el trabajo en curso con ese hash, o el resultado guardado si la
+    última importación fue este mismo archivo y se completó; None en otro caso.
+    Un listado más antiguo se vuelve a importar: puede revertir cambios que
+    hizo un archivo posterior.
+    """
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.content_hash == content_hash and job.finished_at is None:
+                return {"job_id": job.id, "estado": job.status}
+
+    with get_session() as session:
+        log = session.scalar(select(UploadLog).order_by(desc(UploadLog.id)).limit(1))
+        # Tras una importación fallida (pudo confirmar bloques) se vuelve a importar
+        if log is None or log.status != "completado" or log.content_hash != content_hash:
+            return None
+        return {
+            "estado": "completado",
+            "upload_log_id": log.id,
+            "resultado": json.loads(log.result_json),
+        }
+
+
+def submit_import(stored_path: Path, filename: str, content_hash: str | None = None) -> ImportJob:
+    job = ImportJob(
+        id=uuid.uuid4().hex,
+        filename=filename,
+        stored_path=str(stored_path),
+        content_hash=content_hash,
+    )
+    with _jobs_lock:
+        _prune_finished()
+        _jobs[job.id] = job
+    _executor.submit(_run_job, job)
+    return job
+
+
+def get_job(job_id: str) -> ImportJob | None:
+    """Trabajo de este proceso o, si ya terminó en otro, el reconstruido desde su UploadLog."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        return job
+
+    # En el primario: la réplica puede no tener aún el UploadLog recién escrito
+    with get_session() as session:
+        log = session.scalar(select(UploadLog).where(UploadLog.job_id == job_id).limit(1))
+        if log is None:
+            return None
+        result = json.loads(log.result_json) if log.result_json else {}
+        return ImportJob(
+            id=job_id,
+            filename=log.filename,
+            stored_path=log.stored_path,
+            content_hash=log.content_hash,
+            status=log.status or "completado",
+            created=result.get("creados", log.created_count),
+            updated=result.get("actualizados", log.updated_count),
+            unchanged=result.get("sin_cambios", 0),
+            skipped=result.get("omitidos", log.skipped_count),
+            errors=result.get("errores", []),
+            result=result or None,
+            error=result.get("error"),
+            upload_log_id=log.id,
+        )
+
+
+def _prune_finished() -> None:
+    limit = time.time() - FINISHED_JOB_TTL
+    expired = [
+        job_id for job_id, job in _jobs.items()
+        if job.finished_at is not None and job.finished_at < limit
+    ]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def _run_job(job: ImportJob) -> None:
+    settings = Settings()
+    job.status = "procesando"
+    job.started_at = time.time()
+    try:
+        with get_session() as session:
+
+            def on_chunk(progress: dict) -> None:
+                if (progress["creados"], progress["actualizados"]) != (job.created, job.updated):
+                    mark_roster_changed(session)
+                # Confirmar por bloque evita una transacción abierta todo el import
+                session.commit()
+                job.rows = progress["filas"]
+                job.created = progress["creados"]
+                job.updated = progress["actualizados"]
+                job.unchanged = progress["sin_cambios"]
+                job.skipped = progress["omitidos"]
+                job.errors = list(progress["errores"])
+
+            opener = gzip.open if job.stored_path.endswith(".gz") else open
+            with opener(job.stored_path, "rb") as stream:
+                result = import_students(stream, session, settings.qr_dir, on_chunk)
+
+            if "error" in result:
+                status = "error"
+            else:
+                recompute_day(session, school_today(settings))
+                status = "completado"
+            upload_log_id = _write_upload_log(session, job, result, status)
+
+        # Solo tras confirmar: si el commit falla el trabajo queda en error
+        job.result = result
+        job.error = result.get("error")
+        job.upload_log_id = upload_log_id
+        job.status = status
+    except Exception as e:
+        print(f"[IMPORT] Error en importación {job.id}: {str(e)}")
+        job.status = "error"
+        job.error = str(e)
+        _log_failure(job)
+    finally:
+        job.finished_at = time.time()
+        broadcaster.publish("reset", {"motivo": "importacion"})
+        print(
+            f"[IMPORT] Trabajo {job.id} {job.status}: {job.rows} filas "
+            f"en {job.finished_at - job.started_at:.1f}s"
+        )
+
+
+def _write_upload_log(session, job: ImportJob, result: dict, status: str) -> int:
+    grades = result.get("grados", [])
+    log = UploadLog(
+        filename=job.filename,
+        stored_path=job.stored_path,
+        grados=",".join(str(g) for g in grades),
+        created_count=result.get("creados", 0),
+        updated_count=result.get("actualizados", 0),
+        skipped_count=result.get("omitidos", 0),
+        errors_count=len(result.get("errores", [])),
+        content_hash=job.content_hash,
+        result_json=json.dumps(result),
+        status=status,
+        job_id=job.id,
+    )
+    session.add(log)
+    session.flush()
+    return log.id
+
+
+def _log_failure(job: ImportJob) -> None:
+    """UploadLog de un trabajo interrumpido, con lo que alcanzó a confirmar."""
+    partial = {
+        "error": job.error,
+        "creados": job.created,
+        "actualizados": job.updated,
+        "sin_cambios": job.unchanged,
+        "omitidos": job.skipped,
+        "errores": job.errors,
+    }
+    try:
+        with get_session() as session:
+            job.upload_log_id = _write_upload_log(session, job, partial, job.status)
+    except Exception as e:
+        print(f"[IMPORT] No se pudo registrar la importación fallida {job.id}: {str(e)}")
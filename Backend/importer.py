@@ -1,12 +1,18 @@
 import csv
+import hashlib
+import os
+import time
 from io import TextIOWrapper
 from pathlib import Path
+from typing import Callable
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, func, insert, select, update
 from sqlalchemy.orm import Session
 
+from config import Settings
+from db import upsert
 from models import Grade, Student
-from qr import ensure_qr
+from qr import generate_qr_batch
 
 
 EXPECTED_HEADERS = [
@@ -23,6 +29,38 @@ EXPECTED_HEADERS = [
 	"grado",
 ]
 
+# Filas por sentencia en las consultas IN y en el upsert multi-fila
+CHUNK_SIZE = 500
+
+UPDATE_FIELDS = (
+	"numero_estudiante",
+	"primer_apellido",
+	"segundo_apellido",
+	"primer_nombre",
+	"segundo_nombre",
+	"tipo_documento",
+	"correo",
+	"telefono_acudiente",
+	"telegram_id",
+	"grade_id",
+	"fingerprint",
+)
+
+# Campos normalizados que definen si una fila cambió respecto a la última importación
+FINGERPRINT_FIELDS = (
+	"numero_estudiante",
+	"primer_apellido",
+	"segundo_apellido",
+	"primer_nombre",
+	"segundo_nombre",
+	"tipo_documento",
+	"documento",
+	"correo",
+	"telefono_acudiente",
+	"telegram_id",
+	"grado",
+)
+
 
 def _normalize_header(value: str) -> str:
 	return value.strip().lower()
@@ -35,16 +73,149 @@ def _normalize_tipo(value: str) -> str:
 	return cleaned
 
 
-def _get_or_create_grade(session: Session, numero: int) -> Grade:
-	grade = session.scalar(select(Grade).where(Grade.numero == numero))
-	if grade is None:
-		grade = Grade(numero=numero)
-		session.add(grade)
-		session.flush()
-	return grade
+def _check_lengths(values: dict) -> None:
+	for field, value in values.items():
+		length = getattr(Student.__table__.c[field].type, "length", None)
+		if length and isinstance(value, str) and len(value) > length:
+			raise ValueError(f"{field} excede {length} caracteres")
+
+
+def _load_grades(session: Session, numeros: set[int]) -> dict[int, int]:
+	"""Retorna {numero: grade_id}, creando en bloque los grados que falten."""
+	if not numeros:
+		return {}
+	query = select(Grade.numero, Grade.id).where(Grade.numero.in_(numeros))
+	grade_ids = dict(session.execute(query).all())
+	missing = sorted(numeros - grade_ids.keys())
+	if missing:
+		session.execute(insert(Grade), [{"numero": numero} for numero in missing])
+		grade_ids = dict(session.execute(query).all())
+	return grade_ids
+
+
+def _fingerprint(values: dict) -> str:
+	"""Hash estable de la fila normalizada (incluye el número de grado)."""
+	content = "\x1f".join(
+		"" if values[field] is None else str(values[field]) for field in FINGERPRINT_FIELDS
+	)
+	return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
 
-def import_students(file_stream, session: Session, qr_dir: Path) -> dict:
+def _load_existing(
+	session: Session, documentos: list[str]
+) -> dict[str, tuple[str | None, str | None]]:
+	"""Retorna {documento: (qr_path, fingerprint)} de los estudiantes ya registrados."""
+	existing: dict[str, tuple[str | None, str | None]] = {}
+	for start in range(0, len(documentos), CHUNK_SIZE):
+		chunk = documentos[start:start + CHUNK_SIZE]
+		for documento, qr_path, fingerprint in session.execute(
+			select(Student.documento, Student.qr_path, Student.fingerprint)
+			.where(Student.documento.in_(chunk))
+		):
+			existing[documento] = (qr_path, fingerprint)
+	return existing
+
+
+def _upsert_students(session: Session, rows: list[dict]) -> None:
+	for start in range(0, len(rows), CHUNK_SIZE):
+		upsert(
+			session,
+			Student,
+			rows[start:start + CHUNK_SIZE],
+			keys=["documento"],
+			updates=lambda row: {
+				**{field: row[field] for field in UPDATE_FIELDS},
+				# No se pisa un QR ya generado
+				"qr_path": func.coalesce(Student.qr_path, row.qr_path),
+				# Una celda vacía no borra el chat vinculado por el bot o a mano
+				"telegram_id": func.coalesce(row.telegram_id, Student.telegram_id),
+			},
+		)
+
+
+def _apply_chunk(
+	session: Session,
+	parsed: dict[str, dict],
+	occurrences: dict[str, int],
+	grade_ids: dict[int, int],
+	needs_qr: list[str],
+) -> tuple[int, int, int]:
+	"""
+	Escribe un bloque de filas ya validadas.
+
+	Compara la huella de cada fila con la guardada y solo escribe las nuevas
+	o modificadas. Los documentos sin QR se agregan a needs_qr para
+	generarlos al final. Retorna (creados, actualizados, sin_cambios).
+	"""
+	missing_grades = {values["grado"] for values in parsed.values()} - grade_ids.keys()
+	grade_ids.update(_load_grades(session, missing_grades))
+	existing = _load_existing(session, list(parsed))
+
+	created = 0
+	updated = 0
+	unchanged = 0
+	rows: list[dict] = []
+	for documento, values in parsed.items():
+		fingerprint = _fingerprint(values)
+		qr_path, stored_fingerprint = existing.get(documento, (None, None))
+		if documento not in existing:
+			# Igual que antes: la primera aparición de un documento nuevo lo
+			# crea y las siguientes cuentan como actualizaciones
+			created += 1
+			updated += occurrences[documento] - 1
+		elif stored_fingerprint == fingerprint and qr_path:
+			unchanged += occurrences[documento]
+			continue
+		else:
+			updated += occurrences[documento]
+
+		if not qr_path:
+			needs_qr.append(documento)
+		grado = values.pop("grado")
+		rows.append({
+			**values,
+			"grade_id": grade_ids[grado],
+			"qr_path": qr_path,
+			"fingerprint": fingerprint,
+		})
+
+	_upsert_students(session, rows)
+	return created, updated, unchanged
+
+
+def _assign_qr_codes(session: Session, qr_dir: Path, documentos: list[str]) -> None:
+	"""Genera los QR pendientes en paralelo y guarda qr_path con un UPDATE por lotes."""
+	if not documentos:
+		return
+	paths = generate_qr_batch(qr_dir, documentos, _qr_workers())
+	stmt = (
+		update(Student.__table__)
+		.where(Student.__table__.c.documento == bindparam("doc"))
+		.values(qr_path=bindparam("path"))
+	)
+	params = [{"doc": documento, "path": path} for documento, path in paths.items()]
+	for start in range(0, len(params), CHUNK_SIZE):
+		session.execute(stmt, params[start:start + CHUNK_SIZE])
+
+
+def _qr_workers() -> int:
+	configured = Settings().qr_workers
+	return configured if configured > 0 else (os.cpu_count() or 1)
+
+
+def import_students(
+	file_stream,
+	session: Session,
+	qr_dir: Path,
+	on_chunk: Callable[[dict], None] | None = None,
+) -> dict:
+	"""
+	Importa estudiantes leyendo el CSV como flujo, en bloques de CHUNK_SIZE filas.
+
+	Si se pasa on_chunk, se llama después de escribir cada bloque con el
+	progreso parcial (mismas llaves del resultado más "filas"); el llamador
+	puede confirmar la transacción ahí para no mantenerla abierta todo el import.
+	"""
 	text_stream = TextIOWrapper(file_stream, encoding="utf-8-sig")
 	
 	# Leer una muestra para detectar el delimitador
@@ -72,73 +243,89 @@ def import_students(file_stream, session: Session, qr_dir: Path) -> dict:
 
 	created = 0
 	updated = 0
+	unchanged = 0
 	skipped = 0
+	rows_read = 0
 	grades_seen: set[int] = set()
+	grade_ids: dict[int, int] = {}
+	needs_qr: list[str] = []
 	errors: list[dict] = []
+	# Última versión de cada documento del bloque y cuántas veces aparece
+	parsed: dict[str, dict] = {}
+	occurrences: dict[str, int] = {}
+
+	def flush_chunk() -> None:
+		nonlocal created, updated, unchanged
+		if parsed:
+			chunk_created, chunk_updated, chunk_unchanged = _apply_chunk(
+				session, parsed, occurrences, grade_ids, needs_qr
+			)
+			created += chunk_created
+			updated += chunk_updated
+			unchanged += chunk_unchanged
+			parsed.clear()
+			occurrences.clear()
+		if on_chunk is not None:
+			on_chunk({
+				"filas": rows_read,
+				"creados": created,
+				"actualizados": updated,
+				"sin_cambios": unchanged,
+				"omitidos": skipped,
+				"errores": errors,
+			})
 
 	for idx, row in enumerate(reader, start=2):
+		rows_read += 1
 		try:
-			numero = int((row.get("numero") or "").strip())
-			primer_apellido = (row.get("primer_apellido") or "").strip()
-			segundo_apellido = (row.get("segundo_apellido") or "").strip() or None
-			primer_nombre = (row.get("primer_nombre") or "").strip()
-			segundo_nombre = (row.get("segundo_nombre") or "").strip() or None
-			tipo_documento = _normalize_tipo((row.get("tipo_documento") or "").strip())
-			documento = (row.get("documento") or "").strip()
-			correo = (row.get("correo") or "").strip() or None
-			telefono = (row.get("telefono_acudiente") or "").strip() or None
-			telegram_id = (row.get("telegram_id") or "").strip() or None
+			values = {
+				"numero_estudiante": int((row.get("numero") or "").strip()),
+				"primer_apellido": (row.get("primer_apellido") or "").strip(),
+				"segundo_apellido": (row.get("segundo_apellido") or "").strip() or None,
+				"primer_nombre": (row.get("primer_nombre") or "").strip(),
+				"segundo_nombre": (row.get("segundo_nombre") or "").strip() or None,
+				"tipo_documento": _normalize_tipo((row.get("tipo_documento") or "").strip()),
+				"documento": (row.get("documento") or "").strip(),
+				"correo": (row.get("correo") or "").strip() or None,
+				"telefono_acudiente": (row.get("telefono_acudiente") or "").strip() or None,
+				"telegram_id": (row.get("telegram_id") or "").strip() or None,
+			}
 			grado = int((row.get("grado") or "").strip())
 
-			if not (primer_apellido and primer_nombre and documento and tipo_documento):
+			if not (
+				values["primer_apellido"]
+				and values["primer_nombre"]
+				and values["documento"]
+				and values["tipo_documento"]
+			):
 				skipped += 1
 				continue
+			_check_lengths(values)
 
-			grade = _get_or_create_grade(session, grado)
+			documento = values["documento"]
 			grades_seen.add(grado)
-			student = session.scalar(
-				select(Student).where(Student.documento == documento)
-			)
-
-			if student is None:
-				student = Student(
-					numero_estudiante=numero,
-					primer_apellido=primer_apellido,
-					segundo_apellido=segundo_apellido,
-					primer_nombre=primer_nombre,
-					segundo_nombre=segundo_nombre,
-					tipo_documento=tipo_documento,
-					documento=documento,
-					correo=correo,
-					telefono_acudiente=telefono,
-					telegram_id=telegram_id,
-					grade=grade,
-				)
-				session.add(student)
-				created += 1
-			else:
-				student.numero_estudiante = numero
-				student.primer_apellido = primer_apellido
-				student.segundo_apellido = segundo_apellido
-				student.primer_nombre = primer_nombre
-				student.segundo_nombre = segundo_nombre
-				student.tipo_documento = tipo_documento
-				student.correo = correo
-				student.telefono_acudiente = telefono
-				student.telegram_id = telegram_id
-				student.grade = grade
-				updated += 1
-
-			if not student.qr_path:
-				student.qr_path = ensure_qr(qr_dir, documento)
+			parsed[documento] = {**values, "grado": grado}
+			occurrences[documento] = occurrences.get(documento, 0) + 1
 
 		except Exception as exc:
 			errors.append({"linea": idx, "error": str(exc)})
 
+		if len(parsed) >= CHUNK_SIZE:
+			flush_chunk()
+
+	flush_chunk()
+
+	qr_started = time.perf_counter()
+	_assign_qr_codes(session, qr_dir, needs_qr)
+	qr_seconds = time.perf_counter() - qr_started
+
 	return {
 		"creados": created,
 		"actualizados": updated,
+		"sin_cambios": unchanged,
 		"omitidos": skipped,
 		"errores": errors,
 		"grados": sorted(grades_seen),
+		"qr_generados": len(needs_qr),
+		"qr_segundos": round(qr_seconds, 2),
 	}
@@ -0,0 +1,78 @@
+"""
+Difusión en proceso de eventos de asistencia para ``GET /attendance/stream``.
+
+Cada dashboard conectado tiene un buffer acotado; publicar nunca bloquea: si
+el buffer de un cliente está lleno, ese cliente se desconecta y el check-in
+sigue sin esperar.
+"""
+
+import json
+import queue
+import threading
+from typing import Iterator
+
+from config import Settings
+
+
+HEARTBEAT_SECONDS = 15
+
+
+class Subscriber:
+    def __init__(self, buffer_size: int) -> None:
+        self.queue: queue.Queue[tuple[str, str]] = queue.Queue(maxsize=buffer_size)
+        self.dropped = threading.Event()
+
+
+class Broadcaster:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: set[Subscriber] = set()
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(max(1, Settings().sse_buffer_size))
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event: str, data: dict) -> None:
+        payload = json.dumps(data, default=str)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait((event, payload))
+            except queue.Full:
+                # Cliente lento: se descarta en vez de frenar a quien publica
+                subscriber.dropped.set()
+                self.unsubscribe(subscriber)
+                print("[LIVE_FEED] Cliente lento desconectado")
+
+    def stream(self, subscriber: Subscriber, initial: list[tuple[str, dict]]) -> Iterator[str]:
+        """Genera el cuerpo text/event-stream para un cliente ya suscrito."""
+        try:
+            for event, data in initial:
+                yield _format(event, json.dumps(data, default=str))
+            while not subscriber.dropped.is_set():
+                try:
+                    event, payload = subscriber.queue.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    # Comentario SSE para mantener viva la conexión en proxies
+                    yield ": ping\n\n"
+                    continue
+                yield _format(event, payload)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def _format(event: str, payload: str) -> str:
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+broadcaster = Broadcaster()
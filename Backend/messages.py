@@ -58,3 +58,60 @@ def build_absence_message(student, hora: str) -> str:
         f"del grado {student.grade.numero} "
         f"no ha registrado entrada hasta las {hora}."
     )
+
+
+def build_digest(messages: list[str]) -> str:
+    """
+    Une varios mensajes del mismo tipo para un acudiente en uno solo.
+
+    Usa el encabezado del primer mensaje y agrega el cuerpo de cada uno
+    (por ejemplo, las ausencias de hermanos de build_absence_message).
+
+    Args:
+        messages: Mensajes ya construidos, todos con el mismo encabezado
+
+    Returns:
+        Mensaje combinado
+    """
+    if len(messages) == 1:
+        return messages[0]
+    header, _, _ = messages[0].partition("\n\n")
+    bodies = [message.partition("\n\n")[2] or message for message in messages]
+    return header + "\n\n" + "\n\n".join(f"• {body}" for body in bodies)
+
+
+def build_link_message(status: str) -> str:
+    """
+    Respuesta del bot a un acudiente que envió /start <documento>.
+
+    Salvo cuando falta el documento, la respuesta es la misma sin importar
+    si el documento existe o ya estaba vinculado: así el bot no sirve para
+    averiguar qué documentos están matriculados. Por la misma razón no
+    incluye nombre ni documento del estudiante.
+
+    Args:
+        status: Resultado de telegram_updates (vinculado, ya_vinculado, ...)
+
+    Returns:
+        Mensaje para el acudiente
+    """
+    if status == "sin_documento":
+        return (
+            "👋 Edu Check\n\n"
+            "Para recibir las notificaciones de asistencia envía "
+            "/start seguido del documento del estudiante, por ejemplo: /start 1012345678"
+        )
+    return (
+        "📨 Edu Check\n\n"
+        "Recibimos tu solicitud. El colegio la revisará y, si corresponde a un "
+        "estudiante a tu cargo, te avisaremos por aquí cuando quede activa."
+    )
+
+
+def build_link_approved_message() -> str:
+    """Aviso al acudiente cuando el colegio aprueba su solicitud de vínculo."""
+    return (
+        "🔗 Edu Check - Acudiente Vinculado\n\n"
+        "El colegio aprobó tu solicitud. Desde ahora recibirás aquí las "
+        "entradas y ausencias del estudiante."
+    )
@@ -0,0 +1,148 @@
+"""
+Migraciones versionadas del esquema.
+
+La versión aplicada se guarda en ``schema_version``; al arrancar basta con
+leerla y, si coincide con la última migración, no se inspecciona nada más.
+Una base vacía se crea directamente con el esquema actual de models.py y se
+marca con la última versión. Una base anterior a este módulo (sin
+``schema_version``) parte de la versión 0 y recorre todas las migraciones.
+
+Cada migración corre en su propia transacción junto con el cambio de versión
+y debe poder repetirse sin error: en MySQL el DDL hace commit implícito, así
+que una migración interrumpida se vuelve a ejecutar completa. Para agregar
+una, se añade al final de MIGRATIONS y se refleja el cambio en models.py.
+"""
+
+from typing import Callable, NamedTuple
+
+from sqlalchemy import insert, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from models import Base, SchemaVersion
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def _create_tables(connection: Connection) -> None:
+    # Solo crea las tablas que falten; las existentes no se tocan
+    Base.metadata.create_all(connection)
+
+
+def _students_contact_columns(connection: Connection) -> None:
+    _add_column(connection, "students", "telefono_acudiente", "VARCHAR(20) NULL")
+    _add_column(connection, "students", "telegram_id", "VARCHAR(20) NULL")
+    _add_column(connection, "students", "fingerprint", "VARCHAR(64) NULL")
+
+
+def _upload_logs_result(connection: Connection) -> None:
+    _add_column(connection, "upload_logs", "content_hash", "VARCHAR(64) NULL")
+    _create_index(connection, "upload_logs", "ix_upload_logs_content_hash", ["content_hash"])
+    _add_column(connection, "upload_logs", "result_json", "MEDIUMTEXT NULL")
+
+
+def _outbox_retries(connection: Connection) -> None:
+    _add_column(connection, "notification_outbox", "attempts", "INT NOT NULL DEFAULT 0")
+    _add_column(connection, "notification_outbox", "next_attempt_at", "DATETIME NULL")
+
+
+def _date_indexes(connection: Connection) -> None:
+    # (fecha, student_id) también cubre las consultas que filtran solo por fecha
+    _create_index(connection, "attendance", "ix_attendance_fecha_student", ["fecha", "student_id"])
+    _create_index(connection, "notification_logs", "ix_notification_logs_fecha", ["fecha"])
+    _create_index(connection, "students", "ix_students_grade_id", ["grade_id"])
+
+
+def _upload_logs_status(connection: Connection) -> None:
+    _add_column(connection, "upload_logs", "status", "VARCHAR(20) NULL")
+    _add_column(connection, "upload_logs", "job_id", "VARCHAR(32) NULL")
+    _create_index(connection, "upload_logs", "ix_upload_logs_job_id", ["job_id"])
+    # Hasta ahora solo las importaciones completadas guardaban resultado
+    connection.execute(text(
+        "UPDATE upload_logs SET status = 'completado' "
+        "WHERE status IS NULL AND result_json IS NOT NULL"
+    ))
+
+
+def _roster_state(connection: Connection) -> None:
+    _create_tables(connection)
+
+
+def _outbox_status_index(connection: Connection) -> None:
+    _create_index(
+        connection, "notification_outbox", "ix_outbox_status_next_attempt", ["status", "next_attempt_at"]
+    )
+
+
+MIGRATIONS = [
+    Migration(1, "tablas faltantes", _create_tables),
+    Migration(2, "contacto y fingerprint de estudiantes", _students_contact_columns),
+    Migration(3, "hash y resultado de importaciones", _upload_logs_result),
+    Migration(4, "reintentos de la cola de notificaciones", _outbox_retries),
+    Migration(5, "índices por fecha y grado", _date_indexes),
+    Migration(6, "estado y trabajo de importaciones", _upload_logs_status),
+    Migration(7, "versión del listado para el índice de check-in", _roster_state),
+    Migration(8, "índice de la cola de notificaciones por estado", _outbox_status_index),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def migrate(engine: Engine) -> int:
+    """Lleva la base a LATEST_VERSION; retorna la versión final."""
+    with engine.connect() as connection:
+        current = _current_version(connection)
+    if current == LATEST_VERSION:
+        return current
+
+    if current is None:
+        with engine.connect() as connection:
+            empty = not inspect(connection).has_table("students")
+        if empty:
+            with engine.begin() as connection:
+                Base.metadata.create_all(connection)
+                _set_version(connection, LATEST_VERSION)
+            print(f"[MIGRATIONS] Esquema creado en la versión {LATEST_VERSION}")
+            return LATEST_VERSION
+        current = 0
+
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        with engine.begin() as connection:
+            migration.apply(connection)
+            _set_version(connection, migration.version)
+        print(f"[MIGRATIONS] {migration.version}: {migration.description}")
+    return LATEST_VERSION
+
+
+def _current_version(connection: Connection) -> int | None:
+    """Versión aplicada, o None si la base no tiene schema_version."""
+    if not inspect(connection).has_table(SchemaVersion.__tablename__):
+        return None
+    return connection.scalar(select(SchemaVersion.version).where(SchemaVersion.id == 1))
+
+
+def _set_version(connection: Connection, version: int) -> None:
+    SchemaVersion.__table__.create(connection, checkfirst=True)
+    exists = connection.scalar(select(SchemaVersion.id).where(SchemaVersion.id == 1))
+    if exists is None:
+        connection.execute(insert(SchemaVersion).values(id=1, version=version))
+    else:
+        connection.execute(
+            update(SchemaVersion).where(SchemaVersion.id == 1).values(version=version)
+        )
+
+
+def _add_column(connection: Connection, table: str, column: str, definition: str) -> None:
+    columns = {col["name"] for col in inspect(connection).get_columns(table)}
+    if column not in columns:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+
+
+def _create_index(connection: Connection, table: str, name: str, columns: list[str]) -> None:
+    indexes = {index["name"] for index in inspect(connection).get_indexes(table)}
+    if name not in indexes:
+        connection.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"))
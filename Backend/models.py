@@ -1,11 +1,21 @@
 from datetime import date, datetime, time
 
-from sqlalchemy import Boolean, Date, DateTime, ForeignKey, Integer, String, Time, UniqueConstraint, func
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, ForeignKey, Index, Integer, String, Text, Time, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from db import Base
 
 
+class SchemaVersion(Base):
+    """Versión de esquema aplicada (ver migrations.py); una sola fila (id=1)."""
+
+    __tablename__ = "schema_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
 class ClassDays(Base):
     __tablename__ = "class_days"
 
@@ -33,7 +43,10 @@ class Grade(Base):
 
 class Student(Base):
     __tablename__ = "students"
-    __table_args__ = (UniqueConstraint("documento", name="uq_students_documento"),)
+    __table_args__ = (
+        UniqueConstraint("documento", name="uq_students_documento"),
+        Index("ix_students_grade_id", "grade_id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     numero_estudiante: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -47,6 +60,8 @@ class Student(Base):
     telefono_acudiente: Mapped[str | None] = mapped_column(String(20), nullable=True)
     telegram_id: Mapped[str | None] = mapped_column(String(20), nullable=True)
     qr_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # Hash de la fila normalizada del último CSV importado (ver importer._fingerprint)
+    fingerprint: Mapped[str | None] = mapped_column(String(64), nullable=True)
 
     grade_id: Mapped[int] = mapped_column(ForeignKey("grades.id"), nullable=False)
     grade: Mapped[Grade] = relationship(back_populates="students")
@@ -63,6 +78,12 @@ class UploadLog(Base):
     updated_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     skipped_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     errors_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # SHA-256 del archivo subido y resultado completo, para responder re-subidas idénticas
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    result_json: Mapped[str | None] = mapped_column(Text(16_777_215), nullable=True)
+    # completado o error; el trabajo que la generó, para consultarlo desde cualquier proceso
+    status: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    job_id: Mapped[str | None] = mapped_column(String(32), nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
 
@@ -70,6 +91,8 @@ class Attendance(Base):
     __tablename__ = "attendance"
     __table_args__ = (
         UniqueConstraint("student_id", "fecha", name="uq_attendance_student_date"),
+        # Consultas por día o rango de días; también sirve como índice de fecha
+        Index("ix_attendance_fecha_student", "fecha", "student_id"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -82,6 +105,7 @@ class NotificationLog(Base):
     __tablename__ = "notification_logs"
     __table_args__ = (
         UniqueConstraint("student_id", "fecha", name="uq_notification_student_date"),
+        Index("ix_notification_logs_fecha", "fecha"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -90,3 +114,109 @@ class NotificationLog(Base):
     status: Mapped[str] = mapped_column(String(32), nullable=False)
     error: Mapped[str | None] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        UniqueConstraint("student_id", "fecha", "tipo", name="uq_outbox_student_date_tipo"),
+        # El despachador busca filas pendientes y vencidas en cada revisión
+        Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    student_id: Mapped[int] = mapped_column(ForeignKey("students.id"), nullable=False)
+    fecha: Mapped[date] = mapped_column(Date, nullable=False)
+    tipo: Mapped[str] = mapped_column(String(16), nullable=False)
+    chat_id: Mapped[str] = mapped_column(String(20), nullable=False)
+    hora: Mapped[str] = mapped_column(String(5), nullable=False)
+    message: Mapped[str] = mapped_column(String(1024), nullable=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="pending")
+    error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    claim_token: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
+class AlertSchedule(Base):
+    """Hora de la alerta de ausencia para un grupo de grados (p. ej. una jornada)."""
+
+    __tablename__ = "alert_schedules"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    nombre: Mapped[str] = mapped_column(String(50), nullable=False)
+    hora: Mapped[str] = mapped_column(String(5), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+    grades: Mapped[list["AlertScheduleGrade"]] = relationship(
+        back_populates="schedule", cascade="all, delete-orphan"
+    )
+
+
+class AlertScheduleGrade(Base):
+    __tablename__ = "alert_schedule_grades"
+    # Un grado pertenece a lo sumo a un horario
+    __table_args__ = (UniqueConstraint("grade_id", name="uq_alert_schedule_grades_grade"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    schedule_id: Mapped[int] = mapped_column(ForeignKey("alert_schedules.id"), nullable=False)
+    grade_id: Mapped[int] = mapped_column(ForeignKey("grades.id"), nullable=False)
+
+    schedule: Mapped[AlertSchedule] = relationship(back_populates="grades")
+
+
+class DailyGradeStats(Base):
+    __tablename__ = "daily_grade_stats"
+    __table_args__ = (
+        UniqueConstraint("fecha", "grade_id", name="uq_daily_grade_stats_date_grade"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    fecha: Mapped[date] = mapped_column(Date, nullable=False)
+    grade_id: Mapped[int] = mapped_column(ForeignKey("grades.id"), nullable=False)
+    present: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    enrolled: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class TelegramPollState(Base):
+    """Último update_id confirmado de getUpdates; una sola fila (id=1)."""
+
+    __tablename__ = "telegram_poll_state"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    last_update_id: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    polled_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+
+class RosterState(Base):
+    """
+    Versión del listado para el índice de check-in; una sola fila (id=1).
+
+    Toda escritura que cambia estudiantes o borra asistencias la incrementa
+    en su transacción, así cada proceso sabe cuándo recargar su índice.
+    """
+
+    __tablename__ = "roster_state"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class TelegramUpdate(Base):
+    """Mensaje recibido por el bot y el resultado de procesarlo."""
+
+    __tablename__ = "telegram_updates"
+
+    update_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    chat_id: Mapped[str] = mapped_column(String(20), nullable=False)
+    username: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    text: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    documento: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    student_id: Mapped[int | None] = mapped_column(ForeignKey("students.id"), nullable=True)
+    # pendiente, vinculado, rechazado, ya_vinculado, no_encontrado, sin_documento, ignorado
+    status: Mapped[str] = mapped_column(String(16), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -1,12 +1,19 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, datetime, timedelta
+from io import BytesIO
 from pathlib import Path
+from pypdf import PdfWriter
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from sqlalchemy import and_
+from sqlalchemy import distinct, func, select
+from class_calendar import class_dates, get_class_days, school_today
+from config import Settings
 from db import get_session
 from models import Student, Attendance, Grade
 
@@ -15,109 +22,83 @@ REPORTS_DIR = Path(__file__).parent / "monthly_reports"
 REPORTS_DIR.mkdir(exist_ok=True)
 
 
-def get_month_absent_students() -> dict:
+def _month_bounds(year: int, month: int) -> tuple[date, date]:
+    month_start = date(year, month, 1)
+    if month == 12:
+        month_end = date(year, 12, 31)
+    else:
+        month_end = date(year, month + 1, 1) - timedelta(days=1)
+    return month_start, month_end
+
+
+def get_month_absent_students(year: int | None = None, month: int | None = None) -> dict:
     """
-    Obtiene todos los estudiantes inasistentes del mes actual
+    Obtiene todos los estudiantes inasistentes del mes (por defecto el actual)
     Retorna un diccionario con el formato: {grado: [estudiantes_inasistentes]}
+
+    Los días esperados son los días de clase configurados en ClassDays hasta
+    hoy (fecha en la zona horaria del colegio); las asistencias se cuentan con una sola consulta agrupada por
+    estudiante, sin importar cuántos estudiantes haya.
     """
     try:
-        with get_session() as session:
-            today = date.today()
-            month_start = date(today.year, today.month, 1)
-            month_end = date(today.year, today.month, 28)  # Fallback a 28 para febrero
-            
-            # Ajustar mes_end al último día del mes
-            if today.month == 12:
-                month_end = date(today.year, today.month, 31)
-            else:
-                month_end = date(today.year, today.month + 1, 1) - timedelta(days=1)
-            
-            # Obtener todos los grados
-            grades = session.query(Grade).order_by(Grade.numero).all()
-            
-            absent_by_grade = {}
-            
-            for grade in grades:
-                # Obtener todos los estudiantes del grado
-                students = session.query(Student).filter(
-                    Student.grade_id == grade.id
-                ).order_by(Student.primer_apellido, Student.segundo_apellido).all()
-                
-                if not students:
-                    continue
-                
-                absent_students = []
-                
-                for student in students:
-                    # Contar días de clase en el mes
-                    # Para esto necesitamos verificar si el estudiante asistió esos días
-                    # Primero, obtener todos los días únicos con asistencias en el mes
-                    attendance_days = session.query(Attendance.fecha).filter(
-                        and_(
-                            Attendance.fecha >= month_start,
-                            Attendance.fecha <= month_end
-                        )
-                    ).distinct().all()
-                    
-                    # Convertir a lista de fechas
-                    dias_clase = [day[0] for day in attendance_days]
-                    
-                    # Contar asistencias del estudiante
-                    student_attendance = session.query(Attendance).filter(
-                        and_(
-                            Attendance.student_id == student.id,
-                            Attendance.fecha >= month_start,
-                            Attendance.fecha <= month_end
-                        )
-                    ).count()
-                    
-                    # Calcular ausencias
-                    dias_esperados = len(dias_clase)
-                    ausencias = dias_esperados - student_attendance
-                    
-                    # Si tiene ausencias, agregarlo a la lista
-                    if ausencias > 0:
-                        full_name = f"{student.primer_apellido} {student.segundo_apellido or ''} {student.primer_nombre} {student.segundo_nombre or ''}".strip()
-                        absent_students.append({
-                            "nombre": full_name,
-                            "documento": student.documento,
-                            "ausencias": ausencias,
-                            "total_dias": dias_esperados
-                        })
-                
-                if absent_students:
-                    absent_by_grade[grade.numero] = absent_students
-            
-            return absent_by_grade
+        today = school_today(Settings())
+        year = year or today.year
+        month = month or today.month
+        month_start, month_end = _month_bounds(year, month)
+
+        with get_session(read_only=True) as session:
+            # Días de clase del mes que ya transcurrieron
+            dias_clase = class_dates(get_class_days(session), month_start, min(month_end, today))
+            if not dias_clase:
+                return {}
+            dias_esperados = len(dias_clase)
+
+            attended = dict(
+                session.execute(
+                    select(Attendance.student_id, func.count(distinct(Attendance.fecha)))
+                    .where(Attendance.fecha.in_(dias_clase))
+                    .group_by(Attendance.student_id)
+                ).all()
+            )
+
+            students = session.execute(
+                select(
+                    Student.id,
+                    Student.primer_apellido,
+                    Student.segundo_apellido,
+                    Student.primer_nombre,
+                    Student.segundo_nombre,
+                    Student.documento,
+                    Grade.numero,
+                )
+                .join(Grade, Student.grade_id == Grade.id)
+                .order_by(Grade.numero, Student.primer_apellido, Student.segundo_apellido)
+            ).all()
+
+        absent_by_grade: dict[int, list[dict]] = {}
+        for student in students:
+            ausencias = dias_esperados - attended.get(student.id, 0)
+            if ausencias <= 0:
+                continue
+            parts = [student.primer_apellido, student.segundo_apellido,
+                     student.primer_nombre, student.segundo_nombre]
+            absent_by_grade.setdefault(student.numero, []).append({
+                "nombre": " ".join(p for p in parts if p),
+                "documento": student.documento,
+                "ausencias": ausencias,
+                "total_dias": dias_esperados,
+            })
+
+        return absent_by_grade
     except Exception as e:
         print(f"[MONTHLY_REPORTS] Error en get_month_absent_students: {str(e)}")
         return {}
 
 
-def generate_monthly_report() -> str | None:
-    """
-    Genera un PDF con los inasistentes del mes actual
-    Retorna la ruta del archivo generado
-    """
-    try:
-        today = date.today()
-        absent_data = get_month_absent_students()
-        
-        if not absent_data:
-            print("[MONTHLY_REPORTS] No hay inasistentes para reportar")
-            return None
-        
-        # Crear nombre del archivo
-        filename = f"inasistentes_{today.year:04d}_{today.month:02d}.pdf"
-        filepath = REPORTS_DIR / filename
-        
-        # Crear documento PDF
-        doc = SimpleDocTemplate(str(filepath), pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-        story = []
-        
-        # Estilos
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
+def _report_styles() -> dict:
+    styles = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle(
             'CustomTitle',
             parent=styles['Heading1'],
             fontSize=16,
@@ -125,18 +106,16 @@ def generate_monthly_report() -> str | None:
             spaceAfter=6,
             alignment=TA_CENTER,
             fontName='Helvetica-Bold'
-        )
-        
-        subtitle_style = ParagraphStyle(
+        ),
+        "subtitle": ParagraphStyle(
             'CustomSubtitle',
             parent=styles['Normal'],
             fontSize=11,
             textColor=colors.HexColor('#666666'),
             spaceAfter=12,
             alignment=TA_CENTER
-        )
-        
-        grade_style = ParagraphStyle(
+        ),
+        "grade": ParagraphStyle(
             'GradeTitle',
             parent=styles['Heading2'],
             fontSize=13,
@@ -144,69 +123,158 @@ def generate_monthly_report() -> str | None:
             spaceAfter=10,
             spaceBefore=10,
             fontName='Helvetica-Bold'
-        )
-        
+        ),
+    }
+
+
+def _render_grade_section(
+    year: int,
+    month: int,
+    generated_on: date,
+    grade_number: int,
+    students: list[dict],
+    include_header: bool,
+) -> bytes:
+    """
+    Renderiza la sección de un grado como un PDF independiente.
+
+    Se ejecuta en un proceso del pool, por eso recibe solo datos simples y
+    retorna los bytes del PDF para que el proceso principal los una.
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    styles = _report_styles()
+    story = []
+
+    if include_header:
         # Título principal
-        title = Paragraph(f"Reporte de Inasistentes - {today.strftime('%B %Y').capitalize()}", title_style)
-        story.append(title)
-        
-        subtitle = Paragraph(
-            f"Generado el {today.strftime('%d de %B de %Y')}",
-            subtitle_style
-        )
-        story.append(subtitle)
+        month_label = date(year, month, 1).strftime('%B %Y').capitalize()
+        story.append(Paragraph(f"Reporte de Inasistentes - {month_label}", styles["title"]))
+        story.append(Paragraph(
+            f"Generado el {generated_on.strftime('%d de %B de %Y')}",
+            styles["subtitle"]
+        ))
         story.append(Spacer(1, 0.3*inch))
-        
-        # Por cada grado
-        for grade_number in sorted(absent_data.keys()):
-            students = absent_data[grade_number]
-            
-            # Título del grado
-            grade_title = Paragraph(f"Grado {grade_number} - {len(students)} Inasistentes", grade_style)
-            story.append(grade_title)
-            
-            # Tabla de estudiantes
-            table_data = [
-                ['Nombre Completo', 'Identificación', 'Ausencias']
-            ]
-            
-            for student in students:
-                table_data.append([
-                    student['nombre'],
-                    student['documento'],
-                    f"{student['ausencias']} de {student['total_dias']}"
-                ])
-            
-            table = Table(table_data, colWidths=[3.5*inch, 1.5*inch, 1.5*inch])
-            table.setStyle(TableStyle([
-                # Header
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a5490')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('TOPPADDING', (0, 0), (-1, 0), 8),
-                
-                # Datos
-                ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f0f0')]),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#cccccc')),
-                ('TOPPADDING', (0, 1), (-1, -1), 6),
-                ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-            ]))
-            
-            story.append(table)
-            story.append(Spacer(1, 0.4*inch))
-        
-        # Generar PDF
-        doc.build(story)
+
+    # Título del grado
+    story.append(Paragraph(f"Grado {grade_number} - {len(students)} Inasistentes", styles["grade"]))
+
+    # Tabla de estudiantes
+    table_data = [
+        ['Nombre Completo', 'Identificación', 'Ausencias']
+    ]
+
+    for student in students:
+        table_data.append([
+            student['nombre'],
+            student['documento'],
+            f"{student['ausencias']} de {student['total_dias']}"
+        ])
+
+    table = Table(table_data, colWidths=[3.5*inch, 1.5*inch, 1.5*inch])
+    table.setStyle(TableStyle([
+        # Header
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a5490')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('TOPPADDING', (0, 0), (-1, 0), 8),
+
+        # Datos
+        ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f0f0')]),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#cccccc')),
+        ('TOPPADDING', (0, 1), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+    ]))
+
+    story.append(table)
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _report_workers() -> int:
+    configured = Settings().report_workers
+    return configured if configured > 0 else (os.cpu_count() or 1)
+
+
+def generate_reports(months: list[tuple[int, int]]) -> list[str]:
+    """
+    Genera los PDF de inasistentes de varios meses.
+
+    Los datos se consultan en el proceso principal; cada sección de grado de
+    cada mes se renderiza en un pool de procesos y las partes se unen en un
+    PDF por mes. Retorna las rutas generadas (se omiten meses sin inasistentes).
+    """
+    generated_on = school_today(Settings())
+    tasks = []
+    for year, month in months:
+        absent_data = get_month_absent_students(year, month)
+        if not absent_data:
+            print(f"[MONTHLY_REPORTS] No hay inasistentes para {year:04d}-{month:02d}")
+            continue
+        for position, grade_number in enumerate(sorted(absent_data)):
+            tasks.append((
+                (year, month),
+                (year, month, generated_on, grade_number, absent_data[grade_number], position == 0),
+            ))
+    if not tasks:
+        return []
+
+    workers = min(_report_workers(), len(tasks))
+    if workers > 1:
+        # spawn evita heredar conexiones e hilos del servidor en los workers
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            parts = list(pool.map(_render_grade_section, *zip(*(args for _, args in tasks))))
+    else:
+        parts = [_render_grade_section(*args) for _, args in tasks]
+
+    parts_by_month: dict[tuple[int, int], list[bytes]] = {}
+    for (key, _), part in zip(tasks, parts):
+        parts_by_month.setdefault(key, []).append(part)
+
+    paths = []
+    for (year, month), month_parts in parts_by_month.items():
+        filepath = REPORTS_DIR / f"inasistentes_{year:04d}_{month:02d}.pdf"
+        writer = PdfWriter()
+        for part in month_parts:
+            writer.append(BytesIO(part))
+        with open(filepath, "wb") as output:
+            writer.write(output)
         print(f"[MONTHLY_REPORTS] PDF generado: {filepath}")
-        return str(filepath)
-    
+        paths.append(str(filepath))
+    return paths
+
+
+def months_between(start: tuple[int, int], end: tuple[int, int]) -> list[tuple[int, int]]:
+    """Lista (año, mes) desde start hasta end, ambos inclusive."""
+    months = []
+    year, month = start
+    while (year, month) <= end:
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def generate_monthly_report(year: int | None = None, month: int | None = None) -> str | None:
+    """
+    Genera un PDF con los inasistentes de un mes (por defecto el actual)
+    Retorna la ruta del archivo generado
+    """
+    try:
+        today = school_today(Settings())
+        paths = generate_reports([(year or today.year, month or today.month)])
+        if not paths:
+            print("[MONTHLY_REPORTS] No hay inasistentes para reportar")
+            return None
+        return paths[0]
+
     except Exception as e:
         print(f"[MONTHLY_REPORTS] Error generando reporte: {str(e)}")
         return None
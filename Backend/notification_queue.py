@@ -0,0 +1,397 @@
+"""
+Cola persistente de notificaciones de Telegram.
+
+El check-in y las alertas de ausencia solo insertan filas en
+``notification_outbox`` dentro de su transacción; un hilo despachador reclama
+lotes pendientes y los envía con un pool de hilos. Cada fila se marca apenas
+termina su envío, así un proceso reiniciado retoma exactamente lo que faltaba.
+Los envíos fallidos vuelven a la cola con espera exponencial hasta agotar
+``NOTIFY_MAX_ATTEMPTS``; el ``NotificationLog`` se escribe con el resultado final.
+Los mensajes del mismo tipo y día para un mismo chat (hermanos con el mismo
+acudiente) se envían como un solo resumen. Una alerta de ausencia que aún no
+salió se cancela si el estudiante registra entrada antes del envío.
+"""
+
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import Settings
+from db import get_session, insert_ignore
+from messages import build_digest
+from models import Attendance, NotificationLog, NotificationOutbox, Student
+from telegram import TelegramClient
+
+
+BATCH_SIZE = 50
+# Filas que quedaron en "sending" más de este tiempo se consideran huérfanas
+# (proceso caído a mitad de envío) y vuelven a la cola. claimed_at se renueva
+# antes de enviar cada grupo y un envío dura a lo sumo
+# (MAX_RATE_LIMIT_RETRIES + 1) * (timeout + MAX_RETRY_AFTER) ≈ 5 min.
+STALE_CLAIM = timedelta(minutes=15)
+# Estados finales que la limpieza puede borrar
+FINISHED_STATUSES = ("sent", "error", "skipped", "cancelado")
+PRUNE_BATCH = 5000
+# Espera antes del primer reintento; se duplica en cada intento fallido
+RETRY_BASE = timedelta(seconds=30)
+# Telegram acepta hasta 4096 caracteres; un resumen más largo se divide
+MAX_DIGEST_LENGTH = 3500
+
+_wake = threading.Event()
+_dispatcher: threading.Thread | None = None
+_executor: ThreadPoolExecutor | None = None
+
+
+def enqueue_notification(
+    session: Session,
+    student,
+    fecha: date,
+    tipo: str,
+    hora: str,
+    message: str,
+    delay_seconds: int = 0,
+) -> NotificationOutbox:
+    """
+    Agrega un mensaje a la cola en la transacción del llamador.
+
+    Con delay_seconds el mensaje espera ese tiempo antes de enviarse, para
+    unirse con otros del mismo tipo hacia el mismo chat.
+    """
+    item = NotificationOutbox(
+        student_id=student.id,
+        fecha=fecha,
+        tipo=tipo,
+        chat_id=student.telegram_id,
+        hora=hora,
+        message=message,
+        status="pending",
+        next_attempt_at=(
+            datetime.utcnow() + timedelta(seconds=delay_seconds) if delay_seconds > 0 else None
+        ),
+    )
+    session.add(item)
+    return item
+
+
+def enqueue_many(session: Session, rows: list[dict]) -> int:
+    """
+    Encola varios mensajes con un solo INSERT IGNORE (INSERT OR IGNORE en SQLite).
+
+    Las filas que ya existen para (student_id, fecha, tipo) se descartan, así
+    que repetir el encolado no duplica mensajes. Retorna cuántas se insertaron.
+    """
+    if not rows:
+        return 0
+    stmt = insert_ignore(NotificationOutbox)
+    values = [{**row, "status": "pending", "attempts": 0} for row in rows]
+    inserted = 0
+    for start in range(0, len(values), BATCH_SIZE * 10):
+        result = session.execute(stmt.values(values[start:start + BATCH_SIZE * 10]))
+        inserted += result.rowcount
+    return inserted
+
+
+def wake_workers() -> None:
+    """Despierta al despachador para que no espere al siguiente sondeo."""
+    _wake.set()
+
+
+def start_notification_workers() -> None:
+    global _dispatcher, _executor
+    if _dispatcher is not None:
+        return
+
+    settings = Settings()
+    _executor = ThreadPoolExecutor(
+        max_workers=max(1, settings.notify_workers),
+        thread_name_prefix="notify",
+    )
+    _dispatcher = threading.Thread(
+        target=_dispatch_loop,
+        args=(settings,),
+        name="notify-dispatcher",
+        daemon=True,
+    )
+    _dispatcher.start()
+    _wake.set()
+
+
+def _dispatch_loop(settings: Settings) -> None:
+    client = TelegramClient(settings)
+    while True:
+        _wake.wait(timeout=settings.notify_poll_seconds)
+        _wake.clear()
+        try:
+            drain_outbox(client, settings.notify_max_attempts)
+        except Exception as e:
+            print(f"[NOTIFY] Error procesando la cola: {str(e)}")
+
+
+def drain_outbox(client: TelegramClient, max_attempts: int) -> int:
+    """Envía todo lo pendiente en lotes; retorna cuántos mensajes procesó."""
+    _release_stale_claims()
+    processed = 0
+    while True:
+        batch = _claim_batch(BATCH_SIZE)
+        if not batch:
+            return processed
+        groups = _group_by_chat(batch)
+        if _executor is None:
+            for group in groups:
+                for result in _deliver(client, group):
+                    _finish_one(result, max_attempts)
+        else:
+            futures = [_executor.submit(_deliver, client, group) for group in groups]
+            for future in as_completed(futures):
+                for result in future.result():
+                    _finish_one(result, max_attempts)
+        processed += len(batch)
+
+
+def _release_stale_claims() -> None:
+    limit = datetime.utcnow() - STALE_CLAIM
+    with get_session() as session:
+        session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.status == "sending")
+            .where(NotificationOutbox.claimed_at < limit)
+            .values(status="pending", claim_token=None, claimed_at=None)
+        )
+
+
+def _claim_batch(size: int) -> list[dict]:
+    """
+    Reclama filas pendientes junto con las de su mismo chat, tipo y fecha.
+
+    Así los mensajes de hermanos con el mismo acudiente salen en el mismo
+    lote aunque alguno aún esté dentro de su ventana de espera. Las filas que
+    esperan un reintento (attempts > 0) solo se incluyen cuando ya vencieron,
+    para no saltarse la espera exponencial.
+    """
+    token = uuid.uuid4().hex
+    now = datetime.utcnow()
+    is_due = or_(
+        NotificationOutbox.next_attempt_at.is_(None),
+        NotificationOutbox.next_attempt_at <= now,
+    )
+    with get_session() as session:
+        _cancel_attended_absences(session)
+        due = session.execute(
+            select(
+                NotificationOutbox.id,
+                NotificationOutbox.chat_id,
+                NotificationOutbox.tipo,
+                NotificationOutbox.fecha,
+            )
+            .where(NotificationOutbox.status == "pending")
+            .where(is_due)
+            .order_by(NotificationOutbox.id)
+            .limit(size)
+        ).all()
+        if not due:
+            return []
+        keys = {(row.chat_id, row.tipo, row.fecha) for row in due}
+        siblings = session.scalars(
+            select(NotificationOutbox.id)
+            .where(NotificationOutbox.status == "pending")
+            # En su ventana de unión (nunca enviada) o ya vencida
+            .where(or_(NotificationOutbox.attempts == 0, is_due))
+            .where(
+                tuple_(
+                    NotificationOutbox.chat_id,
+                    NotificationOutbox.tipo,
+                    NotificationOutbox.fecha,
+                ).in_(list(keys))
+            )
+        ).all()
+        ids = {row.id for row in due} | set(siblings)
+        # El filtro por status evita que dos procesos reclamen la misma fila
+        session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(ids))
+            .where(NotificationOutbox.status == "pending")
+            .values(status="sending", claim_token=token, claimed_at=now)
+        )
+        session.flush()
+        # El chat se toma del estudiante, no del encolado: pudo cambiar de
+        # acudiente (o quedar sin chat) mientras el mensaje esperaba.
+        rows = session.execute(
+            select(
+                NotificationOutbox.id,
+                NotificationOutbox.student_id,
+                NotificationOutbox.fecha,
+                NotificationOutbox.tipo,
+                Student.telegram_id.label("chat_id"),
+                NotificationOutbox.message,
+                NotificationOutbox.attempts,
+            )
+            .join(Student, Student.id == NotificationOutbox.student_id)
+            .where(NotificationOutbox.claim_token == token)
+            .order_by(NotificationOutbox.id)
+        ).all()
+        unlinked = [row.id for row in rows if not row.chat_id]
+        if unlinked:
+            session.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(unlinked))
+                .values(
+                    status="skipped",
+                    error="Estudiante sin telegram_id",
+                    claim_token=None,
+                    sent_at=now,
+                )
+            )
+    claimed = [row._asdict() for row in rows if row.chat_id]
+    if rows and not claimed:
+        # Todo el lote quedó omitido; puede haber más filas pendientes detrás
+        return _claim_batch(size)
+    return claimed
+
+
+def _cancel_attended_absences(session: Session) -> None:
+    """
+    Cancela las alertas de ausencia pendientes de estudiantes que ya registraron
+    entrada; entre el encolado y el envío pueden pasar minutos (límites por
+    chat, reintentos) y el acudiente no debe recibir un aviso falso.
+    """
+    attended = (
+        select(Attendance.id)
+        .where(Attendance.student_id == NotificationOutbox.student_id)
+        .where(Attendance.fecha == NotificationOutbox.fecha)
+        .exists()
+    )
+    result = session.execute(
+        update(NotificationOutbox)
+        .where(NotificationOutbox.status == "pending")
+        .where(NotificationOutbox.tipo == "ausencia")
+        .where(attended)
+        .values(status="cancelado", error="Registró entrada antes del envío")
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        print(f"[NOTIFY] {result.rowcount} alertas de ausencia canceladas por entrada registrada")
+
+
+def _group_by_chat(batch: list[dict]) -> list[list[dict]]:
+    """Agrupa por chat, tipo y fecha sin pasar el largo máximo de Telegram."""
+    groups: dict[tuple, list[list[dict]]] = {}
+    for item in batch:
+        parts = groups.setdefault((item["chat_id"], item["tipo"], item["fecha"]), [[]])
+        current = parts[-1]
+        length = sum(len(row["message"]) for row in current) + len(item["message"])
+        if current and length > MAX_DIGEST_LENGTH:
+            current = []
+            parts.append(current)
+        current.append(item)
+    return [group for parts in groups.values() for group in parts]
+
+
+def _deliver(client: TelegramClient, group: list[dict]) -> list[dict]:
+    # El grupo pudo esperar en el pool tras reclamarse: se renueva el reclamo
+    _refresh_claim([item["id"] for item in group])
+    message = build_digest([item["message"] for item in group])
+    try:
+        status, error = client.send_text(group[0]["chat_id"], message)
+    except Exception as e:
+        status, error = "error", f"Unexpected error: {str(e)}"
+    return [{**item, "status": status, "error": error} for item in group]
+
+
+def _refresh_claim(ids: list[int]) -> None:
+    with get_session() as session:
+        session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(ids))
+            .where(NotificationOutbox.status == "sending")
+            .values(claimed_at=datetime.utcnow())
+        )
+
+
+def prune_outbox(retention_days: int) -> int:
+    """
+    Borra de la cola los mensajes resueltos hace más de retention_days días.
+
+    El resultado de cada envío ya quedó en notification_logs. Se borra por
+    bloques para no retener bloqueos largos sobre la cola.
+    """
+    if retention_days <= 0:
+        return 0
+    limit = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        with get_session() as session:
+            ids = session.scalars(
+                select(NotificationOutbox.id)
+                .where(NotificationOutbox.status.in_(FINISHED_STATUSES))
+                .where(NotificationOutbox.created_at < limit)
+                .limit(PRUNE_BATCH)
+            ).all()
+            if not ids:
+                return deleted
+            session.execute(delete(NotificationOutbox).where(NotificationOutbox.id.in_(ids)))
+        deleted += len(ids)
+
+
+def _finish_one(result: dict, max_attempts: int) -> None:
+    """Registra el resultado de una entrega en su propia transacción."""
+    now = datetime.utcnow()
+    error = (result["error"] or "")[:255] or None
+    attempts = result["attempts"] + 1
+    with get_session() as session:
+        if result["status"] == "error" and attempts < max_attempts:
+            retry_at = now + RETRY_BASE * (2 ** (attempts - 1))
+            session.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id == result["id"])
+                .values(
+                    status="pending",
+                    error=error,
+                    attempts=attempts,
+                    next_attempt_at=retry_at,
+                    claim_token=None,
+                    claimed_at=None,
+                )
+            )
+            return
+        session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id == result["id"])
+            .values(
+                status=result["status"],
+                error=error,
+                attempts=attempts,
+                claim_token=None,
+                sent_at=now,
+            )
+        )
+        _log_delivery(session, result["student_id"], result["fecha"], result["status"], error)
+
+
+def _log_delivery(
+    session: Session, student_id: int, fecha: date, status: str, error: str | None
+) -> None:
+    existing = session.scalar(
+        select(NotificationLog.id)
+        .where(NotificationLog.student_id == student_id)
+        .where(NotificationLog.fecha == fecha)
+    )
+    if existing is not None:
+        return
+    try:
+        with session.begin_nested():
+            session.add(
+                NotificationLog(
+                    student_id=student_id,
+                    fecha=fecha,
+                    status=status,
+                    error=error,
+                )
+            )
+    except IntegrityError:
+        # Otro proceso registró la notificación del día entre la consulta y el insert
+        pass
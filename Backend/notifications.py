@@ -2,11 +2,11 @@ from datetime import datetime
 
 import pytz
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
 from config import Settings
-from models import Attendance, NotificationLog, Student
-from telegram import TelegramClient
+from models import Attendance, NotificationLog, NotificationOutbox, Student
+from notification_queue import enqueue_many, wake_workers
 from messages import build_absence_message
 
 
@@ -20,51 +20,66 @@ def _get_alert_time(settings: Settings) -> str:
     return settings.alert_time
 
 
-def send_absence_alerts(session: Session, settings: Settings) -> dict:
-    today = _today_date(settings)
-    alert_time = _get_alert_time(settings)
-
-    attended_ids = session.scalars(
-        select(Attendance.student_id).where(Attendance.fecha == today)
-    ).all()
-    attended_set = set(attended_ids)
+def send_absence_alerts(
+    session: Session,
+    settings: Settings,
+    grade_ids: list[int] | None = None,
+    alert_time: str | None = None,
+) -> dict:
+    """
+    Encola las alertas de ausencia del día; el despachador de la cola las envía
+    agrupadas en un solo mensaje por acudiente.
 
-    notified_ids = session.scalars(
-        select(NotificationLog.student_id).where(NotificationLog.fecha == today)
-    ).all()
-    notified_set = set(notified_ids)
+    Es idempotente: los estudiantes ya encolados o notificados hoy se omiten,
+    así que repetir la alerta (o reiniciar a mitad de envío) no duplica mensajes.
 
-    students = session.scalars(select(Student)).all()
-    client = TelegramClient(settings)
+    Args:
+        grade_ids: Limita la alerta a estos grados (None = todos)
+        alert_time: Hora que se muestra en el mensaje (None = ALERT_TIME)
+    """
+    today = _today_date(settings)
+    alert_time = alert_time or _get_alert_time(settings)
+    if grade_ids is not None and not grade_ids:
+        return {"encolados": 0, "skipped": 0}
+
+    attended = select(Attendance.student_id).where(Attendance.fecha == today)
+    notified = select(NotificationLog.student_id).where(NotificationLog.fecha == today)
+    queued = (
+        select(NotificationOutbox.student_id)
+        .where(NotificationOutbox.fecha == today)
+        .where(NotificationOutbox.tipo == "ausencia")
+    )
+    # Solo los ausentes pendientes, con el grado cargado para los mensajes
+    query = (
+        select(Student)
+        .options(selectinload(Student.grade))
+        .where(Student.id.not_in(attended))
+        .where(Student.id.not_in(notified))
+        .where(Student.id.not_in(queued))
+    )
+    if grade_ids is not None:
+        query = query.where(Student.grade_id.in_(grade_ids))
+    students = session.scalars(query).all()
 
-    sent = 0
     skipped = 0
-    errors = 0
-
+    rows = []
     for student in students:
-        if student.id in attended_set:
-            continue
-        if student.id in notified_set:
-            continue
         if not student.telegram_id:
             skipped += 1
             continue
-
-        message = build_absence_message(student, alert_time)
-        status, error = client.send_text(student.telegram_id, message)
-        log = NotificationLog(
-            student_id=student.id,
-            fecha=today,
-            status=status,
-            error=error,
-        )
-        session.add(log)
-
-        if status == "sent":
-            sent += 1
-        elif status == "skipped":
-            skipped += 1
-        else:
-            errors += 1
-
-    return {"sent": sent, "skipped": skipped, "errors": errors}
+        rows.append({
+            "student_id": student.id,
+            "fecha": today,
+            "tipo": "ausencia",
+            "chat_id": student.telegram_id,
+            "hora": alert_time,
+            "message": build_absence_message(student, alert_time),
+        })
+
+    queued_count = enqueue_many(session, rows)
+    # Confirmar antes de despertar al despachador para que vea las filas
+    session.commit()
+    wake_workers()
+    print(f"[NOTIFICATIONS] Alertas de ausencia encoladas: {queued_count}, sin Telegram: {skipped}")
+
+    return {"encolados": queued_count, "skipped": skipped}
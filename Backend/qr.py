@@ -1,53 +1,141 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from io import BytesIO
 from pathlib import Path
 
 import qrcode
 from PIL import Image, ImageDraw, ImageFont
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
 
+from models import Student
+from qr_store import REFERENCE_PREFIX, get_store, qr_reference
 
-def _safe_filename(value: str) -> str:
-    return "".join(ch for ch in value if ch.isalnum()) or "unknown"
 
+# Por debajo de este número de QR no compensa arrancar procesos
+PARALLEL_QR_THRESHOLD = 64
 
-def build_qr_path(qr_dir: Path, documento: str) -> Path:
-    filename = f"{_safe_filename(documento)}.png"
-    return qr_dir / filename
 
+def ensure_qr(qr_dir: Path, documento: str) -> memoryview:
+    """PNG del QR desde el almacén empaquetado, generándolo si falta."""
+    store = get_store(qr_dir)
+    png = store.get(documento)
+    if png is None:
+        store.put(documento, encode_qr(documento))
+        png = store.get(documento)
+    return png
 
-def ensure_qr(qr_dir: Path, documento: str) -> str:
-    path = build_qr_path(qr_dir, documento)
-    if not path.exists():
-        img = qrcode.make(documento)
-        img.save(path)
-    return str(path)
 
+def encode_qr(documento: str) -> bytes:
+    """Genera el PNG del QR en memoria (se ejecuta en los procesos del pool)."""
+    output = BytesIO()
+    qrcode.make(documento).save(output)
+    return output.getvalue()
 
-def render_qr_with_name(qr_path: Path, full_name: str) -> BytesIO:
-    qr_image = Image.open(qr_path).convert("RGB")
-    
-    # Cargar fuente moderna y llamativa con soporte UTF-8
-    text = full_name.strip() or "ESTUDIANTE"
-    font_size = 24
-    font = None
-    
-    # Intentar fuentes modernas en orden de preferencia
-    font_options = [
-        "C:/Windows/Fonts/bahnschrift.ttf",  # Moderna, geométrica
-        "C:/Windows/Fonts/ariblk.ttf",       # Arial Black - negrita y llamativa
-        "C:/Windows/Fonts/arialbd.ttf",      # Arial Bold
-        "C:/Windows/Fonts/arial.ttf",        # Arial regular fallback
-    ]
-    
-    for font_path in font_options:
+
+def generate_qr_batch(qr_dir: Path, documentos: list[str], workers: int) -> dict[str, str]:
+    """
+    Genera los QR que falten para varios documentos y retorna {documento: referencia}.
+
+    La existencia se consulta en el índice del almacén y, para lotes grandes,
+    los PNG se codifican en un pool de procesos; el proceso principal es el
+    único que agrega al almacén, en un solo bloque.
+    """
+    store = get_store(qr_dir)
+    pending = [documento for documento in dict.fromkeys(documentos) if documento not in store]
+
+    if len(pending) >= PARALLEL_QR_THRESHOLD and workers > 1:
+        # spawn evita heredar conexiones e hilos del servidor en los workers
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            chunksize = max(1, len(pending) // (workers * 4))
+            images = list(pool.map(encode_qr, pending, chunksize=chunksize))
+    else:
+        images = [encode_qr(documento) for documento in pending]
+    store.put_many(zip(pending, images))
+
+    return {documento: qr_reference(documento) for documento in documentos}
+
+
+def migrate_legacy_qr(session: Session, qr_dir: Path) -> int:
+    """
+    Pasa al almacén los PNG sueltos que generaban las versiones anteriores.
+
+    El nombre del archivo era el documento sin caracteres especiales, así que
+    el documento real se toma del qr_path guardado en cada estudiante. Un
+    archivo compartido por dos documentos (p. ej. "1.234" y "1234") o que no
+    corresponde a ningún estudiante no se migra: ese QR se regenera al pedirlo.
+    """
+    if not qr_dir.exists() or next(qr_dir.glob("*.png"), None) is None:
+        return 0
+
+    rows = session.execute(
+        select(Student.id, Student.documento, Student.qr_path)
+        .where(Student.qr_path.is_not(None))
+        .where(Student.qr_path.not_like(f"{REFERENCE_PREFIX}%"))
+    ).all()
+    owners: dict[Path, set[str]] = {}
+    for row in rows:
+        owners.setdefault(qr_dir / Path(row.qr_path).name, set()).add(row.documento)
+    files = {
+        path: next(iter(documentos))
+        for path, documentos in owners.items()
+        if len(documentos) == 1
+    }
+
+    migrated = get_store(qr_dir).migrate_files(files)
+    if rows:
+        session.execute(
+            update(Student),
+            [{"id": row.id, "qr_path": qr_reference(row.documento)} for row in rows],
+        )
+    return migrated
+
+
+# Se prueban en orden si QR_FONT_PATH no está configurado o no se puede abrir
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+    "C:/Windows/Fonts/bahnschrift.ttf",  # Moderna, geométrica
+    "C:/Windows/Fonts/ariblk.ttf",       # Arial Black - negrita y llamativa
+    "C:/Windows/Fonts/arialbd.ttf",      # Arial Bold
+    "C:/Windows/Fonts/arial.ttf",        # Arial regular fallback
+]
+FONT_SIZE = 24
+
+
+@lru_cache(maxsize=None)
+def resolve_font_path(font_path: str) -> str:
+    """Fuente que se usará para las tarjetas ("" = fuente por defecto de PIL)."""
+    options = [font_path] if font_path else []
+    for candidate in options + FONT_CANDIDATES:
         try:
-            font = ImageFont.truetype(font_path, font_size)
-            break
-        except:
+            ImageFont.truetype(candidate, FONT_SIZE)
+            print(f"[QR] Fuente para tarjetas: {candidate}")
+            return candidate
+        except OSError:
             continue
-    
-    # Si no se pudo cargar ninguna, usar default
-    if font is None:
-        font = ImageFont.load_default()
+    print("[QR] Sin fuentes TrueType disponibles, se usa la fuente por defecto")
+    return ""
+
+
+@lru_cache(maxsize=None)
+def _load_font(font_path: str, font_size: int) -> ImageFont.ImageFont:
+    """Resuelve la fuente una sola vez por proceso."""
+    resolved = resolve_font_path(font_path)
+    if not resolved:
+        return ImageFont.load_default()
+    return ImageFont.truetype(resolved, font_size)
+
+
+def render_qr_with_name(qr_png: bytes | memoryview, full_name: str, font_path: str = "") -> BytesIO:
+    qr_image = Image.open(BytesIO(qr_png)).convert("RGB")
+
+    # Fuente con soporte UTF-8 (ver FONT_CANDIDATES)
+    text = full_name.strip() or "ESTUDIANTE"
+    font = _load_font(font_path, FONT_SIZE)
 
     padding = 20
     bbox = font.getbbox(text)
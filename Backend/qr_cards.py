@@ -0,0 +1,142 @@
+"""
+Caché de tarjetas QR con nombre para ``GET /students/<id>/qr``.
+
+Las tarjetas renderizadas se guardan en un LRU en memoria y en otro en disco,
+ambos acotados por tamaño. La clave depende del documento, del nombre, de la
+fuente efectiva y de la versión del diseño, así que sirve también como ETag:
+si el estudiante cambia de nombre o se cambia QR_FONT_PATH la clave cambia y
+la tarjeta vieja sale del caché por antigüedad.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from config import Settings
+from qr import ensure_qr, render_qr_with_name, resolve_font_path
+
+
+# Cambiar al modificar el diseño de la tarjeta para invalidar lo guardado
+CARD_VERSION = "1"
+
+
+def card_key(documento: str, full_name: str, font_path: str) -> str:
+    """font_path es QR_FONT_PATH; la clave usa la fuente que realmente se carga."""
+    font = resolve_font_path(font_path)
+    raw = f"{CARD_VERSION}\0{documento}\0{full_name}\0{font}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+
+class CardCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._settings: Settings | None = None
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        # Archivos en disco de menos a más reciente con su tamaño
+        self._disk: OrderedDict[str, int] | None = None
+        self._disk_bytes = 0
+
+    def get(self, documento: str, full_name: str, qr_dir: Path) -> tuple[bytes, str]:
+        """Retorna (png, etag), renderizando la tarjeta solo si no está en caché."""
+        settings = self._load_settings()
+        key = card_key(documento, full_name, settings.qr_font_path)
+
+        with self._lock:
+            png = self._memory.get(key)
+            if png is not None:
+                self._memory.move_to_end(key)
+                return png, key
+
+        png = self._read_disk(settings, key)
+        if png is None:
+            qr_png = ensure_qr(qr_dir, documento)
+            png = render_qr_with_name(qr_png, full_name, settings.qr_font_path).getvalue()
+            self._write_disk(settings, key, png)
+
+        self._remember(settings, key, png)
+        return png, key
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def _load_settings(self) -> Settings:
+        if self._settings is None:
+            self._settings = Settings()
+        return self._settings
+
+    def _remember(self, settings: Settings, key: str, png: bytes) -> None:
+        limit = settings.qr_card_cache_mb * 1024 * 1024
+        if len(png) > limit:
+            return
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = png
+            self._memory_bytes += len(png)
+            while self._memory_bytes > limit:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _disk_index(self, settings: Settings) -> OrderedDict[str, int]:
+        """Recorre el directorio una vez y ordena los archivos por último uso."""
+        if self._disk is None:
+            settings.qr_card_dir.mkdir(parents=True, exist_ok=True)
+            entries = []
+            for entry in os.scandir(settings.qr_card_dir):
+                if entry.name.endswith(".png") and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+            entries.sort()
+            self._disk = OrderedDict((key, size) for _, key, size in entries)
+            self._disk_bytes = sum(self._disk.values())
+        return self._disk
+
+    def _read_disk(self, settings: Settings, key: str) -> bytes | None:
+        with self._lock:
+            index = self._disk_index(settings)
+            if key not in index:
+                return None
+            index.move_to_end(key)
+        path = settings.qr_card_dir / f"{key}.png"
+        try:
+            png = path.read_bytes()
+            # mtime marca el último uso para el orden LRU tras reiniciar
+            os.utime(path)
+            return png
+        except OSError:
+            with self._lock:
+                self._disk_bytes -= index.pop(key, 0)
+            return None
+
+    def _write_disk(self, settings: Settings, key: str, png: bytes) -> None:
+        path = settings.qr_card_dir / f"{key}.png"
+        tmp_path = settings.qr_card_dir / f".{uuid.uuid4().hex}.tmp"
+        try:
+            tmp_path.write_bytes(png)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            tmp_path.unlink(missing_ok=True)
+            print(f"[QR] No se pudo guardar la tarjeta en disco: {str(e)}")
+            return
+
+        limit = settings.qr_card_disk_mb * 1024 * 1024
+        evicted = []
+        with self._lock:
+            index = self._disk_index(settings)
+            self._disk_bytes += len(png) - index.pop(key, 0)
+            index[key] = len(png)
+            while self._disk_bytes > limit and len(index) > 1:
+                old_key, size = index.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            (settings.qr_card_dir / f"{old_key}.png").unlink(missing_ok=True)
+
+
+card_cache = CardCache()
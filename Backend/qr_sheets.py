@@ -0,0 +1,294 @@
+"""
+Exportación de las tarjetas QR de un grado en un PDF imprimible o un ZIP.
+
+Las tarjetas se obtienen del caché de ``qr_cards`` (renderizándolas en hilos
+si faltan) y se escriben al cliente a medida que están listas: el PDF se arma
+objeto por objeto con la tabla xref al final, y el ZIP usa descriptores de
+datos para no necesitar un archivo con seek. Las imágenes del PDF reutilizan
+los datos comprimidos del PNG, sin decodificarlos.
+"""
+
+import math
+import os
+import struct
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+from PIL import Image
+
+from qr_cards import card_cache
+
+
+# Hoja carta en puntos y margen alrededor de la cuadrícula
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+PAGE_MARGIN = 36
+CELL_PADDING = 8
+DEFAULT_CARDS_PER_PAGE = 6
+MAX_CARDS_PER_PAGE = 20
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class CardRequest(NamedTuple):
+    documento: str
+    full_name: str
+    qr_dir: Path
+
+
+class Card(NamedTuple):
+    documento: str
+    full_name: str
+    png: bytes
+
+
+def iter_cards(requests: list[CardRequest], workers: int) -> Iterator[Card]:
+    """
+    Produce las tarjetas en el orden recibido, renderizando en paralelo.
+
+    Mantiene como máximo dos tareas por hilo en vuelo para no acumular todo
+    el grado en memoria si el cliente descarga lento.
+    """
+    workers = max(1, workers)
+    window = workers * 2
+    pending = iter(requests)
+    in_flight: deque = deque()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qr-sheet")
+    try:
+        for request in pending:
+            in_flight.append(executor.submit(_render, request))
+            if len(in_flight) >= window:
+                break
+        while in_flight:
+            card = in_flight.popleft().result()
+            request = next(pending, None)
+            if request is not None:
+                in_flight.append(executor.submit(_render, request))
+            yield card
+    finally:
+        # Si el cliente corta la descarga no se siguen renderizando tarjetas
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _render(request: CardRequest) -> Card:
+    png, _ = card_cache.get(request.documento, request.full_name, request.qr_dir)
+    return Card(request.documento, request.full_name, png)
+
+
+def stream_zip(cards: Iterable[Card]) -> Iterator[bytes]:
+    """Un PNG por estudiante; sin recompresión porque el PNG ya está comprimido."""
+    output = _ChunkBuffer()
+    used_names: set[str] = set()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as archive:
+        for card in cards:
+            name = _zip_name(card, used_names)
+            archive.writestr(zipfile.ZipInfo(name), card.png)
+            yield output.drain()
+    yield output.drain()
+
+
+def _zip_name(card: Card, used_names: set[str]) -> str:
+    base = "".join(ch if ch.isalnum() else "_" for ch in card.full_name).strip("_")
+    name = f"{base or 'estudiante'}_{card.documento}.png"
+    suffix = 2
+    while name in used_names:
+        name = f"{base or 'estudiante'}_{card.documento}_{suffix}.png"
+        suffix += 1
+    used_names.add(name)
+    return name
+
+
+class _ChunkBuffer:
+    """Destino de escritura sin seek: acumula bytes hasta que se drenan."""
+
+    def __init__(self) -> None:
+        self._parts: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_pdf(cards: Iterable[Card], per_page: int) -> Iterator[bytes]:
+    """PDF con per_page tarjetas por hoja, emitido página por página."""
+    per_page = max(1, min(per_page, MAX_CARDS_PER_PAGE))
+    columns, rows = _grid(per_page)
+    cell_width = (PAGE_WIDTH - 2 * PAGE_MARGIN) / columns
+    cell_height = (PAGE_HEIGHT - 2 * PAGE_MARGIN) / rows
+
+    writer = _PdfWriter()
+    # 1 = catálogo, 2 = árbol de páginas (se escribe al final con sus hijos)
+    yield writer.header()
+    yield writer.write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    page_ids: list[int] = []
+    batch: list[Card] = []
+
+    def emit_page() -> bytes:
+        chunks = []
+        resources = []
+        commands = []
+        for slot, card in enumerate(batch):
+            image_id = writer.reserve()
+            width, height, image_object = _image_object(card.png)
+            chunks.append(writer.write_object(image_id, image_object))
+            resources.append(f"/Im{slot} {image_id} 0 R")
+
+            column, row = slot % columns, slot // columns
+            scale = min(
+                (cell_width - 2 * CELL_PADDING) / width,
+                (cell_height - 2 * CELL_PADDING) / height,
+            )
+            draw_width, draw_height = width * scale, height * scale
+            x = PAGE_MARGIN + column * cell_width + (cell_width - draw_width) / 2
+            top = PAGE_HEIGHT - PAGE_MARGIN - row * cell_height
+            y = top - (cell_height + draw_height) / 2
+            commands.append(
+                f"q {draw_width:.2f} 0 0 {draw_height:.2f} {x:.2f} {y:.2f} cm /Im{slot} Do Q"
+            )
+
+        content = zlib.compress("\n".join(commands).encode("ascii"))
+        content_id = writer.reserve()
+        chunks.append(writer.write_stream(content_id, b"/Filter /FlateDecode", content))
+
+        page_id = writer.reserve()
+        page = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /XObject << {' '.join(resources)} >> >> "
+            f"/Contents {content_id} 0 R >>"
+        )
+        chunks.append(writer.write_object(page_id, page.encode("ascii")))
+        page_ids.append(page_id)
+        return b"".join(chunks)
+
+    for card in cards:
+        batch.append(card)
+        if len(batch) == per_page:
+            yield emit_page()
+            batch = []
+    if batch or not page_ids:
+        yield emit_page()
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    yield writer.write_object(
+        2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("ascii")
+    )
+    yield writer.trailer(root=1)
+
+
+def _grid(per_page: int) -> tuple[int, int]:
+    """Columnas y filas que dejan las celdas más parecidas a la proporción de la hoja."""
+    columns = max(1, round(math.sqrt(per_page * PAGE_WIDTH / PAGE_HEIGHT)))
+    return columns, math.ceil(per_page / columns)
+
+
+def _image_object(png: bytes) -> tuple[int, int, bytes]:
+    """
+    Convierte un PNG en un XObject de imagen.
+
+    Para PNG RGB de 8 bits sin entrelazado se copian los bloques IDAT tal
+    cual con el predictor PNG; cualquier otro formato se decodifica con PIL.
+    """
+    parsed = _png_idat(png)
+    if parsed is not None:
+        width, height, data = parsed
+        params = (
+            f"/DecodeParms << /Predictor 15 /Colors 3 /BitsPerComponent 8 "
+            f"/Columns {width} >> "
+        )
+    else:
+        image = Image.open(BytesIO(png)).convert("RGB")
+        width, height = image.size
+        data = zlib.compress(image.tobytes())
+        params = ""
+    header = (
+        f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+        f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode "
+        f"{params}/Length {len(data)} >>"
+    )
+    return width, height, header.encode("ascii") + b"\nstream\n" + data + b"\nendstream"
+
+
+def _png_idat(png: bytes) -> tuple[int, int, bytes] | None:
+    if not png.startswith(PNG_SIGNATURE):
+        return None
+    position = len(PNG_SIGNATURE)
+    width = height = 0
+    idat: list[bytes] = []
+    while position + 8 <= len(png):
+        length, chunk_type = struct.unpack(">I4s", png[position:position + 8])
+        data = png[position + 8:position + 8 + length]
+        if chunk_type == b"IHDR":
+            width, height, bit_depth, color_type, _, _, interlace = struct.unpack(
+                ">IIBBBBB", data
+            )
+            if bit_depth != 8 or color_type != 2 or interlace != 0:
+                return None
+        elif chunk_type == b"IDAT":
+            idat.append(data)
+        elif chunk_type == b"IEND":
+            break
+        position += 12 + length
+    if not idat or not width:
+        return None
+    return width, height, b"".join(idat)
+
+
+class _PdfWriter:
+    """Escribe objetos PDF en secuencia llevando la posición de cada uno."""
+
+    def __init__(self) -> None:
+        self._position = 0
+        self._offsets: dict[int, int] = {}
+        self._next_id = 3
+
+    def reserve(self) -> int:
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def header(self) -> bytes:
+        return self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def write_object(self, object_id: int, body: bytes) -> bytes:
+        self._offsets[object_id] = self._position
+        return self._emit(b"%d 0 obj\n" % object_id + body + b"\nendobj\n")
+
+    def write_stream(self, object_id: int, entries: bytes, data: bytes) -> bytes:
+        body = (
+            b"<< " + entries + b" /Length %d >>\nstream\n" % len(data)
+            + data + b"\nendstream"
+        )
+        return self.write_object(object_id, body)
+
+    def trailer(self, root: int) -> bytes:
+        size = self._next_id
+        lines = [b"xref\n", b"0 %d\n" % size, b"0000000000 65535 f \n"]
+        for object_id in range(1, size):
+            lines.append(b"%010d 00000 n \n" % self._offsets[object_id])
+        lines.append(
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (size, root, self._position)
+        )
+        return self._emit(b"".join(lines))
+
+    def _emit(self, data: bytes) -> bytes:
+        self._position += len(data)
+        return data
+
+
+def sheet_workers(configured: int) -> int:
+    return configured if configured > 0 else (os.cpu_count() or 1)
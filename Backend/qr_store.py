@@ -0,0 +1,205 @@
+"""
+Almacén empaquetado de imágenes QR.
+
+Todos los PNG viven en un único archivo de datos al que solo se agrega
+(``qr_store.dat``) y un índice también de solo agregar (``qr_store.idx``)
+con documento, posición y tamaño. Las lecturas usan mmap y devuelven
+memoryview sobre el archivo, sin copiar. Los PNG sueltos de versiones
+anteriores se empaquetan con ``migrate_files`` (ver qr.migrate_legacy_qr).
+
+Cada registro del índice es: largo del documento (2 bytes), documento en
+UTF-8, posición (8 bytes) y tamaño (4 bytes). Si un documento aparece más de
+una vez gana el último registro.
+"""
+
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso escritor
+    fcntl = None
+
+
+DATA_FILENAME = "qr_store.dat"
+INDEX_FILENAME = "qr_store.idx"
+REFERENCE_PREFIX = "qr_store:"
+
+_DOC_LENGTH = struct.Struct(">H")
+_LOCATION = struct.Struct(">QI")
+
+
+def qr_reference(documento: str) -> str:
+    """Valor que se guarda en Student.qr_path para un QR del almacén."""
+    return f"{REFERENCE_PREFIX}{documento}"
+
+
+class QrStore:
+    def __init__(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        self._directory = directory
+        self._data_path = directory / DATA_FILENAME
+        self._index_path = directory / INDEX_FILENAME
+        self._lock = threading.Lock()
+        self._index: dict[str, tuple[int, int]] = {}
+        self._index_read = 0
+        self._map: mmap.mmap | None = None
+        self._view: memoryview | None = None
+
+        self._data_path.touch(exist_ok=True)
+        self._index_path.touch(exist_ok=True)
+        self._reader = open(self._data_path, "rb")
+        with self._lock:
+            self._load_index()
+
+    def __contains__(self, documento: str) -> bool:
+        with self._lock:
+            if documento not in self._index:
+                self._load_index()
+            return documento in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, documento: str) -> memoryview | None:
+        """PNG del documento como vista sobre el mmap, o None si no está."""
+        with self._lock:
+            location = self._index.get(documento)
+            if location is None:
+                # Otro proceso pudo haberlo agregado después de la última lectura
+                self._load_index()
+                location = self._index.get(documento)
+            if location is None:
+                return None
+            offset, length = location
+            view = self._mapped(offset + length)
+        return view[offset:offset + length]
+
+    def put(self, documento: str, png: bytes) -> None:
+        self.put_many([(documento, png)])
+
+    def put_many(self, items: Iterable[tuple[str, bytes]]) -> int:
+        """
+        Agrega varios PNG con una sola sincronización a disco.
+
+        Los datos se escriben y sincronizan antes que el índice, así un corte
+        a mitad deja datos sin indexar pero nunca un índice que apunte a basura.
+        """
+        items = list(items)
+        if not items:
+            return 0
+        with self._exclusive() as (data, index):
+            self._append(data, index, items)
+        return len(items)
+
+    def migrate_files(self, files: dict[Path, str]) -> int:
+        """
+        Empaqueta PNG sueltos ({ruta: documento}) y luego los elimina.
+
+        Corre con el mismo bloqueo que put_many, así varios procesos que
+        arrancan a la vez no agregan dos veces el mismo archivo: el que llega
+        después encuentra el documento en el índice, o el archivo ya borrado.
+        """
+        migrated = 0
+        paths = sorted(files)
+        for start in range(0, len(paths), 500):
+            batch = paths[start:start + 500]
+            with self._exclusive() as (data, index):
+                items = []
+                for path in batch:
+                    if files[path] in self._index:
+                        continue
+                    try:
+                        items.append((files[path], path.read_bytes()))
+                    except FileNotFoundError:
+                        continue
+                self._append(data, index, items)
+                migrated += len(items)
+                for path in batch:
+                    path.unlink(missing_ok=True)
+        if migrated:
+            print(f"[QR] {migrated} imágenes migradas al almacén {self._data_path}")
+        return migrated
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[tuple[BinaryIO, BinaryIO]]:
+        """Bloqueo de escritura entre hilos y, donde hay flock, entre procesos."""
+        with self._lock, open(self._data_path, "ab") as data, open(self._index_path, "ab") as index:
+            if fcntl is not None:
+                fcntl.flock(data.fileno(), fcntl.LOCK_EX)
+            try:
+                self._load_index()
+                yield data, index
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(data.fileno(), fcntl.LOCK_UN)
+
+    def _append(self, data: BinaryIO, index: BinaryIO, items: list[tuple[str, bytes]]) -> None:
+        if not items:
+            return
+        offset = data.seek(0, os.SEEK_END)
+        records = []
+        locations = {}
+        for documento, png in items:
+            data.write(png)
+            key = documento.encode("utf-8")
+            records.append(
+                _DOC_LENGTH.pack(len(key)) + key + _LOCATION.pack(offset, len(png))
+            )
+            locations[documento] = (offset, len(png))
+            offset += len(png)
+        data.flush()
+        os.fsync(data.fileno())
+        index.write(b"".join(records))
+        index.flush()
+        os.fsync(index.fileno())
+        self._index.update(locations)
+        self._index_read = index.tell()
+
+    def _load_index(self) -> None:
+        """Lee los registros del índice agregados desde la última lectura."""
+        with open(self._index_path, "rb") as index:
+            index.seek(self._index_read)
+            raw = index.read()
+        position = 0
+        data_size = os.path.getsize(self._data_path)
+        while position + _DOC_LENGTH.size <= len(raw):
+            (key_length,) = _DOC_LENGTH.unpack_from(raw, position)
+            end = position + _DOC_LENGTH.size + key_length + _LOCATION.size
+            if end > len(raw):
+                # Registro incompleto (escritura en curso o interrumpida)
+                break
+            key = raw[position + _DOC_LENGTH.size:position + _DOC_LENGTH.size + key_length]
+            offset, length = _LOCATION.unpack_from(raw, end - _LOCATION.size)
+            if offset + length <= data_size:
+                self._index[key.decode("utf-8")] = (offset, length)
+            position = end
+        self._index_read += position
+
+    def _mapped(self, end: int) -> memoryview:
+        if self._view is None or len(self._view) < end:
+            # El archivo creció: se mapea de nuevo. El mapa anterior no se
+            # cierra porque puede haber vistas entregadas que aún lo usan.
+            self._map = mmap.mmap(self._reader.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+        return self._view
+
+
+_stores: dict[Path, QrStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(directory: Path) -> QrStore:
+    """Almacén del directorio, abierto una sola vez por proceso."""
+    key = directory.resolve()
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = QrStore(key)
+            _stores[key] = store
+        return store
@@ -0,0 +1,175 @@
+"""
+Índice en memoria del listado de estudiantes para el check-in.
+
+Guarda un registro compacto por documento y el conjunto de estudiantes que ya
+registraron entrada en el día, de modo que los escaneos repetidos o de
+documentos inexistentes no cargan el listado en cada petición.
+
+Varios procesos del servidor tienen cada uno su índice. Las escrituras que
+cambian estudiantes o borran asistencias llaman a ``mark_roster_changed`` en
+su transacción; cada lectura compara la versión guardada en ``roster_state``
+(una consulta por clave primaria) y recarga si cambió. Las entradas nuevas
+no cambian la versión: si otro proceso ya registró al estudiante, el índice
+único de attendance lo detecta al insertar.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import date
+from typing import NamedTuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from config import Settings
+from db import insert_ignore
+from models import Attendance, Grade, RosterState, Student
+
+STATE_ID = 1
+
+
+class GradeRef(NamedTuple):
+    numero: int
+
+
+@dataclass(frozen=True, slots=True)
+class StudentRecord:
+    """Datos mínimos de un estudiante; compatible con las plantillas de messages."""
+
+    id: int
+    documento: str
+    primer_apellido: str
+    segundo_apellido: str | None
+    primer_nombre: str
+    segundo_nombre: str | None
+    grade_id: int
+    grade: GradeRef
+    telegram_id: str | None
+
+
+class RosterIndex:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ttl: int | None = None
+        self._generation = 0
+        self._by_documento: dict[str, StudentRecord] | None = None
+        self._version: int | None = None
+        self._loaded_at = 0.0
+        self._checked_in_day: date | None = None
+        self._checked_in: set[int] = set()
+
+    def get(self, session: Session, documento: str) -> StudentRecord | None:
+        roster = self._roster(session)
+        return roster.get(documento)
+
+    def is_checked_in(self, session: Session, fecha: date, student_id: int) -> bool:
+        self._sync_version(session)
+        with self._lock:
+            if self._checked_in_day == fecha:
+                return student_id in self._checked_in
+            generation = self._generation
+
+        ids = set(
+            session.scalars(
+                select(Attendance.student_id).where(Attendance.fecha == fecha)
+            ).all()
+        )
+        with self._lock:
+            if generation == self._generation:
+                self._checked_in_day = fecha
+                self._checked_in = ids
+            return student_id in ids
+
+    def mark_checked_in(self, fecha: date, student_id: int) -> None:
+        with self._lock:
+            if self._checked_in_day == fecha:
+                self._checked_in.add(student_id)
+
+    def invalidate(self) -> None:
+        """Descarta el listado completo; se recarga en el próximo escaneo."""
+        with self._lock:
+            self._discard()
+
+    def _discard(self) -> None:
+        self._generation += 1
+        self._by_documento = None
+        self._version = None
+        self._checked_in_day = None
+        self._checked_in = set()
+
+    def _sync_version(self, session: Session) -> None:
+        """Descarta el índice si otro proceso (o este) cambió el listado."""
+        version = session.scalar(select(RosterState.version).where(RosterState.id == STATE_ID)) or 0
+        with self._lock:
+            if self._version != version:
+                if self._version is not None:
+                    self._discard()
+                self._version = version
+
+    def _roster(self, session: Session) -> dict[str, StudentRecord]:
+        self._sync_version(session)
+        with self._lock:
+            if self._ttl is None:
+                self._ttl = Settings().roster_cache_seconds
+            fresh = time.monotonic() - self._loaded_at < self._ttl
+            if self._by_documento is not None and fresh:
+                return self._by_documento
+            generation = self._generation
+
+        roster = load_records(session)
+
+        with self._lock:
+            # Si hubo una invalidación mientras se consultaba, el resultado
+            # puede estar desactualizado: se usa solo para esta petición.
+            if generation == self._generation:
+                self._by_documento = roster
+                self._loaded_at = time.monotonic()
+        return roster
+
+
+def mark_roster_changed(session: Session) -> None:
+    """Incrementa la versión del listado en la transacción del llamador."""
+    result = session.execute(
+        update(RosterState)
+        .where(RosterState.id == STATE_ID)
+        .values(version=RosterState.version + 1)
+    )
+    if result.rowcount == 0:
+        session.execute(insert_ignore(RosterState).values(id=STATE_ID, version=1))
+
+
+def load_records(
+    session: Session, documentos: list[str] | None = None
+) -> dict[str, StudentRecord]:
+    """Carga registros compactos por documento en una sola consulta."""
+    query = select(
+        Student.id,
+        Student.documento,
+        Student.primer_apellido,
+        Student.segundo_apellido,
+        Student.primer_nombre,
+        Student.segundo_nombre,
+        Student.grade_id,
+        Grade.numero,
+        Student.telegram_id,
+    ).join(Grade, Student.grade_id == Grade.id)
+    if documentos is not None:
+        query = query.where(Student.documento.in_(documentos))
+    return {
+        row.documento: StudentRecord(
+            id=row.id,
+            documento=row.documento,
+            primer_apellido=row.primer_apellido,
+            segundo_apellido=row.segundo_apellido,
+            primer_nombre=row.primer_nombre,
+            segundo_nombre=row.segundo_nombre,
+            grade_id=row.grade_id,
+            grade=GradeRef(row.numero),
+            telegram_id=row.telegram_id,
+        )
+        for row in session.execute(query)
+    }
+
+
+roster_index = RosterIndex()
@@ -1,15 +1,26 @@
+import threading
 from datetime import datetime
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
+from alert_schedules import schedule_targets, schedule_times
 from config import Settings
 from db import get_session
+from notification_queue import prune_outbox
 from notifications import send_absence_alerts
 from monthly_reports import generate_monthly_report
+from telegram_updates import run_poll_window
 
 
+ABSENCE_JOB_PREFIX = "absence_alerts"
+# Cada cuánto se comparan los horarios guardados con los jobs registrados
+ABSENCE_SYNC_SECONDS = 60
+
 _scheduler: BackgroundScheduler | None = None
+_registered_schedules: frozenset[tuple[int, str]] = frozenset()
+_absence_jobs_lock = threading.Lock()
 
 
 def start_scheduler() -> None:
@@ -18,13 +29,16 @@ def start_scheduler() -> None:
         return
 
     settings = Settings()
-    hour, minute = _parse_time(settings.alert_time)
 
     scheduler = BackgroundScheduler(timezone=settings.timezone)
+    _register_absence_jobs(scheduler, settings)
+    # Los horarios pueden cambiar desde otro proceso del servidor
     scheduler.add_job(
-        _run_absence_job,
-        trigger=CronTrigger(hour=hour, minute=minute, timezone=settings.timezone),
-        id="absence_alerts",
+        _sync_absence_jobs,
+        trigger=IntervalTrigger(seconds=ABSENCE_SYNC_SECONDS),
+        id="absence_jobs_sync",
+        max_instances=1,
+        coalesce=True,
         replace_existing=True,
     )
     
@@ -37,10 +51,90 @@ def start_scheduler() -> None:
         replace_existing=True,
     )
     
+    # Limpieza diaria de la cola de notificaciones
+    scheduler.add_job(
+        _run_outbox_prune_job,
+        trigger=CronTrigger(hour=2, minute=30, timezone=settings.timezone),
+        args=(settings,),
+        id="outbox_prune",
+        replace_existing=True,
+    )
+
+    # Consumidor de getUpdates: una sola instancia a la vez, encadenada sin pausas
+    if settings.telegram_token and settings.telegram_poll_timeout > 0:
+        scheduler.add_job(
+            _run_telegram_updates_job,
+            trigger=IntervalTrigger(seconds=settings.telegram_poll_timeout),
+            args=(settings,),
+            id="telegram_updates",
+            next_run_time=datetime.now(scheduler.timezone),
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+
     scheduler.start()
     _scheduler = scheduler
 
 
+def reload_absence_jobs() -> None:
+    """
+    Vuelve a registrar los jobs de alertas tras cambiar los horarios.
+
+    Solo afecta al proceso que atendió el cambio; los demás procesos lo
+    toman en la siguiente pasada de _sync_absence_jobs.
+    """
+    if _scheduler is None:
+        return
+    with _absence_jobs_lock:
+        _replace_absence_jobs(_scheduler, Settings())
+
+
+def _sync_absence_jobs() -> None:
+    """Registra de nuevo los jobs si los horarios guardados cambiaron."""
+    if _scheduler is None:
+        return
+    with get_session(read_only=True) as session:
+        schedules = frozenset(schedule_times(session))
+    if schedules == _registered_schedules:
+        return
+    with _absence_jobs_lock:
+        _replace_absence_jobs(_scheduler, Settings())
+
+
+def _replace_absence_jobs(scheduler: BackgroundScheduler, settings: Settings) -> None:
+    for job in scheduler.get_jobs():
+        if job.id.startswith(ABSENCE_JOB_PREFIX):
+            job.remove()
+    _register_absence_jobs(scheduler, settings)
+
+
+def _register_absence_jobs(scheduler: BackgroundScheduler, settings: Settings) -> None:
+    """Un job por horario de grados más el de los grados sin horario (ALERT_TIME)."""
+    global _registered_schedules
+    with get_session() as session:
+        schedules = schedule_times(session)
+    _registered_schedules = frozenset(schedules)
+
+    hour, minute = _parse_time(settings.alert_time)
+    scheduler.add_job(
+        _run_absence_job,
+        trigger=CronTrigger(hour=hour, minute=minute, timezone=settings.timezone),
+        id=ABSENCE_JOB_PREFIX,
+        replace_existing=True,
+    )
+    for schedule_id, hora in schedules:
+        hour, minute = _parse_time(hora)
+        scheduler.add_job(
+            _run_absence_job,
+            trigger=CronTrigger(hour=hour, minute=minute, timezone=settings.timezone),
+            args=(schedule_id,),
+            id=f"{ABSENCE_JOB_PREFIX}_{schedule_id}",
+            replace_existing=True,
+        )
+    print(f"[SCHEDULER] Alertas de ausencia: {len(schedules)} horarios por grado + {settings.alert_time}")
+
+
 def _parse_time(value: str) -> tuple[int, int]:
     parts = value.strip().split(":")
     if len(parts) != 2:
@@ -48,16 +142,39 @@ def _parse_time(value: str) -> tuple[int, int]:
     return int(parts[0]), int(parts[1])
 
 
-def _run_absence_job() -> None:
+def _run_absence_job(schedule_id: int | None = None) -> None:
     settings = Settings()
     with get_session() as session:
-        send_absence_alerts(session, settings)
+        targets = schedule_targets(session, settings, schedule_id)
+        if targets is None:
+            return
+        grade_ids, hora = targets
+        result = send_absence_alerts(session, settings, grade_ids=grade_ids, alert_time=hora)
+    print(f"[SCHEDULER] Alertas de ausencia ({schedule_id or 'por defecto'}): {result}")
+
+
+def _run_telegram_updates_job(settings: Settings) -> None:
+    try:
+        run_poll_window(settings)
+    except Exception as e:
+        print(f"[SCHEDULER] Error procesando updates de Telegram: {str(e)}")
+
+
+def _run_outbox_prune_job(settings: Settings) -> None:
+    try:
+        deleted = prune_outbox(settings.notify_retention_days)
+        print(f"[SCHEDULER] Cola de notificaciones: {deleted} mensajes antiguos eliminados")
+    except Exception as e:
+        print(f"[SCHEDULER] Error limpiando la cola de notificaciones: {str(e)}")
 
 
 def _run_monthly_report_job() -> None:
     print("[SCHEDULER] Ejecutando generación de reporte mensual")
     try:
-        filepath = generate_monthly_report()
+        # El job corre el día 1: el reporte corresponde al mes que terminó
+        today = datetime.now().date()
+        year, month = (today.year - 1, 12) if today.month == 1 else (today.year, today.month - 1)
+        filepath = generate_monthly_report(year, month)
         if filepath:
             print(f"[SCHEDULER] Reporte mensual generado: {filepath}")
         else:
@@ -1,15 +1,143 @@
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
 
 from config import Settings
 
 
+# Reintentos ante 429 antes de reportar el mensaje como error
+MAX_RATE_LIMIT_RETRIES = 3
+# Un retry_after mayor no se espera aquí: el mensaje vuelve a la cola con su
+# espera de reintento, así un envío nunca retiene su reclamo por minutos
+MAX_RETRY_AFTER = 60
+# Buckets por chat que se conservan antes de descartar los inactivos
+MAX_CHAT_BUCKETS = 10_000
+IDLE_BUCKET_SECONDS = 60
+# Un 429 suele ser el límite de un solo chat; si en la ventana lo reciben
+# varios chats distintos, el límite alcanzado es el de todo el bot
+GLOBAL_LIMIT_CHATS = 3
+GLOBAL_LIMIT_WINDOW = 5.0
+
+
+class TokenBucket:
+    """Permite `rate` envíos por segundo con ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Bloquea hasta que haya una ficha disponible y la consume."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Detiene el bucket (por ejemplo, el retry_after de un 429)."""
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._tokens = 0
+
+    def idle_since(self) -> float:
+        return self._updated
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RateLimiter:
+    """Límite global del bot más un bucket por chat de destino."""
+
+    def __init__(self, global_rate: float, chat_rate: float) -> None:
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate
+        self._chats: dict[str, TokenBucket] = {}
+        # Último 429 de cada chat, dentro de GLOBAL_LIMIT_WINDOW
+        self._limited: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, chat_id: str) -> None:
+        # Primero el del chat: esperar por un chat no debe acaparar fichas globales
+        self._chat_bucket(chat_id).acquire()
+        self._global.acquire()
+
+    def pause(self, chat_id: str, seconds: float) -> None:
+        """
+        Detiene el chat que recibió el 429; los demás chats siguen enviando.
+
+        Solo cuando varios chats reciben 429 a la vez se detiene también el
+        bucket global.
+        """
+        self._chat_bucket(chat_id).pause(seconds)
+        now = time.monotonic()
+        with self._lock:
+            self._limited[chat_id] = now
+            limit = now - GLOBAL_LIMIT_WINDOW
+            for chat in [c for c, at in self._limited.items() if at < limit]:
+                del self._limited[chat]
+            bot_wide = len(self._limited) >= GLOBAL_LIMIT_CHATS
+        if bot_wide:
+            self._global.pause(seconds)
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                if len(self._chats) >= MAX_CHAT_BUCKETS:
+                    self._prune_idle()
+                bucket = TokenBucket(self._chat_rate, 1)
+                self._chats[chat_id] = bucket
+            return bucket
+
+    def _prune_idle(self) -> None:
+        limit = time.monotonic() - IDLE_BUCKET_SECONDS
+        for chat_id in [c for c, b in self._chats.items() if b.idle_since() < limit]:
+            del self._chats[chat_id]
+
+
+# Sesión HTTP y límites compartidos por todos los clientes del proceso
+_http: requests.Session | None = None
+_limiter: RateLimiter | None = None
+_shared_lock = threading.Lock()
+
+
+def _shared(settings: Settings) -> tuple[requests.Session, RateLimiter]:
+    global _http, _limiter
+    with _shared_lock:
+        if _http is None:
+            pool_size = max(settings.notify_workers, 1)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            _http = requests.Session()
+            _http.mount("https://", adapter)
+            _http.mount("http://", adapter)
+            _limiter = RateLimiter(
+                max(settings.telegram_global_rate, 1), max(settings.telegram_chat_rate, 1)
+            )
+        return _http, _limiter
+
+
 class TelegramClient:
     """Cliente para enviar mensajes via Telegram Bot API."""
 
     def __init__(self, settings: Settings) -> None:
         self.token = settings.telegram_token
         self.chat_id = settings.telegram_chat_id
-        self.base_url = f"https://api.telegram.org/bot{self.token}"
+        self.base_url = f"{settings.telegram_api_url.rstrip('/')}/bot{self.token}"
+        self.http, self.limiter = _shared(settings)
 
     def is_configured(self) -> bool:
         """Verifica si el token y chat_id están configurados."""
@@ -18,18 +146,21 @@ class TelegramClient:
     def send_text(self, chat_id: str, message: str) -> tuple[str, str | None]:
         """
         Envía un mensaje de texto via Telegram.
-        
+
+        Respeta los límites de envío global y por chat, y ante un 429 espera
+        el retry_after indicado por Telegram antes de reintentar.
+
         Args:
             chat_id: ID de chat de Telegram o número de teléfono del destinatario
             message: Mensaje a enviar
-            
+
         Returns:
             Tupla (status, error):
             - status: "sent", "skipped" o "error"
             - error: Mensaje de error si aplica
         """
         print(f"[TELEGRAM.send_text] Iniciando - token={'***' if self.token else 'VACIO'}, chat_id={chat_id}")
-        
+
         if not self.token:
             print("[TELEGRAM.send_text] Token no configurado")
             return "skipped", "Telegram no configurado"
@@ -41,17 +172,28 @@ class TelegramClient:
                 "parse_mode": "HTML",
             }
             url = f"{self.base_url}/sendMessage"
-            print(f"[TELEGRAM.send_text] URL: {url}")
             print(f"[TELEGRAM.send_text] Payload: chat_id={chat_id}, message_len={len(message)}")
-            
-            response = requests.post(
-                url,
-                json=payload,
-                timeout=10,
-            )
-            print(f"[TELEGRAM.send_text] Response status: {response.status_code}")
-            print(f"[TELEGRAM.send_text] Response body: {response.text}")
-            
+
+            for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+                self.limiter.acquire(str(chat_id))
+                response = self.http.post(
+                    url,
+                    json=payload,
+                    timeout=10,
+                )
+                print(f"[TELEGRAM.send_text] Response status: {response.status_code}")
+                if response.status_code != 429:
+                    break
+                retry_after = _retry_after(response)
+                self.limiter.pause(str(chat_id), retry_after)
+                if retry_after > MAX_RETRY_AFTER:
+                    return "error", f"Límite de Telegram: reintentar en {retry_after:.0f}s"
+                print(f"[TELEGRAM.send_text] Límite de Telegram, reintento en {retry_after}s")
+            else:
+                return "error", "Límite de envíos de Telegram excedido"
+
+            if response.status_code >= 400:
+                print(f"[TELEGRAM.send_text] Response body: {response.text}")
             response.raise_for_status()
 
             if response.json().get("ok"):
@@ -68,3 +210,33 @@ class TelegramClient:
         except Exception as e:
             print(f"[TELEGRAM.send_text] Unexpected error: {str(e)}")
             return "error", f"Unexpected error: {str(e)}"
+
+
+    def get_updates(self, offset: int, timeout: int) -> list[dict]:
+        """
+        Long polling de getUpdates desde `offset`.
+
+        Pasar el offset confirma en Telegram todos los updates anteriores, que
+        ya no se vuelven a entregar. Lanza requests.RequestException si falla.
+        """
+        response = self.http.get(
+            f"{self.base_url}/getUpdates",
+            params={
+                "offset": offset,
+                "timeout": timeout,
+                "allowed_updates": '["message"]',
+            },
+            timeout=timeout + 10,
+        )
+        response.raise_for_status()
+        body = response.json()
+        if not body.get("ok"):
+            raise requests.RequestException(body.get("description", "Unknown error"))
+        return body.get("result", [])
+
+
+def _retry_after(response: requests.Response) -> float:
+    try:
+        return float(response.json().get("parameters", {}).get("retry_after", 1))
+    except ValueError:
+        return float(response.headers.get("Retry-After", 1))
@@ -0,0 +1,258 @@
+"""
+Consumidor de getUpdates del bot de Telegram.
+
+Un job del scheduler hace long polling desde el offset guardado en
+``telegram_poll_state`` y registra cada mensaje en ``telegram_updates``. El
+offset avanza en la misma transacción que los mensajes, así que un reinicio
+no pierde ni repite updates.
+
+Un ``/start <documento>`` no vincula el chat por sí solo: el documento va
+impreso en el carné y cualquiera podría hacerse pasar por acudiente. La
+solicitud queda ``pendiente`` hasta que el colegio la aprueba o rechaza
+(``POST /telegram/updates/<update_id>/aprobar`` o ``/rechazar``). El
+acudiente recibe la misma respuesta en todos los casos (ver
+messages.build_link_message); el resultado real solo se ve en
+``GET /telegram/updates``.
+"""
+
+import re
+import time
+from datetime import datetime
+
+import requests
+from sqlalchemy import desc, select, update
+from sqlalchemy.orm import Session
+
+from config import Settings
+from db import get_session, insert_ignore
+from messages import build_link_approved_message, build_link_message
+from models import Student, TelegramPollState, TelegramUpdate
+from roster_index import mark_roster_changed
+from telegram import TelegramClient
+
+
+# /start, /start@MiBot y el payload del enlace profundo
+START_PATTERN = re.compile(r"^/start(?:@\w+)?(?:\s+(\S+))?", re.IGNORECASE)
+STATE_ID = 1
+ERROR_PAUSE_SECONDS = 5
+WINDOW_MARGIN_SECONDS = 2
+MAX_UPDATES_PAGE = 500
+# Estados que reciben respuesta del bot
+REPLY_STATUSES = {"pendiente", "ya_vinculado", "no_encontrado", "sin_documento"}
+
+
+class LinkRequestError(ValueError):
+    """La solicitud de vínculo ya se resolvió; el mensaje se devuelve al cliente."""
+
+
+def run_poll_window(settings: Settings) -> int:
+    """
+    Job del scheduler: encadena long polls durante TELEGRAM_POLL_TIMEOUT segundos.
+
+    El job se repite con ese mismo intervalo, así casi siempre hay una
+    conexión esperando mensajes y un mensaje nuevo se procesa apenas llega.
+    La ventana termina un poco antes para no solaparse con la siguiente.
+    """
+    client = TelegramClient(settings)
+    window = max(1, settings.telegram_poll_timeout - WINDOW_MARGIN_SECONDS)
+    deadline = time.monotonic() + window
+    processed = 0
+    while (remaining := deadline - time.monotonic()) > 0.5:
+        processed += poll_updates(client, max(1, round(remaining)))
+    return processed
+
+
+def poll_updates(client: TelegramClient, timeout: int) -> int:
+    """Un long poll de hasta `timeout` segundos; retorna cuántos updates procesó."""
+    with get_session() as session:
+        offset = _state(session).last_update_id + 1
+
+    try:
+        updates = client.get_updates(offset, timeout)
+    except requests.RequestException as e:
+        # La URL del error incluye el token del bot
+        error = str(e).replace(client.token, "***") if client.token else str(e)
+        print(f"[TELEGRAM_UPDATES] Error en getUpdates: {error}")
+        _record_poll(error=error)
+        # Sin esta pausa un error inmediato (token inválido, 409) se repetiría en bucle
+        time.sleep(min(timeout, ERROR_PAUSE_SECONDS))
+        return 0
+
+    if not updates:
+        _record_poll()
+        return 0
+
+    with get_session() as session:
+        processed = process_updates(session, [_parse(update) for update in updates])
+    # Las respuestas solo después del commit
+    _reply(client, processed)
+
+    pending = sum(1 for item in processed if item["status"] == "pendiente")
+    print(f"[TELEGRAM_UPDATES] {len(processed)} updates, {pending} solicitudes de vínculo")
+    return len(processed)
+
+
+def process_updates(session: Session, parsed: list[dict]) -> list[dict]:
+    """
+    Clasifica los /start del lote, guarda los updates y avanza el offset.
+
+    Todos los estudiantes se resuelven con una sola consulta. Ningún chat se
+    vincula aquí: las solicitudes quedan pendientes de aprobación.
+    """
+    documentos = {item["documento"] for item in parsed if item["documento"]}
+    students = {}
+    if documentos:
+        students = {
+            row.documento: row
+            for row in session.execute(
+                select(Student.id, Student.documento, Student.telegram_id)
+                .where(Student.documento.in_(documentos))
+            ).all()
+        }
+
+    for item in parsed:
+        student = students.get(item["documento"]) if item["documento"] else None
+        item["student_id"] = student.id if student is not None else None
+        if not item["is_start"]:
+            item["status"] = "ignorado"
+        elif not item["documento"]:
+            item["status"] = "sin_documento"
+        elif student is None:
+            item["status"] = "no_encontrado"
+        elif student.telegram_id == item["chat_id"]:
+            item["status"] = "ya_vinculado"
+        else:
+            item["status"] = "pendiente"
+
+    session.execute(
+        insert_ignore(TelegramUpdate),
+        [
+            {
+                "update_id": item["update_id"],
+                "chat_id": item["chat_id"],
+                "username": item["username"],
+                "text": item["text"],
+                "documento": item["documento"],
+                "student_id": item["student_id"],
+                "status": item["status"],
+            }
+            for item in parsed
+        ],
+    )
+
+    last_update_id = max(item["update_id"] for item in parsed)
+    state = _state(session)
+    # Otro proceso pudo haber avanzado más; el offset nunca retrocede
+    if state.last_update_id < last_update_id:
+        state.last_update_id = last_update_id
+    state.polled_at = datetime.utcnow()
+    state.error = None
+    return parsed
+
+
+def resolve_link_request(session: Session, update_id: int, approve: bool) -> dict:
+    """
+    Aprueba o rechaza una solicitud de vínculo pendiente.
+
+    Al aprobarla el chat reemplaza al que tuviera el estudiante. Lanza
+    LookupError si el update no existe y LinkRequestError si no está
+    pendiente.
+    """
+    item = session.get(TelegramUpdate, update_id)
+    if item is None:
+        raise LookupError("Solicitud no encontrada")
+    if item.status != "pendiente":
+        raise LinkRequestError(f"La solicitud no está pendiente (estado: {item.status})")
+
+    if approve:
+        session.execute(
+            update(Student).where(Student.id == item.student_id).values(telegram_id=item.chat_id)
+        )
+        mark_roster_changed(session)
+        item.status = "vinculado"
+    else:
+        item.status = "rechazado"
+    return {
+        "update_id": item.update_id,
+        "student_id": item.student_id,
+        "chat_id": item.chat_id,
+        "estado": item.status,
+    }
+
+
+def notify_link_approved(settings: Settings, chat_id: str) -> None:
+    """Avisa al acudiente que el colegio aprobó su solicitud."""
+    status, error = TelegramClient(settings).send_text(chat_id, build_link_approved_message())
+    if status == "error":
+        print(f"[TELEGRAM_UPDATES] No se pudo avisar la aprobación a {chat_id}: {error}")
+
+
+def get_processed_updates(session: Session, status: str | None = None, limit: int = 100) -> dict:
+    """Estado del consumidor y los últimos updates procesados, más recientes primero."""
+    state = session.get(TelegramPollState, STATE_ID)
+    query = select(TelegramUpdate).order_by(desc(TelegramUpdate.update_id)).limit(limit)
+    if status:
+        query = query.where(TelegramUpdate.status == status)
+    updates = session.scalars(query).all()
+    return {
+        "offset": state.last_update_id + 1 if state else None,
+        "ultimo_sondeo": state.polled_at.isoformat() if state and state.polled_at else None,
+        "error": state.error if state else None,
+        "updates": [
+            {
+                "update_id": item.update_id,
+                "chat_id": item.chat_id,
+                "username": item.username,
+                "texto": item.text,
+                "documento": item.documento,
+                "student_id": item.student_id,
+                "estado": item.status,
+                "fecha": item.created_at.isoformat() if item.created_at else None,
+            }
+            for item in updates
+        ],
+    }
+
+
+def _parse(update: dict) -> dict:
+    message = update.get("message") or {}
+    chat = message.get("chat") or {}
+    sender = message.get("from") or {}
+    text = (message.get("text") or "").strip()
+    match = START_PATTERN.match(text)
+    documento = match.group(1) if match and match.group(1) else None
+    return {
+        "update_id": int(update["update_id"]),
+        "chat_id": str(chat.get("id", "")),
+        "username": (sender.get("username") or sender.get("first_name") or "")[:64] or None,
+        "text": text[:255] or None,
+        "is_start": match is not None and bool(chat.get("id")),
+        "documento": documento[:32] if documento else None,
+    }
+
+
+def _state(session: Session) -> TelegramPollState:
+    state = session.get(TelegramPollState, STATE_ID)
+    if state is None:
+        state = TelegramPollState(id=STATE_ID, last_update_id=0)
+        session.add(state)
+        session.flush()
+    return state
+
+
+def _record_poll(error: str | None = None) -> None:
+    with get_session() as session:
+        state = _state(session)
+        state.polled_at = datetime.utcnow()
+        state.error = error[:255] if error else None
+
+
+def _reply(client: TelegramClient, processed: list[dict]) -> None:
+    for item in processed:
+        if item["status"] not in REPLY_STATUSES:
+            continue
+        status, error = client.send_text(
+            item["chat_id"], build_link_message(item["status"])
+        )
+        if status == "error":
+            print(f"[TELEGRAM_UPDATES] No se pudo responder a {item['chat_id']}: {error}")
@@ -0,0 +1,92 @@
+"""
+Configuración común de las pruebas.
+
+La aplicación completa corre en el mismo proceso sobre una base SQLite
+temporal, así que no hace falta MySQL ni Telegram. Las variables de entorno
+se fijan antes de importar la aplicación: load_dotenv no sobrescribe las que
+ya existen, así un .env local no cambia la base ni envía mensajes reales.
+"""
+
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+_TMP = Path(tempfile.mkdtemp(prefix="educheck-tests-"))
+os.environ.update(
+    {
+        "DB_BACKEND": "sqlite",
+        "DB_URL": f"sqlite:///{_TMP / 'edu_check_test.db'}",
+        "DB_REPLICA_URL": "",
+        "QR_DIR": str(_TMP / "qr_codes"),
+        "UPLOADS_DIR": str(_TMP / "uploads"),
+        "QR_CARD_DIR": str(_TMP / "qr_cards"),
+        "TELEGRAM_TOKEN": "",
+        "TELEGRAM_CHAT_ID": "",
+        # Sin scheduler ni workers de notificaciones
+        "FLASK_RUN_FROM_CLI": "true",
+    }
+)
+
+HEADERS = (
+    "numero;primer_apellido;segundo_apellido;primer_nombre;segundo_nombre;"
+    "tipo_documento;documento;correo;telefono_acudiente;telegram_id;grado\n"
+)
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import create_app
+
+    return create_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(autouse=True)
+def clean_db(app):
+    """Cada prueba parte de tablas vacías y cachés de proceso limpias."""
+    import grade_stats
+    import import_jobs
+    from db import get_session
+    from models import Base
+    from roster_index import roster_index
+
+    yield
+    with get_session() as session:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table.name != "schema_version":
+                session.execute(table.delete())
+    roster_index.invalidate()
+    grade_stats._ready_days.clear()
+    with import_jobs._jobs_lock:
+        import_jobs._jobs.clear()
+
+
+@pytest.fixture
+def import_csv(client):
+    """Sube un CSV y espera a que termine el trabajo de importación."""
+
+    def run(rows: str, filename: str = "estudiantes.csv", headers: str = HEADERS) -> dict:
+        response = client.post(
+            "/students/import",
+            data={"file": (io.BytesIO((headers + rows).encode("utf-8")), filename)},
+        )
+        body = response.get_json()
+        if response.status_code != 202:
+            return body
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            job = client.get(f"/students/import/{body['job_id']}").get_json()
+            if job["estado"] in ("completado", "error"):
+                return job
+            time.sleep(0.05)
+        raise AssertionError(f"La importación {body['job_id']} no terminó")
+
+    return run
@@ -0,0 +1,123 @@
+from sqlalchemy import select, update
+
+from class_calendar import school_today
+from config import Settings
+from db import get_session
+from models import Attendance, NotificationOutbox, Student
+
+ROWS = (
+    "1;Perez;;Ana;;TI;1001;;;;9\n"
+    "2;Gomez;;Luis;;TI;1002;;;;9\n"
+    "3;Diaz;;Eva;;TI;1003;;;;10\n"
+)
+
+
+def test_checkin_registers_once(client, import_csv):
+    import_csv(ROWS)
+
+    first = client.post("/attendance/check-in", json={"documento": "1001"})
+    second = client.post("/attendance/check-in", json={"documento": "1001"})
+
+    assert first.status_code == 200
+    assert first.get_json()["status"] == "registrado"
+    assert second.get_json()["status"] == "ya_registrado"
+    with get_session() as session:
+        assert len(session.scalars(select(Attendance)).all()) == 1
+
+
+def test_checkin_unknown_documento(client, import_csv):
+    import_csv(ROWS)
+
+    response = client.post("/attendance/check-in", json={"documento": "9999"})
+
+    assert response.status_code == 404
+
+
+def test_checkin_updates_grade_stats(client, import_csv):
+    import_csv(ROWS)
+
+    client.post("/attendance/check-in", json={"documento": "1001"})
+    client.post("/attendance/check-in/batch", json={"scans": [{"documento": "1003"}]})
+
+    stats = client.get("/attendance/today?by_grade=1").get_json()
+    por_grado = {row["grado"]: row for row in stats["por_grado"]}
+    assert stats["presente"] == 2
+    assert por_grado[9]["presente"] == 1
+    assert por_grado[9]["total"] == 2
+    assert por_grado[10]["presente"] == 1
+
+
+def test_batch_checkin_reports_each_scan(client, import_csv):
+    import_csv(ROWS)
+    client.post("/attendance/check-in", json={"documento": "1002"})
+
+    response = client.post(
+        "/attendance/check-in/batch",
+        json={
+            "scans": [
+                {"documento": "1001"},
+                {"documento": "1002"},
+                {"documento": "9999"},
+                {"documento": ""},
+                "1003",
+            ]
+        },
+    )
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert [item["status"] for item in body["resultados"]] == [
+        "registrado",
+        "ya_registrado",
+        "no_encontrado",
+        "error",
+        "error",
+    ]
+    assert (body["registrados"], body["ya_registrados"], body["errores"]) == (1, 1, 2)
+
+
+def test_batch_checkin_keeps_earliest_scan(client, import_csv):
+    import_csv(ROWS)
+
+    client.post(
+        "/attendance/check-in/batch",
+        json={
+            "scans": [
+                {"documento": "1001", "scanned_at": "2024-03-04T07:05:00"},
+                {"documento": "1001", "scanned_at": "2024-03-04T06:55:00"},
+            ]
+        },
+    )
+
+    with get_session() as session:
+        hora_entrada = session.scalars(select(Attendance.hora_entrada)).one()
+    assert hora_entrada.strftime("%H:%M") == "06:55"
+
+
+def test_batch_checkin_requires_scan_list(client):
+    assert client.post("/attendance/check-in/batch", json={"scans": []}).status_code == 400
+    assert client.post("/attendance/check-in/batch", json=["1001"]).status_code == 400
+
+
+def test_batch_checkin_queues_remaining_entries(client, import_csv):
+    import_csv(ROWS)
+    with get_session() as session:
+        session.execute(update(Student).values(telegram_id="555"))
+        ana = session.scalar(select(Student.id).where(Student.documento == "1001"))
+        # Otro proceso ya encoló la entrada de Ana
+        session.add(NotificationOutbox(
+            student_id=ana,
+            fecha=school_today(Settings()),
+            tipo="entrada",
+            chat_id="555",
+            hora="06:50",
+            message="entrada",
+            status="pending",
+        ))
+
+    client.post("/attendance/check-in/batch", json={"scans": [{"documento": d} for d in ("1001", "1002", "1003")]})
+
+    with get_session() as session:
+        encolados = session.scalars(select(NotificationOutbox.hora)).all()
+    assert len(encolados) == 3
+    assert encolados.count("06:50") == 1
@@ -0,0 +1,91 @@
+from sqlalchemy import event, select
+
+from db import get_session
+from models import Student
+
+FILE_A = "1;Perez;;Ana;;TI;1001;;;;9\n2;Gomez;;Luis;;TI;1002;;;;9\n"
+# El mismo listado con un nombre corregido
+FILE_B = "1;Perez;;Ana Maria;;TI;1001;;;;9\n2;Gomez;;Luis;;TI;1002;;;;9\n"
+
+
+def _nombre(documento: str) -> str:
+    with get_session() as session:
+        return session.scalar(select(Student.primer_nombre).where(Student.documento == documento))
+
+
+def test_import_creates_students(import_csv):
+    job = import_csv(FILE_A)
+
+    assert job["estado"] == "completado"
+    assert job["creados"] == 2
+    assert _nombre("1001") == "Ana"
+
+
+def test_reupload_of_latest_import_is_skipped(import_csv):
+    first = import_csv(FILE_A)
+    second = import_csv(FILE_A)
+
+    assert second["duplicado"] is True
+    assert second["upload_log_id"] == first["upload_log_id"]
+
+
+def test_older_file_is_imported_again(import_csv):
+    import_csv(FILE_A)
+    import_csv(FILE_B)
+    assert _nombre("1001") == "Ana Maria"
+
+    again = import_csv(FILE_A)
+
+    assert "duplicado" not in again
+    assert again["actualizados"] == 1
+    assert _nombre("1001") == "Ana"
+
+
+def test_failed_import_is_logged_and_resets_dedup(client, import_csv):
+    import_csv(FILE_A)
+
+    failed = import_csv("x;y\n", headers="otra;cabecera\n")
+    again = import_csv(FILE_A)
+
+    assert failed["estado"] == "error"
+    assert failed["error"] == "Encabezados invalidos"
+    assert "duplicado" not in again
+    history = client.get("/uploads/history").get_json()["historial"]
+    assert [item["estado"] for item in history] == ["completado", "error", "completado"]
+
+
+def test_finished_job_is_found_without_process_memory(client, import_csv):
+    import import_jobs
+
+    job = import_csv(FILE_A)
+    with import_jobs._jobs_lock:
+        import_jobs._jobs.clear()
+
+    response = client.get(f"/students/import/{job['job_id']}")
+
+    assert response.status_code == 200
+    assert response.get_json()["estado"] == "completado"
+    assert response.get_json()["upload_log_id"] == job["upload_log_id"]
+
+
+def test_job_is_completed_only_after_commit(client, import_csv, monkeypatch):
+    import import_jobs
+
+    seen = []
+    write_upload_log = import_jobs._write_upload_log
+
+    def failing_commit(session, job, result, status):
+        def before_commit(_session):
+            seen.append(job.status)
+            raise RuntimeError("commit fallido")
+
+        if not seen:
+            event.listen(session, "before_commit", before_commit, once=True)
+        return write_upload_log(session, job, result, status)
+
+    monkeypatch.setattr(import_jobs, "_write_upload_log", failing_commit)
+    job = import_csv(FILE_A)
+
+    assert seen == ["procesando"]
+    assert job["estado"] == "error"
+    assert job["error"] == "commit fallido"
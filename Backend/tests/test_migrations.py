@@ -0,0 +1,163 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+
+import migrations
+
+# Esquema de la primera versión publicada, antes de schema_version
+BASELINE_SCHEMA = """
+CREATE TABLE class_days (
+    id INTEGER NOT NULL PRIMARY KEY,
+    lunes BOOLEAN NOT NULL, martes BOOLEAN NOT NULL, miercoles BOOLEAN NOT NULL,
+    jueves BOOLEAN NOT NULL, viernes BOOLEAN NOT NULL, sabado BOOLEAN NOT NULL,
+    domingo BOOLEAN NOT NULL,
+    updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL
+);
+CREATE TABLE grades (
+    id INTEGER NOT NULL PRIMARY KEY,
+    numero INTEGER NOT NULL UNIQUE
+);
+CREATE TABLE upload_logs (
+    id INTEGER NOT NULL PRIMARY KEY,
+    filename VARCHAR(255) NOT NULL,
+    stored_path VARCHAR(255) NOT NULL,
+    grados VARCHAR(64),
+    created_count INTEGER NOT NULL,
+    updated_count INTEGER NOT NULL,
+    skipped_count INTEGER NOT NULL,
+    errors_count INTEGER NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL
+);
+CREATE TABLE students (
+    id INTEGER NOT NULL PRIMARY KEY,
+    numero_estudiante INTEGER NOT NULL,
+    primer_apellido VARCHAR(50) NOT NULL,
+    segundo_apellido VARCHAR(50),
+    primer_nombre VARCHAR(50) NOT NULL,
+    segundo_nombre VARCHAR(50),
+    tipo_documento VARCHAR(4) NOT NULL,
+    documento VARCHAR(32) NOT NULL,
+    correo VARCHAR(120),
+    qr_path VARCHAR(255),
+    grade_id INTEGER NOT NULL REFERENCES grades (id),
+    CONSTRAINT uq_students_documento UNIQUE (documento)
+);
+CREATE TABLE attendance (
+    id INTEGER NOT NULL PRIMARY KEY,
+    student_id INTEGER NOT NULL REFERENCES students (id),
+    fecha DATE NOT NULL,
+    hora_entrada TIME NOT NULL,
+    CONSTRAINT uq_attendance_student_date UNIQUE (student_id, fecha)
+);
+CREATE TABLE notification_logs (
+    id INTEGER NOT NULL PRIMARY KEY,
+    student_id INTEGER NOT NULL REFERENCES students (id),
+    fecha DATE NOT NULL,
+    status VARCHAR(32) NOT NULL,
+    error VARCHAR(255),
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+    CONSTRAINT uq_notification_student_date UNIQUE (student_id, fecha)
+);
+INSERT INTO grades (id, numero) VALUES (1, 9);
+INSERT INTO students (id, numero_estudiante, primer_apellido, primer_nombre, tipo_documento, documento, grade_id)
+VALUES (1, 1, 'Perez', 'Ana', 'TI', '1001', 1);
+INSERT INTO upload_logs (id, filename, stored_path, created_count, updated_count, skipped_count, errors_count)
+VALUES (1, 'estudiantes.csv', 'uploads/estudiantes.csv', 1, 0, 0, 0);
+"""
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "migraciones.db"
+    engine = create_engine(f"sqlite:///{path}")
+    yield path, engine
+    engine.dispose()
+
+
+def _columns(engine, table: str) -> set[str]:
+    return {column["name"] for column in inspect(engine).get_columns(table)}
+
+
+def _indexes(engine, table: str) -> set[str]:
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_empty_database_is_created_at_latest_version(database):
+    _, engine = database
+
+    assert migrations.migrate(engine) == migrations.LATEST_VERSION
+
+    assert "upload_logs" in inspect(engine).get_table_names()
+    assert {"status", "job_id"} <= _columns(engine, "upload_logs")
+
+
+def test_baseline_schema_is_upgraded(database):
+    path, engine = database
+    with sqlite3.connect(path) as connection:
+        connection.executescript(BASELINE_SCHEMA)
+
+    assert migrations.migrate(engine) == migrations.LATEST_VERSION
+
+    assert {"telefono_acudiente", "telegram_id", "fingerprint"} <= _columns(engine, "students")
+    assert {"content_hash", "result_json", "status", "job_id"} <= _columns(engine, "upload_logs")
+    assert {"attempts", "next_attempt_at"} <= _columns(engine, "notification_outbox")
+    assert "ix_attendance_fecha_student" in _indexes(engine, "attendance")
+    assert "ix_students_grade_id" in _indexes(engine, "students")
+    assert "ix_outbox_status_next_attempt" in _indexes(engine, "notification_outbox")
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT documento FROM students").fetchall() == [("1001",)]
+        assert connection.execute("SELECT version FROM schema_version").fetchall() == [
+            (migrations.LATEST_VERSION,)
+        ]
+
+
+def test_interrupted_upgrade_resumes(database):
+    path, engine = database
+    with sqlite3.connect(path) as connection:
+        connection.executescript(BASELINE_SCHEMA)
+    migrations.migrate(engine)
+    # La migración 3 quedó a medias: el DDL de MySQL no se revierte
+    with sqlite3.connect(path) as connection:
+        connection.executescript(
+            """
+            ALTER TABLE upload_logs DROP COLUMN result_json;
+            UPDATE schema_version SET version = 2;
+            """
+        )
+
+    assert migrations.migrate(engine) == migrations.LATEST_VERSION
+    assert {"content_hash", "result_json"} <= _columns(engine, "upload_logs")
+
+
+def test_completed_imports_are_backfilled(database):
+    path, engine = database
+    with sqlite3.connect(path) as connection:
+        connection.executescript(BASELINE_SCHEMA)
+        connection.executescript(
+            """
+            ALTER TABLE upload_logs ADD COLUMN content_hash VARCHAR(64);
+            ALTER TABLE upload_logs ADD COLUMN result_json TEXT;
+            INSERT INTO upload_logs
+                (id, filename, stored_path, created_count, updated_count, skipped_count,
+                 errors_count, content_hash, result_json)
+            VALUES (2, 'b.csv', 'uploads/b.csv.gz', 0, 1, 0, 0, 'abc', '{"creados": 0}');
+            """
+        )
+
+    migrations.migrate(engine)
+
+    with sqlite3.connect(path) as connection:
+        rows = connection.execute("SELECT id, status FROM upload_logs ORDER BY id").fetchall()
+    assert rows == [(1, None), (2, "completado")]
+
+
+def test_current_database_is_not_touched(database):
+    _, engine = database
+    migrations.migrate(engine)
+    statements = []
+
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert migrations.migrate(engine) == migrations.LATEST_VERSION
+
+    assert not any(statement.lstrip().upper().startswith(("ALTER", "CREATE")) for statement in statements)
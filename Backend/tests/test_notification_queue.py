@@ -0,0 +1,167 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import select
+
+import notification_queue
+from db import get_session
+from models import Attendance, Grade, NotificationOutbox, Student
+
+TODAY = date(2024, 3, 4)
+
+
+@pytest.fixture
+def siblings():
+    """Dos hermanos con el mismo acudiente."""
+    with get_session() as session:
+        grade = Grade(numero=9)
+        session.add(grade)
+        session.flush()
+        students = [
+            Student(
+                numero_estudiante=n,
+                primer_apellido="Perez",
+                primer_nombre=nombre,
+                tipo_documento="TI",
+                documento=f"100{n}",
+                telegram_id="555",
+                grade_id=grade.id,
+            )
+            for n, nombre in [(1, "Ana"), (2, "Luis")]
+        ]
+        session.add_all(students)
+        session.flush()
+        return [student.id for student in students]
+
+
+def _enqueue(student_id: int, tipo: str = "entrada", **values) -> int:
+    with get_session() as session:
+        item = NotificationOutbox(
+            student_id=student_id,
+            fecha=TODAY,
+            tipo=tipo,
+            chat_id="555",
+            hora="07:00",
+            message=f"mensaje {student_id}",
+            status="pending",
+            **values,
+        )
+        session.add(item)
+        session.flush()
+        return item.id
+
+
+def _outbox(item_id: int):
+    with get_session() as session:
+        return session.execute(
+            select(
+                NotificationOutbox.status,
+                NotificationOutbox.attempts,
+                NotificationOutbox.next_attempt_at,
+            ).where(NotificationOutbox.id == item_id)
+        ).one()
+
+
+def test_claim_includes_siblings_in_coalescing_window(siblings):
+    due = _enqueue(siblings[0])
+    waiting = _enqueue(siblings[1], next_attempt_at=datetime.utcnow() + timedelta(minutes=1))
+
+    batch = notification_queue._claim_batch(10)
+
+    assert [item["id"] for item in batch] == [due, waiting]
+    assert _outbox(waiting).status == "sending"
+
+
+def test_claim_skips_siblings_waiting_for_retry(siblings):
+    due = _enqueue(siblings[0])
+    retrying = _enqueue(
+        siblings[1], attempts=1, next_attempt_at=datetime.utcnow() + timedelta(minutes=1)
+    )
+
+    batch = notification_queue._claim_batch(10)
+
+    assert [item["id"] for item in batch] == [due]
+    assert _outbox(retrying).status == "pending"
+
+
+def test_failed_delivery_backs_off(siblings):
+    item_id = _enqueue(siblings[0])
+    [item] = notification_queue._claim_batch(10)
+
+    notification_queue._finish_one({**item, "status": "error", "error": "timeout"}, max_attempts=3)
+
+    retry = _outbox(item_id)
+    assert (retry.status, retry.attempts) == ("pending", 1)
+    assert retry.next_attempt_at > datetime.utcnow() + notification_queue.RETRY_BASE / 2
+    assert notification_queue._claim_batch(10) == []
+
+    with get_session() as session:
+        session.get(NotificationOutbox, item_id).next_attempt_at = datetime.utcnow()
+    [again] = notification_queue._claim_batch(10)
+    assert (again["id"], again["attempts"]) == (item_id, 1)
+
+
+def test_last_failed_attempt_is_final(siblings):
+    item_id = _enqueue(siblings[0], attempts=2)
+    [item] = notification_queue._claim_batch(10)
+
+    notification_queue._finish_one({**item, "status": "error", "error": "timeout"}, max_attempts=3)
+
+    final = _outbox(item_id)
+    assert (final.status, final.attempts) == ("error", 3)
+
+
+def test_absence_alert_cancelled_after_checkin(siblings):
+    absent = _enqueue(siblings[0], tipo="ausencia")
+    still_absent = _enqueue(siblings[1], tipo="ausencia")
+    with get_session() as session:
+        session.add(Attendance(student_id=siblings[0], fecha=TODAY, hora_entrada=time(7, 30)))
+
+    batch = notification_queue._claim_batch(10)
+
+    assert [item["id"] for item in batch] == [still_absent]
+    assert _outbox(absent).status == "cancelado"
+    with get_session() as session:
+        statuses = session.scalars(select(NotificationOutbox.status)).all()
+    assert sorted(statuses) == ["cancelado", "sending"]
+
+
+def test_claim_uses_current_chat_of_student(siblings):
+    relinked = _enqueue(siblings[0])
+    unlinked = _enqueue(siblings[1])
+    with get_session() as session:
+        session.get(Student, siblings[0]).telegram_id = "888"
+        session.get(Student, siblings[1]).telegram_id = None
+
+    batch = notification_queue._claim_batch(10)
+
+    assert [(item["id"], item["chat_id"]) for item in batch] == [(relinked, "888")]
+    assert _outbox(unlinked).status == "skipped"
+
+
+def test_prune_removes_only_old_finished_rows(siblings):
+    old = datetime.utcnow() - timedelta(days=40)
+    sent = _enqueue(siblings[0], tipo="entrada", created_at=old)
+    pending = _enqueue(siblings[1], tipo="entrada", created_at=old)
+    recent = _enqueue(siblings[0], tipo="ausencia")
+    with get_session() as session:
+        session.get(NotificationOutbox, sent).status = "sent"
+        session.get(NotificationOutbox, recent).status = "sent"
+
+    assert notification_queue.prune_outbox(30) == 1
+
+    with get_session() as session:
+        remaining = session.scalars(select(NotificationOutbox.id).order_by(NotificationOutbox.id)).all()
+    assert remaining == [pending, recent]
+
+
+def test_delivery_refreshes_claim(siblings):
+    item_id = _enqueue(siblings[0])
+    [item] = notification_queue._claim_batch(10)
+    with get_session() as session:
+        session.get(NotificationOutbox, item_id).claimed_at = datetime.utcnow() - timedelta(hours=1)
+
+    notification_queue._refresh_claim([item["id"]])
+    notification_queue._release_stale_claims()
+
+    assert _outbox(item_id).status == "sending"
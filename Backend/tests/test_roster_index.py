@@ -0,0 +1,58 @@
+from datetime import date, time
+
+from sqlalchemy import delete, update
+
+from db import get_session
+from models import Attendance, Student
+from roster_index import RosterIndex, mark_roster_changed
+
+ROWS = "1;Perez;;Ana;;TI;1001;;;;9\n"
+TODAY = date(2024, 3, 4)
+
+
+def _student_id(index: RosterIndex, documento: str) -> int:
+    with get_session() as session:
+        return index.get(session, documento).id
+
+
+def test_change_from_another_process_reloads_index(import_csv):
+    import_csv(ROWS)
+    index = RosterIndex()
+    student_id = _student_id(index, "1001")
+
+    # Otro proceso: escribe en la base sin pasar por este índice
+    with get_session() as session:
+        session.execute(update(Student).where(Student.id == student_id).values(telegram_id="888"))
+        mark_roster_changed(session)
+
+    with get_session() as session:
+        assert index.get(session, "1001").telegram_id == "888"
+
+
+def test_new_student_visible_after_import_elsewhere(import_csv):
+    import_csv(ROWS)
+    index = RosterIndex()
+    with get_session() as session:
+        assert index.get(session, "1002") is None
+
+    import_csv("1;Perez;;Ana;;TI;1001;;;;9\n2;Gomez;;Luis;;TI;1002;;;;9\n")
+
+    with get_session() as session:
+        assert index.get(session, "1002") is not None
+
+
+def test_cleared_attendance_is_not_reported_as_checked_in(import_csv):
+    import_csv(ROWS)
+    index = RosterIndex()
+    student_id = _student_id(index, "1001")
+    with get_session() as session:
+        session.add(Attendance(student_id=student_id, fecha=TODAY, hora_entrada=time(7, 0)))
+    with get_session() as session:
+        assert index.is_checked_in(session, TODAY, student_id)
+
+    with get_session() as session:
+        session.execute(delete(Attendance).where(Attendance.fecha == TODAY))
+        mark_roster_changed(session)
+
+    with get_session() as session:
+        assert not index.is_checked_in(session, TODAY, student_id)
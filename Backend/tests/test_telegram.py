@@ -0,0 +1,29 @@
+import time
+
+from telegram import GLOBAL_LIMIT_CHATS, RateLimiter
+
+
+def _acquire_seconds(limiter: RateLimiter, chat_id: str) -> float:
+    start = time.monotonic()
+    limiter.acquire(chat_id)
+    return time.monotonic() - start
+
+
+def test_chat_limit_does_not_pause_other_chats():
+    limiter = RateLimiter(global_rate=100, chat_rate=100)
+
+    limiter.pause("111", 30)
+
+    assert _acquire_seconds(limiter, "222") < 0.5
+
+
+def test_limit_on_several_chats_pauses_the_bot():
+    limiter = RateLimiter(global_rate=100, chat_rate=100)
+
+    for n in range(GLOBAL_LIMIT_CHATS - 1):
+        limiter.pause(f"chat-{n}", 0.3)
+    assert _acquire_seconds(limiter, "otro") < 0.2
+
+    limiter.pause(f"chat-{GLOBAL_LIMIT_CHATS}", 0.3)
+
+    assert _acquire_seconds(limiter, "otro-mas") >= 0.25
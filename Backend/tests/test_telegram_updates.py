@@ -0,0 +1,75 @@
+from sqlalchemy import select
+
+from db import get_session
+from models import Student, TelegramUpdate
+from telegram_updates import process_updates
+
+ROWS = "1;Perez;;Ana;;TI;1001;;;;9\n2;Gomez;;Luis;;TI;1002;;;;9\n"
+
+
+def _start(update_id: int, chat_id: str, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "chat_id": chat_id,
+        "username": "acudiente",
+        "text": text,
+        "is_start": True,
+        "documento": text.split()[1] if " " in text else None,
+    }
+
+
+def _telegram_id(documento: str) -> str | None:
+    with get_session() as session:
+        return session.scalar(select(Student.telegram_id).where(Student.documento == documento))
+
+
+def test_start_only_creates_pending_request(import_csv):
+    import_csv(ROWS)
+
+    with get_session() as session:
+        processed = process_updates(
+            session,
+            [_start(1, "777", "/start 1001"), _start(2, "777", "/start 9999"), _start(3, "777", "/start")],
+        )
+
+    assert [item["status"] for item in processed] == ["pendiente", "no_encontrado", "sin_documento"]
+    assert _telegram_id("1001") is None
+
+
+def test_approved_request_links_chat(client, import_csv):
+    import_csv(ROWS)
+    with get_session() as session:
+        process_updates(session, [_start(1, "777", "/start 1001")])
+
+    response = client.post("/telegram/updates/1/aprobar")
+
+    assert response.status_code == 200
+    assert response.get_json()["estado"] == "vinculado"
+    assert _telegram_id("1001") == "777"
+    assert client.post("/telegram/updates/1/rechazar").status_code == 409
+
+
+def test_rejected_request_does_not_link(client, import_csv):
+    import_csv(ROWS)
+    with get_session() as session:
+        process_updates(session, [_start(1, "777", "/start 1001")])
+
+    assert client.post("/telegram/updates/1/rechazar").status_code == 200
+    assert client.post("/telegram/updates/2/aprobar").status_code == 404
+    assert _telegram_id("1001") is None
+    with get_session() as session:
+        assert session.scalar(select(TelegramUpdate.status)) == "rechazado"
+
+
+def test_reimport_keeps_linked_chat(client, import_csv):
+    import_csv(ROWS)
+    with get_session() as session:
+        process_updates(session, [_start(1, "777", "/start 1001")])
+    client.post("/telegram/updates/1/aprobar")
+
+    # Cambia otra fila; la celda telegram_id de 1001 sigue vacía
+    import_csv("1;Perez;;Ana;;TI;1001;;;;9\n2;Gomez;;Luis Felipe;;TI;1002;;;;9\n")
+    # Cambia la propia fila de 1001, también sin telegram_id
+    import_csv("1;Perez;;Ana Maria;;TI;1001;;;;9\n2;Gomez;;Luis Felipe;;TI;1002;;;;9\n")
+
+    assert _telegram_id("1001") == "777"
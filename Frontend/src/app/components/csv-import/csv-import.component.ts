@@ -89,7 +89,7 @@ export class CsvImportComponent implements OnInit {
       next: (result) => {
         this.isUploading = false;
         this.uploadResult = result;
-        this.successMessage = `✓ Importación completada: ${result.creados} creados, ${result.actualizados} actualizados`;
+        this.successMessage = `✓ Importación completada: ${result.creados} creados, ${result.actualizados} actualizados, ${result.sin_cambios ?? 0} sin cambios`;
         this.selectedFile = null;
         this.loadHistory();
       },
@@ -1,8 +1,9 @@
-import { Component, OnInit } from '@angular/core';
+import { Component, OnDestroy, OnInit } from '@angular/core';
+import { Subscription } from 'rxjs';
 import { CommonModule } from '@angular/common';
 import { FormsModule } from '@angular/forms';
 import { RouterLink, Router } from '@angular/router';
-import { AttendanceService } from '../../services/attendance.service';
+import { AttendanceEvent, AttendanceService, GradeAttendanceStats } from '../../services/attendance.service';
 import { StudentsService } from '../../services/students.service';
 import { ClassDaysService, ClassDaysConfig } from '../../services/class-days.service';
 
@@ -13,13 +14,14 @@ import { ClassDaysService, ClassDaysConfig } from '../../services/class-days.ser
   templateUrl: './dashboard.component.html',
   styleUrls: ['./dashboard.component.scss']
 })
-export class DashboardComponent implements OnInit {
+export class DashboardComponent implements OnInit, OnDestroy {
   totalStudents = 0;
   presentToday = 0;
   absentToday = 0;
   attendancePercentage = 0;
   selectedGrade = 'all';
   availableGrades: number[] = [];
+  gradeStats: Record<number, GradeAttendanceStats> = {};
   allGrades: number[] = [8, 9, 10, 11];
   isLoading = true;
   errorMessage = '';
@@ -36,6 +38,7 @@ export class DashboardComponent implements OnInit {
     domingo: false
   };
   showClassDaysConfig = false;
+  private liveFeed?: Subscription;
 
   constructor(
     private attendanceService: AttendanceService,
@@ -47,6 +50,43 @@ export class DashboardComponent implements OnInit {
   ngOnInit() {
     this.loadDashboardData();
     this.loadClassDays();
+    this.liveFeed = this.attendanceService.streamAttendance().subscribe({
+      next: (message: AttendanceEvent) => this.onLiveEvent(message),
+      error: (err: any) => console.error('Error en el feed en vivo:', err)
+    });
+  }
+
+  ngOnDestroy() {
+    this.liveFeed?.unsubscribe();
+  }
+
+  onLiveEvent(message: AttendanceEvent) {
+    if (message.event === 'reset') {
+      this.loadDashboardData();
+      return;
+    }
+    const updates: GradeAttendanceStats[] = message.event === 'snapshot'
+      ? message.data.por_grado
+      : message.event === 'grade_stats' ? [message.data] : [];
+    if (updates.length === 0 || this.isLoading) {
+      return;
+    }
+    updates.forEach(stats => {
+      this.gradeStats[stats.grado] = stats;
+      if (stats.presente > 0 && !this.availableGrades.includes(stats.grado)) {
+        this.availableGrades = [...this.availableGrades, stats.grado].sort((a, b) => a - b);
+      }
+    });
+
+    const selected = this.selectedGrade === 'all'
+      ? Object.values(this.gradeStats)
+      : [this.gradeStats[parseInt(this.selectedGrade)]].filter(Boolean);
+    this.presentToday = selected.reduce((sum, stats) => sum + stats.presente, 0);
+    this.totalStudents = selected.reduce((sum, stats) => sum + stats.total, 0);
+    this.absentToday = Math.max(0, this.totalStudents - this.presentToday);
+    this.attendancePercentage = this.totalStudents > 0
+      ? Math.round((this.presentToday / this.totalStudents) * 100)
+      : 0;
   }
 
   loadDashboardData() {
@@ -54,8 +94,8 @@ export class DashboardComponent implements OnInit {
     this.errorMessage = '';
     this.selectedGrade = 'all'; // Resetear el filtro
     
-    // Obtener estadísticas de hoy
-    this.attendanceService.getAttendanceToday().subscribe({
+    // Obtener estadísticas de hoy (con el detalle de todos los grados en una sola petición)
+    this.attendanceService.getAttendanceTodayByGrade().subscribe({
       next: (data: any) => {
         this.presentToday = data.presente || 0;
         this.absentToday = data.ausente || 0;
@@ -66,6 +106,10 @@ export class DashboardComponent implements OnInit {
         
         // Obtener grados disponibles del backend
         this.availableGrades = data.grados || [];
+        this.gradeStats = {};
+        (data.por_grado || []).forEach((stats: GradeAttendanceStats) => {
+          this.gradeStats[stats.grado] = stats;
+        });
         
         this.isLoading = false;
         this.loadAbsentStudents();
@@ -123,7 +167,10 @@ export class DashboardComponent implements OnInit {
     this.selectedGrade = grade;
     this.isLoading = true;
     
-    if (grade !== 'all') {
+    const cached = this.gradeStats[parseInt(grade)];
+    if (grade !== 'all' && cached) {
+      this.applyGradeStats(cached);
+    } else if (grade !== 'all') {
       this.attendanceService.getAttendanceByGrade(parseInt(grade)).subscribe({
         next: (data: any) => {
           this.presentToday = data.presente || 0;
@@ -146,6 +193,17 @@ export class DashboardComponent implements OnInit {
     }
   }
 
+  applyGradeStats(data: GradeAttendanceStats) {
+    this.presentToday = data.presente || 0;
+    this.absentToday = data.ausente || 0;
+    this.totalStudents = data.total || (this.presentToday + this.absentToday);
+    this.attendancePercentage = this.totalStudents > 0
+      ? Math.round((this.presentToday / this.totalStudents) * 100)
+      : 0;
+    this.isLoading = false;
+    this.loadAbsentStudents();
+  }
+
   goToReports() {
     this.router.navigate(['/reports']);
   }
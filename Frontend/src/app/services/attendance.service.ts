@@ -13,6 +13,16 @@ export interface AttendanceStats {
   ausente: number;
 }
 
+export interface GradeAttendanceStats extends AttendanceStats {
+  grado: number;
+  total: number;
+}
+
+export interface AttendanceEvent {
+  event: 'snapshot' | 'grade_stats' | 'checkin' | 'reset';
+  data: any;
+}
+
 @Injectable({
   providedIn: 'root'
 })
@@ -32,6 +42,26 @@ export class AttendanceService {
     return this.http.get<AttendanceStats>(`${this.apiUrl}/attendance/today`);
   }
 
+  getAttendanceTodayByGrade(): Observable<AttendanceStats & { por_grado: GradeAttendanceStats[] }> {
+    return this.http.get<AttendanceStats & { por_grado: GradeAttendanceStats[] }>(
+      `${this.apiUrl}/attendance/today`,
+      { params: { by_grade: '1' } }
+    );
+  }
+
+  streamAttendance(): Observable<AttendanceEvent> {
+    return new Observable<AttendanceEvent>(observer => {
+      // EventSource se reconecta solo si el servidor cierra la conexión
+      const source = new EventSource(`${this.apiUrl}/attendance/stream`);
+      (['snapshot', 'grade_stats', 'checkin', 'reset'] as const).forEach(type => {
+        source.addEventListener(type, (e: MessageEvent) => {
+          observer.next({ event: type, data: JSON.parse(e.data) });
+        });
+      });
+      return () => source.close();
+    });
+  }
+
   getAttendanceByGrade(grado: number): Observable<AttendanceStats> {
     return this.http.get<AttendanceStats>(`${this.apiUrl}/attendance/${grado}`);
   }
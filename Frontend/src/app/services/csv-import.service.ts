@@ -1,15 +1,32 @@
 import { Injectable } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { Observable, of, throwError, timer } from 'rxjs';
+import { filter, map, switchMap, take } from 'rxjs/operators';
 
 export interface ImportResult {
   creados: number;
   actualizados: number;
+  sin_cambios?: number;
   omitidos: number;
   errores: string[];
   grados: number[];
 }
 
+export interface ImportJob {
+  job_id: string;
+  archivo: string;
+  estado: 'en_cola' | 'procesando' | 'completado' | 'error';
+  filas_procesadas: number;
+  creados: number;
+  actualizados: number;
+  sin_cambios: number;
+  omitidos: number;
+  errores: { linea: number; error: string }[];
+  filas_por_segundo: number;
+  resultado: ImportResult | null;
+  error: string | null;
+}
+
 export interface UploadHistory {
   id: number;
   archivo: string;
@@ -33,7 +50,27 @@ export class CsvImportService {
   uploadCsv(file: File): Observable<ImportResult> {
     const formData = new FormData();
     formData.append('file', file);
-    return this.http.post<ImportResult>(`${this.apiUrl}/students/import`, formData);
+    // El backend responde con un job_id; se consulta el progreso hasta que termine
+    return this.http.post<{ job_id?: string; resultado?: ImportResult }>(`${this.apiUrl}/students/import`, formData).pipe(
+      // Un archivo idéntico a uno ya importado responde de inmediato con el resultado anterior
+      switchMap(({ job_id, resultado }) => !job_id
+        ? of({ estado: 'completado', resultado: resultado ?? null } as ImportJob)
+        : timer(0, 1000).pipe(
+          switchMap(() => this.getImportJob(job_id)),
+          filter(job => job.estado === 'completado' || job.estado === 'error'),
+          take(1)
+        )
+      ),
+      switchMap(job => job.estado === 'completado' && job.resultado
+        ? [job.resultado]
+        : throwError(() => ({ error: { error: job.error || 'Error al importar el archivo' } }))
+      ),
+      map(result => result as ImportResult)
+    );
+  }
+
+  getImportJob(jobId: string): Observable<ImportJob> {
+    return this.http.get<ImportJob>(`${this.apiUrl}/students/import/${jobId}`);
   }
 
   getUploadHistory(): Observable<{ historial: UploadHistory[] }> {